@@ -7,18 +7,27 @@ ANDENUTRI - Backend Init
 from flask import Flask
 from backend.config import config
 from backend.models import db
+from backend.banco import configurar_engine
+from backend.migracoes import aplicar_migracoes
+from backend.serializacao import configurar_json
 
-def create_app(config_name='default'):
+def create_app(config_name='default', migrar=True):
     """Factory para criar a aplicação Flask"""
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
     # Inicializar extensões
     db.init_app(app)
+    configurar_json(app)
     
-    # Criar tabelas
+    # Criar/atualizar tabelas e carregar o índice de etiquetas (import
+    # local: no nível do pacote o objeto esconderia o módulo de mesmo nome)
+    from backend.indice_etiquetas import indice_etiquetas
     with app.app_context():
-        db.create_all()
+        configurar_engine(db.engine, app.config.get('SQLITE_PRAGMAS'))
+        if migrar:
+            aplicar_migracoes()
+            indice_etiquetas.carregar()
     
     # Registrar rotas
     from backend.routes import main
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Agenda de consultas
+
+Índice de intervalos em memória por profissional: listas paralelas de
+início, fim e id, ordenadas pelo início. Como nenhuma consulta dura mais
+que a maior duração já vista, as que cruzam [inicio, fim) estão entre
+bisect(inicio - maior_duracao) e bisect(fim): "o horário está livre?",
+"conflitos no período" e a busca dos próximos horários livres custam
+O(log n + k), sem percorrer a agenda inteira.
+
+O índice é carregado na primeira consulta, atualizado a cada commit e
+recarregado quando a assinatura do banco muda (backend/assinatura.py). Séries recorrentes não
+entram no índice: suas ocorrências são geradas só para a janela de cada
+pergunta (backend/recorrencia.py) e combinadas com as consultas avulsas.
+Na gravação o conflito é conferido no banco, depois do flush e na mesma
+transação, pelo índice (profissional, data_hora). Para que dois
+processos não marquem o mesmo horário, gravações na agenda de um
+mesmo profissional são serializadas: no SQLite pelo lock de escrita
+que o flush já toma, no Postgres por um advisory lock por profissional
+(travar_profissionais). Em outros bancos a verificação vale só dentro
+do processo.
+"""
+
+import heapq
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+from sqlalchemy import event, func, text
+from sqlalchemy.orm import Session
+from backend.models import db, Consulta, SerieConsulta
+from backend.assinatura import AssinaturaBanco
+from backend.paginacao import ParametroInvalido
+from backend.recorrencia import eh_ocorrencia, expandir, ocorrencias_periodo, validar_serie
+
+DURACAO_PADRAO = 60  # minutos
+
+# Limite de duração aceito na gravação: é a janela que a verificação no
+# banco olha para trás a partir do início pedido
+DURACAO_MAXIMA = 8 * 60
+
+# Consultas nesses status não ocupam horário
+STATUS_LIVRES = ('cancelada',)
+
+# Expediente usado na busca de horários livres (segunda = 0)
+EXPEDIENTE_PADRAO = (time(8, 0), time(18, 0))
+DIAS_ATENDIMENTO_PADRAO = (0, 1, 2, 3, 4)
+
+# Horários livres sugeridos começam em múltiplos disso (minutos)
+PASSO_PADRAO = 30
+
+QUANTIDADE_MAXIMA = 100
+
+# Quanto de uma série nova ou alterada é conferido contra a agenda
+HORIZONTE_VERIFICACAO = timedelta(days=180)
+
+# Primeira chave do pg_advisory_xact_lock(chave, hashtext(profissional)),
+# para não colidir com outros advisory locks do banco
+CHAVE_LOCK_AGENDA = 2406
+
+
+class ConflitoHorario(ValueError):
+    """Horário já ocupado; conflitos = consultas que se sobrepõem"""
+
+    def __init__(self, conflitos):
+        super().__init__('Horário em conflito com outra consulta')
+        self.conflitos = conflitos
+
+
+def fim_consulta(inicio, duracao):
+    return inicio + timedelta(minutes=duracao or DURACAO_PADRAO)
+
+
+def ler_duracao(valor):
+    if valor in (None, ''):
+        return DURACAO_PADRAO
+    try:
+        duracao = int(valor)
+    except (TypeError, ValueError):
+        raise ParametroInvalido('duracao deve ser um número inteiro de minutos')
+    if not 0 < duracao <= DURACAO_MAXIMA:
+        raise ParametroInvalido(f'duracao deve estar entre 1 e {DURACAO_MAXIMA} minutos')
+    return duracao
+
+
+def _arredondar(momento, passo):
+    """Próximo múltiplo de passo minutos desde a meia-noite (ou o próprio momento)"""
+    meia_noite = datetime.combine(momento.date(), time())
+    minutos = -(-(momento - meia_noite) // timedelta(minutes=passo))
+    return meia_noite + timedelta(minutes=minutos * passo)
+
+
+class IntervalosProfissional:
+    """Consultas de um profissional ordenadas pelo início"""
+
+    def __init__(self):
+        self.inicios = []
+        self.fins = []
+        self.ids = []
+        self.maior_duracao = timedelta(0)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def adicionar(self, id, inicio, fim):
+        posicao = bisect_right(self.inicios, inicio)
+        self.inicios.insert(posicao, inicio)
+        self.fins.insert(posicao, fim)
+        self.ids.insert(posicao, id)
+        # Não diminui na remoção: só deixa a janela de busca um pouco maior
+        self.maior_duracao = max(self.maior_duracao, fim - inicio)
+
+    def remover(self, id, inicio):
+        posicao = bisect_left(self.inicios, inicio)
+        while posicao < len(self.ids) and self.inicios[posicao] == inicio:
+            if self.ids[posicao] == id:
+                del self.inicios[posicao], self.fins[posicao], self.ids[posicao]
+                return
+            posicao += 1
+
+    def _faixa(self, inicio, fim):
+        return bisect_left(self.inicios, inicio - self.maior_duracao), bisect_left(self.inicios, fim)
+
+    def sobrepostos(self, inicio, fim, ignorar=None):
+        """[(id, inicio, fim)] das consultas que cruzam [inicio, fim)"""
+        de, ate = self._faixa(inicio, fim)
+        return [
+            (self.ids[i], self.inicios[i], self.fins[i])
+            for i in range(de, ate)
+            if self.fins[i] > inicio and self.ids[i] != ignorar
+        ]
+
+    def itens(self, inicio, fim):
+        """(inicio, fim, id) das consultas que cruzam [inicio, fim), em ordem de início"""
+        de, ate = self._faixa(inicio, fim)
+        return [
+            (self.inicios[i], self.fins[i], self.ids[i])
+            for i in range(de, ate) if self.fins[i] > inicio
+        ]
+
+
+def pares_sobrepostos(itens):
+    """Pares (id_a, id_b) sobrepostos entre si, de itens (inicio, fim, id) em ordem de início"""
+    pares = []
+    ativos = []  # (fim, id) dos itens que ainda não terminaram
+    for inicio, fim, id in itens:
+        ativos = [(fim_ativo, id_ativo) for fim_ativo, id_ativo in ativos if fim_ativo > inicio]
+        pares.extend((id_ativo, id) for _, id_ativo in ativos)
+        ativos.append((fim, id))
+    return pares
+
+
+def ocorrencias_profissional(profissional, desde, ate, ignorar_serie=None):
+    """IntervalosProfissional com as ocorrências de séries que cruzam [desde, ate)
+
+    Os ids são os objetos Ocorrencia.
+    """
+    intervalos = IntervalosProfissional()
+    ocorrencias = ocorrencias_periodo(
+        desde - timedelta(minutes=DURACAO_MAXIMA), ate,
+        filtros=[SerieConsulta.profissional == profissional], ignorar_serie=ignorar_serie
+    )
+    for ocorrencia in ocorrencias:
+        if ocorrencia.fim > desde:
+            intervalos.adicionar(ocorrencia, ocorrencia.data_hora, ocorrencia.fim)
+    return intervalos
+
+
+class IndiceAgenda:
+    """profissional -> IntervalosProfissional das consultas que ocupam horário"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.assinatura = AssinaturaBanco(self._assinatura_banco)
+        self._limpar()
+
+    def _limpar(self):
+        self.por_profissional = {}
+        self.posicoes = {}  # consulta_id -> (profissional, inicio)
+        self.carregado = False
+
+    def _assinatura_banco(self):
+        return tuple(db.session.query(
+            func.count(Consulta.id), func.max(Consulta.id), func.max(Consulta.atualizado_em)
+        ).one())
+
+    def _ocupar(self, id, profissional, inicio, fim):
+        self._liberar(id)
+        self.por_profissional.setdefault(profissional, IntervalosProfissional()).adicionar(id, inicio, fim)
+        self.posicoes[id] = (profissional, inicio)
+
+    def _liberar(self, id):
+        posicao = self.posicoes.pop(id, None)
+        if posicao is not None:
+            profissional, inicio = posicao
+            self.por_profissional[profissional].remover(id, inicio)
+
+    def carregar(self):
+        """(Re)constrói o índice a partir do banco"""
+        with self._lock:
+            self._limpar()
+            self.assinatura.registrar()
+            consultas = db.session.query(
+                Consulta.id, Consulta.profissional, Consulta.data_hora, Consulta.duracao
+            ).filter(Consulta.status.notin_(STATUS_LIVRES) | Consulta.status.is_(None))
+            # Em ordem de início cada inserção cai no fim das listas
+            for id, profissional, inicio, duracao in consultas.order_by(Consulta.data_hora).yield_per(10000):
+                self._ocupar(id, profissional, inicio, fim_consulta(inicio, duracao))
+            self.carregado = True
+
+    def _garantir_atualizado(self):
+        if not self.carregado or self.assinatura.mudou():
+            self.carregar()
+
+    def aplicar(self, alteracoes):
+        """Aplica alterações confirmadas: ('ocupar', id, profissional, inicio, fim) ou ('liberar', id)"""
+        with self._lock:
+            if not self.carregado:
+                return
+            for alteracao in alteracoes:
+                if alteracao[0] == 'ocupar':
+                    self._ocupar(*alteracao[1:])
+                else:
+                    self._liberar(alteracao[1])
+
+    def _intervalos(self, profissional):
+        self._garantir_atualizado()
+        return self.por_profissional.get(profissional) or IntervalosProfissional()
+
+    def sobrepostos(self, profissional, inicio, fim, ignorar=None):
+        """Consultas (ids) e ocorrências de séries que cruzam [inicio, fim)"""
+        with self._lock:
+            avulsas = self._intervalos(profissional).sobrepostos(inicio, fim, ignorar)
+        return avulsas + ocorrencias_profissional(profissional, inicio, fim).sobrepostos(inicio, fim)
+
+    def conflitos(self, profissional, inicio, fim):
+        """Pares sobrepostos no período, entre consultas e/ou ocorrências"""
+        with self._lock:
+            avulsas = self._intervalos(profissional).itens(inicio, fim)
+        recorrentes = ocorrencias_profissional(profissional, inicio, fim).itens(inicio, fim)
+        return pares_sobrepostos(heapq.merge(avulsas, recorrentes, key=lambda item: item[0]))
+
+    def horarios_livres(self, profissional, desde, ate, duracao=DURACAO_PADRAO, quantidade=10,
+                        expediente=EXPEDIENTE_PADRAO, dias=DIAS_ATENDIMENTO_PADRAO, passo=PASSO_PADRAO):
+        """Próximos `quantidade` horários livres de `duracao` minutos entre desde e ate
+
+        Cada tentativa é uma busca no índice; ao achar conflito pula para
+        o fim da consulta que ocupa o horário.
+        """
+        duracao = timedelta(minutes=duracao)
+        livres = []
+        recorrentes = ocorrencias_profissional(profissional, desde, ate)
+        with self._lock:
+            intervalos = self._intervalos(profissional)
+            momento = _arredondar(desde, passo)
+            while len(livres) < quantidade and momento + duracao <= ate:
+                abertura = datetime.combine(momento.date(), expediente[0])
+                fechamento = datetime.combine(momento.date(), expediente[1])
+                if momento.weekday() not in dias or momento + duracao > fechamento:
+                    momento = abertura + timedelta(days=1)
+                    continue
+                if momento < abertura:
+                    momento = abertura
+                    continue
+                ocupados = (
+                    intervalos.sobrepostos(momento, momento + duracao)
+                    + recorrentes.sobrepostos(momento, momento + duracao)
+                )
+                if ocupados:
+                    momento = _arredondar(max(fim for _, _, fim in ocupados), passo)
+                    continue
+                livres.append((momento, momento + duracao))
+                momento = _arredondar(momento + duracao, passo)
+        return livres
+
+
+indice_agenda = IndiceAgenda()
+
+
+def _consultas_no_banco(profissional, inicio, fim):
+    return Consulta.query.filter(
+        Consulta.profissional == profissional,
+        Consulta.data_hora > inicio - timedelta(minutes=DURACAO_MAXIMA),
+        Consulta.data_hora < fim,
+        Consulta.status.notin_(STATUS_LIVRES) | Consulta.status.is_(None),
+    ).order_by(Consulta.data_hora)
+
+
+def ocupados_no_banco(profissional, inicio, fim, ignorar_consulta=None, ignorar_ocorrencia=None):
+    """Consultas e ocorrências de séries gravadas que cruzam [inicio, fim) (na transação atual)"""
+    consultas = [
+        c for c in _consultas_no_banco(profissional, inicio, fim)
+        if c.id != ignorar_consulta and fim_consulta(c.data_hora, c.duracao) > inicio
+    ]
+    ocorrencias = [
+        ocorrencia for _, _, ocorrencia in ocorrencias_profissional(profissional, inicio, fim).itens(inicio, fim)
+        if ocorrencia.chave != ignorar_ocorrencia
+    ]
+    return consultas + ocorrencias
+
+
+def conflitos_no_banco(consulta):
+    """O que já ocupa o horário da consulta"""
+    if consulta.status in STATUS_LIVRES:
+        return []
+    fim = fim_consulta(consulta.data_hora, consulta.duracao)
+    return ocupados_no_banco(consulta.profissional, consulta.data_hora, fim, ignorar_consulta=consulta.id)
+
+
+def conflitos_serie(serie):
+    """Ocorrências da série (até HORIZONTE_VERIFICACAO à frente) que batem com a agenda
+
+    Monta de uma vez os intervalos ocupados da janela (consultas avulsas
+    e outras séries do profissional) e confere cada ocorrência por busca
+    binária.
+    """
+    desde = max(serie.inicio, datetime.now())
+    ate = desde + HORIZONTE_VERIFICACAO
+    ocupados = ocorrencias_profissional(serie.profissional, desde, ate, ignorar_serie=serie.id)
+    for consulta in _consultas_no_banco(serie.profissional, desde, ate):
+        ocupados.adicionar(consulta, consulta.data_hora, fim_consulta(consulta.data_hora, consulta.duracao))
+
+    excecoes = {excecao.data_original: excecao for excecao in serie.excecoes}
+    conflitos = []
+    for ocorrencia in expandir(serie, desde, ate, excecoes):
+        conflitos.extend(item for item, _, _ in ocupados.sobrepostos(ocorrencia.data_hora, ocorrencia.fim))
+    return list(dict.fromkeys(conflitos))
+
+
+def travar_profissionais(*profissionais):
+    """Serializa as gravações na agenda dos profissionais até o fim da transação
+
+    No Postgres em READ COMMITTED duas transações podem passar juntas
+    pela verificação e gravar o mesmo horário. Com o advisory lock a
+    segunda espera o commit da primeira e, como cada comando enxerga o
+    que já foi confirmado, encontra a consulta dela na verificação. No
+    SQLite o flush já toma o lock de escrita do banco inteiro, que faz
+    o mesmo papel. Os locks são tomados em ordem, sem deadlock entre
+    transações que gravam para mais de um profissional.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for profissional in sorted({profissional or '' for profissional in profissionais}):
+        db.session.execute(
+            text('SELECT pg_advisory_xact_lock(:chave, hashtext(:profissional))'),
+            {'chave': CHAVE_LOCK_AGENDA, 'profissional': profissional}
+        )
+
+
+def salvar_consulta(consulta):
+    """Grava a consulta ou levanta ConflitoHorario (nada é gravado)
+
+    A verificação roda depois do flush e do lock da agenda do
+    profissional (travar_profissionais): nenhuma outra gravação na
+    mesma agenda entra entre a verificação e o commit.
+    """
+    try:
+        travar_profissionais(consulta.profissional)
+        db.session.add(consulta)
+        db.session.flush()
+        conflitos = conflitos_no_banco(consulta)
+        if conflitos:
+            raise ConflitoHorario(conflitos)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def salvar_serie(*series):
+    """Grava as séries ou levanta ConflitoHorario (nada é gravado)"""
+    try:
+        for serie in series:
+            validar_serie(serie)
+        travar_profissionais(*(serie.profissional for serie in series))
+        for serie in series:
+            db.session.add(serie)
+        db.session.flush()
+        for serie in series:
+            conflitos = conflitos_serie(serie)
+            if conflitos:
+                raise ConflitoHorario(conflitos)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def salvar_excecao(excecao):
+    """Grava o cancelamento/alteração de uma ocorrência (ConflitoHorario se remarcada sobre outra)"""
+    serie = excecao.serie
+    try:
+        if not eh_ocorrencia(serie, excecao.data_original):
+            raise ParametroInvalido('data_original não é uma ocorrência da série')
+        travar_profissionais(serie.profissional)
+        db.session.add(excecao)
+        db.session.flush()
+        if excecao.status not in STATUS_LIVRES:
+            inicio = excecao.data_hora or excecao.data_original
+            fim = fim_consulta(inicio, excecao.duracao or serie.duracao)
+            conflitos = ocupados_no_banco(
+                serie.profissional, inicio, fim, ignorar_ocorrencia=(serie.id, excecao.data_original)
+            )
+            if conflitos:
+                raise ConflitoHorario(conflitos)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def agenda_periodo(desde, ate, filtros_consulta=(), filtros_serie=()):
+    """Consultas avulsas e ocorrências de séries em [desde, ate), em ordem de horário
+
+    As duas fontes são geradores (consultas lidas em blocos, ocorrências
+    geradas na hora) intercalados por heapq.merge.
+    """
+    consultas = Consulta.query.filter(
+        Consulta.data_hora >= desde, Consulta.data_hora < ate,
+        Consulta.status.notin_(STATUS_LIVRES) | Consulta.status.is_(None),
+        *filtros_consulta
+    ).order_by(Consulta.data_hora, Consulta.id).yield_per(1000)
+    ocorrencias = ocorrencias_periodo(desde, ate, filtros=filtros_serie)
+    return heapq.merge(consultas, ocorrencias, key=lambda item: item.data_hora)
+
+
+# Sincronização do índice: alterações ficam pendentes na sessão e só
+# entram no índice depois do commit
+
+def _registrar(session, alteracao):
+    session.info.setdefault('agenda_pendentes', []).append(alteracao)
+
+
+@event.listens_for(Consulta, 'after_insert')
+@event.listens_for(Consulta, 'after_update')
+def _consulta_salva(mapper, connection, consulta):
+    sessao = Session.object_session(consulta)
+    if sessao is None:
+        return
+    if consulta.status in STATUS_LIVRES:
+        _registrar(sessao, ('liberar', consulta.id))
+    else:
+        fim = fim_consulta(consulta.data_hora, consulta.duracao)
+        _registrar(sessao, ('ocupar', consulta.id, consulta.profissional, consulta.data_hora, fim))
+
+
+@event.listens_for(Consulta, 'after_delete')
+def _consulta_removida(mapper, connection, consulta):
+    sessao = Session.object_session(consulta)
+    if sessao is not None:
+        _registrar(sessao, ('liberar', consulta.id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_pendentes(session):
+    alteracoes = session.info.pop('agenda_pendentes', None)
+    if alteracoes:
+        indice_agenda.aplicar(alteracoes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_pendentes(session):
+    session.info.pop('agenda_pendentes', None)
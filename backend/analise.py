@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Análise de composição corporal
+
+Carrega as avaliações de um cliente (ou de uma coorte) em arrays NumPy,
+ordenadas por cliente e data, e calcula de uma vez para todas as linhas:
+diferença para a avaliação anterior e para a primeira, média móvel,
+relação cintura/quadril (RCQ) e taxa de variação por 30 dias. Os
+resumos por cliente (primeira/última medida, tendência por regressão
+linear) usam reduceat sobre os grupos, sem laço em Python por cliente.
+"""
+
+from datetime import datetime
+import numpy as np
+from backend.models import db, Avaliacao
+from backend.paginacao import ParametroInvalido
+
+MEDIDAS = ('peso', 'altura', 'imc', 'cintura', 'quadril', 'braco', 'coxa', 'pescoco')
+
+# Avaliações na média móvel (a atual e as anteriores do mesmo cliente)
+JANELA_MEDIA_MOVEL = 3
+
+DIAS_TAXA = 30
+SEGUNDOS_POR_DIA = 86400
+
+
+def ler_data(valor, parametro):
+    """Data ISO 8601 opcional vinda da query string"""
+    if not valor:
+        return None
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        raise ParametroInvalido(f'{parametro} deve ser uma data ISO 8601 (ex.: 2024-01-31)')
+
+
+class Avaliacoes:
+    """Avaliações em arrays paralelos, ordenadas por (cliente_id, data)"""
+
+    def __init__(self, linhas):
+        linhas = list(linhas)
+        self.n = len(linhas)
+        self.ids = np.array([linha[0] for linha in linhas], dtype=np.int64)
+        self.clientes = np.array([linha[1] for linha in linhas], dtype=np.int64)
+        self.datas = np.array([linha[2] for linha in linhas], dtype='datetime64[s]')
+        # None vira NaN: medida não informada
+        self.medidas = np.array([linha[3:] for linha in linhas], dtype=float).reshape(self.n, len(MEDIDAS))
+
+        posicoes = np.arange(self.n)
+        self.novo_grupo = np.ones(self.n, dtype=bool)
+        self.novo_grupo[1:] = self.clientes[1:] != self.clientes[:-1]
+        # Índice da primeira avaliação do cliente de cada linha
+        self.primeira = np.maximum.accumulate(np.where(self.novo_grupo, posicoes, 0)) if self.n else posicoes
+        self.inicios = np.flatnonzero(self.novo_grupo)
+        # Dias desde 1970 (NaN quando a avaliação não tem data)
+        segundos = self.datas.astype('int64').astype(float)
+        self.dias = np.where(np.isnat(self.datas), np.nan, segundos / SEGUNDOS_POR_DIA)
+
+    def coluna(self, medida):
+        return self.medidas[:, MEDIDAS.index(medida)]
+
+
+def carregar_avaliacoes(cliente_ids=None, desde=None, ate=None, filtros=()):
+    """Busca as avaliações (só as colunas numéricas) já ordenadas"""
+    colunas = [getattr(Avaliacao, medida) for medida in MEDIDAS]
+    query = db.session.query(Avaliacao.id, Avaliacao.cliente_id, Avaliacao.data_avaliacao, *colunas)
+    if cliente_ids is not None:
+        query = query.filter(Avaliacao.cliente_id.in_(list(cliente_ids)))
+    if desde is not None:
+        query = query.filter(Avaliacao.data_avaliacao >= desde)
+    if ate is not None:
+        query = query.filter(Avaliacao.data_avaliacao <= ate)
+    query = query.filter(*filtros).order_by(Avaliacao.cliente_id, Avaliacao.data_avaliacao, Avaliacao.id)
+    # Tuplas direto do Core, sem o processamento de linhas do Query
+    return Avaliacoes(db.session.execute(query.statement).fetchall())
+
+
+def _dividir(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        resultado = a / b
+    resultado[~np.isfinite(resultado)] = np.nan
+    return resultado
+
+
+def imc_efetivo(avaliacoes):
+    """IMC informado ou, na falta dele, peso / altura² (altura em cm ou m)"""
+    peso, altura, imc = (avaliacoes.coluna(m) for m in ('peso', 'altura', 'imc'))
+    altura_m = np.where(altura > 3, altura / 100, altura)
+    return np.where(np.isnan(imc), _dividir(peso, altura_m ** 2), imc)
+
+
+def calcular_evolucao(avaliacoes, janela=JANELA_MEDIA_MOVEL):
+    """Métricas por linha, todas com o formato (n, len(MEDIDAS))
+
+    delta: diferença para a avaliação anterior do mesmo cliente
+    desde_inicio: diferença para a primeira avaliação do cliente
+    media_movel: média das últimas `janela` avaliações (ignorando NaN)
+    taxa_30_dias: delta / dias entre as avaliações * 30
+    """
+    n = avaliacoes.n
+    medidas = avaliacoes.medidas.copy()
+    medidas[:, MEDIDAS.index('imc')] = imc_efetivo(avaliacoes)
+
+    delta = np.full_like(medidas, np.nan)
+    if n > 1:
+        delta[1:] = medidas[1:] - medidas[:-1]
+    delta[avaliacoes.novo_grupo] = np.nan
+
+    desde_inicio = medidas - medidas[avaliacoes.primeira] if n else medidas.copy()
+
+    dias_entre = np.full(n, np.nan)
+    if n > 1:
+        dias_entre[1:] = avaliacoes.dias[1:] - avaliacoes.dias[:-1]
+    dias_entre[avaliacoes.novo_grupo | (dias_entre <= 0)] = np.nan
+    taxa = _dividir(delta, dias_entre[:, None]) * DIAS_TAXA
+
+    # Média móvel por somas acumuladas: soma(lo..i) = acum[i+1] - acum[lo]
+    validos = ~np.isnan(medidas)
+    acumulado = np.zeros((n + 1, len(MEDIDAS)))
+    contagem = np.zeros((n + 1, len(MEDIDAS)))
+    np.cumsum(np.where(validos, medidas, 0.0), axis=0, out=acumulado[1:])
+    np.cumsum(validos, axis=0, out=contagem[1:])
+    posicoes = np.arange(n)
+    lo = np.maximum(posicoes - janela + 1, avaliacoes.primeira)
+    media_movel = _dividir(acumulado[posicoes + 1] - acumulado[lo], contagem[posicoes + 1] - contagem[lo])
+
+    rcq = _dividir(avaliacoes.coluna('cintura'), avaliacoes.coluna('quadril'))
+
+    return {
+        'medidas': medidas,
+        'delta': delta,
+        'desde_inicio': desde_inicio,
+        'media_movel': media_movel,
+        'taxa_30_dias': taxa,
+        'rcq': rcq,
+        'dias_entre': dias_entre,
+    }
+
+
+def resumir_por_cliente(avaliacoes, medidas):
+    """Primeira e última medida válida e tendência (regressão linear) por cliente
+
+    Retorna (clientes, quantidade, primeira, ultima, tendencia_30_dias).
+    """
+    inicios = avaliacoes.inicios
+    if not len(inicios):
+        vazio = np.empty((0, len(MEDIDAS)))
+        return avaliacoes.clientes[:0], np.empty(0, dtype=int), vazio, vazio, vazio
+
+    n = avaliacoes.n
+    quantidade = np.diff(np.append(inicios, n))
+    posicoes = np.arange(n)[:, None]
+    validos = ~np.isnan(medidas)
+
+    primeira_valida = np.minimum.reduceat(np.where(validos, posicoes, n), inicios, axis=0)
+    ultima_valida = np.maximum.reduceat(np.where(validos, posicoes, -1), inicios, axis=0)
+    colunas = np.arange(len(MEDIDAS))
+    primeira = np.where(primeira_valida < n, medidas[np.minimum(primeira_valida, n - 1), colunas], np.nan)
+    ultima = np.where(ultima_valida >= 0, medidas[np.maximum(ultima_valida, 0), colunas], np.nan)
+
+    # Inclinação de mínimos quadrados por grupo: x em dias desde a
+    # primeira avaliação do cliente, só nos pontos com medida e data
+    x = (avaliacoes.dias - avaliacoes.dias[avaliacoes.primeira])[:, None]
+    usar = validos & ~np.isnan(x)
+    xs = np.where(usar, x, 0.0)
+    ys = np.where(usar, medidas, 0.0)
+
+    def soma(valores):
+        return np.add.reduceat(valores, inicios, axis=0)
+
+    k, sx, sy, sxy, sxx = soma(usar.astype(float)), soma(xs), soma(ys), soma(xs * ys), soma(xs * xs)
+    inclinacao = _dividir(k * sxy - sx * sy, k * sxx - sx * sx)
+    inclinacao[k < 2] = np.nan
+
+    return avaliacoes.clientes[inicios], quantidade, primeira, ultima, inclinacao * DIAS_TAXA
+
+
+def _valores(linha):
+    """Linha de floats -> lista com None no lugar de NaN, 2 casas"""
+    arredondado = np.round(linha, 2).astype(object)
+    arredondado[np.isnan(linha)] = None
+    return arredondado.tolist()
+
+
+def _por_medida(linha):
+    return dict(zip(MEDIDAS, _valores(linha)))
+
+
+def evolucao_cliente(cliente_id, desde=None, ate=None):
+    """{avaliacoes: [...], resumo: {...}} de um cliente"""
+    avaliacoes = carregar_avaliacoes([cliente_id], desde, ate)
+    metricas = calcular_evolucao(avaliacoes)
+    rcq = _valores(metricas['rcq'])
+    dias_entre = _valores(metricas['dias_entre'])
+
+    linhas = []
+    for i in range(avaliacoes.n):
+        data = avaliacoes.datas[i]
+        linhas.append({
+            'id': int(avaliacoes.ids[i]),
+            'data_avaliacao': None if np.isnat(data) else str(data).replace('T', ' '),
+            'medidas': _por_medida(metricas['medidas'][i]),
+            'delta': _por_medida(metricas['delta'][i]),
+            'desde_inicio': _por_medida(metricas['desde_inicio'][i]),
+            'media_movel': _por_medida(metricas['media_movel'][i]),
+            'taxa_30_dias': _por_medida(metricas['taxa_30_dias'][i]),
+            'rcq': rcq[i],
+            'dias_desde_anterior': dias_entre[i],
+        })
+
+    _, quantidade, primeira, ultima, tendencia = resumir_por_cliente(avaliacoes, metricas['medidas'])
+    resumo = None
+    if len(quantidade):
+        resumo = {
+            'avaliacoes': int(quantidade[0]),
+            'primeira': _por_medida(primeira[0]),
+            'ultima': _por_medida(ultima[0]),
+            'variacao_total': _por_medida(ultima[0] - primeira[0]),
+            'tendencia_30_dias': _por_medida(tendencia[0]),
+        }
+    return {'cliente_id': cliente_id, 'avaliacoes': linhas, 'resumo': resumo}
+
+
+def evolucao_coorte(cliente_ids=None, desde=None, ate=None, filtros=()):
+    """Resumo por cliente e agregado (média/mediana da variação) da coorte"""
+    avaliacoes = carregar_avaliacoes(cliente_ids, desde, ate, filtros)
+    metricas = calcular_evolucao(avaliacoes)
+    clientes, quantidade, primeira, ultima, tendencia = resumir_por_cliente(avaliacoes, metricas['medidas'])
+    variacao = ultima - primeira
+
+    # Agregado só entre clientes com pelo menos duas avaliações
+    comparaveis = quantidade >= 2
+    agregado = {}
+    for j, medida in enumerate(MEDIDAS):
+        valores = variacao[comparaveis, j]
+        valores = valores[~np.isnan(valores)]
+        agregado[medida] = {
+            'clientes': int(valores.size),
+            'variacao_media': round(float(valores.mean()), 2) if valores.size else None,
+            'variacao_mediana': round(float(np.median(valores)), 2) if valores.size else None,
+        }
+
+    return {
+        'clientes': [
+            {
+                'cliente_id': int(clientes[i]),
+                'avaliacoes': int(quantidade[i]),
+                'variacao_total': _por_medida(variacao[i]),
+                'tendencia_30_dias': _por_medida(tendencia[i]),
+            }
+            for i in range(len(clientes))
+        ],
+        'agregado': agregado,
+        'total_avaliacoes': avaliacoes.n,
+    }
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Assinatura do banco para os índices em memória
+
+Os índices em memória (etiquetas, similaridade, agenda) percebem
+alterações feitas fora do ORM deste processo (importadores, outro
+worker) comparando uma assinatura das suas tabelas (contagens e
+máximos) com a lida na última carga, no máximo uma vez a cada
+INTERVALO_VERIFICACAO segundos.
+
+Commits deste processo entram no índice na hora, mas a assinatura
+guardada continua a da carga: na verificação seguinte ela difere e o
+índice é recarregado. Adotar a assinatura nova sem recarregar perderia
+o que outro processo tivesse gravado no mesmo intervalo.
+"""
+
+import time
+
+INTERVALO_VERIFICACAO = 5
+
+
+class AssinaturaBanco:
+    """Assinatura lida na última carga de um índice
+
+    ler: função sem argumentos que devolve a assinatura atual (tupla).
+    """
+
+    def __init__(self, ler):
+        self._ler = ler
+        self.valor = None
+        self.verificado_em = 0.0
+
+    def registrar(self):
+        """Lê a assinatura; chamar antes de ler os dados do índice
+
+        Assim uma gravação que aconteça durante a carga muda a assinatura
+        e provoca outra carga, em vez de passar despercebida.
+        """
+        self.valor = self._ler()
+        self.verificado_em = time.monotonic()
+
+    def mudou(self):
+        """O banco mudou desde a carga? Lê o banco no máximo uma vez por intervalo"""
+        if time.monotonic() - self.verificado_em < INTERVALO_VERIFICACAO:
+            return False
+        self.verificado_em = time.monotonic()
+        return self._ler() != self.valor
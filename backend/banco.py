@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Ajustes do engine do banco
+"""
+
+from sqlalchemy import event
+
+
+def configurar_engine(engine, pragmas):
+    """Aplica os PRAGMAs do SQLite em toda conexão nova do pool
+
+    journal_mode=WAL faz as leituras (dashboard) continuarem enquanto
+    uma escrita longa (importação) está em andamento. Em outros bancos
+    não faz nada.
+    """
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _aplicar_pragmas(conexao_dbapi, registro_conexao):
+        cursor = conexao_dbapi.cursor()
+        try:
+            for nome, valor in pragmas.items():
+                cursor.execute(f'PRAGMA {nome}={valor}')
+        finally:
+            cursor.close()
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Benchmarks do backend
+
+Uso:
+  python3 -m backend.benchmarks sqlite [clientes] [segundos]
+  python3 -m backend.benchmarks serializacao [clientes]
+  python3 -m backend.benchmarks lote [clientes ...]
+"""
+
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import create_engine, select
+from sqlalchemy.exc import OperationalError
+from backend.banco import configurar_engine
+from backend.config import Config, ProductionConfig
+from backend.models import db, Cliente, Etiqueta
+from backend.paginacao import CAMPOS_CLIENTE, consulta_projetada
+from backend.serializacao import OrjsonProvider, orjson, serializar_linhas
+
+
+def _linhas_clientes(inicio, quantidade):
+    agora = datetime.utcnow()
+    return [
+        {
+            'nome': f'Cliente {i}',
+            'email': f'cliente{i}@exemplo.com',
+            'telefone': f'(11) 9{i:08d}',
+            'status': 'ativo',
+            'observacoes': 'x' * 200,
+            'data_nascimento': date(1970, 1, 1) + timedelta(days=i % 15000),
+            'data_vencimento': date(2025, 1, 1) + timedelta(days=i % 365),
+            'data_cadastro': agora,
+            'atualizado_em': agora,
+        }
+        for i in range(inicio, inicio + quantidade)
+    ]
+
+
+def _percentis(latencias):
+    if not latencias:
+        return 'sem leituras'
+    ordenadas = sorted(latencias)
+
+    def p(q):
+        return ordenadas[min(int(q * len(ordenadas)), len(ordenadas) - 1)] * 1000
+
+    return (f"p50 {p(0.50):6.2f}ms  p95 {p(0.95):6.2f}ms  p99 {p(0.99):7.2f}ms  "
+            f"max {ordenadas[-1] * 1000:7.2f}ms  ({len(ordenadas)} leituras)")
+
+
+def _medir_leituras(engine, segundos, parar, latencias, erros):
+    consulta = select(Cliente.id, Cliente.nome, Cliente.status).order_by(Cliente.id.desc()).limit(100)
+    fim = time.monotonic() + segundos
+    while time.monotonic() < fim and not parar.is_set():
+        inicio = time.perf_counter()
+        try:
+            with engine.connect() as conexao:
+                conexao.execute(consulta).all()
+            latencias.append(time.perf_counter() - inicio)
+        except OperationalError:
+            erros.append(time.perf_counter() - inicio)
+        time.sleep(0.002)
+
+
+def _escrever_em_lotes(engine, parar, proximo_id, tamanho_lote=20000):
+    while not parar.is_set():
+        with engine.begin() as conexao:
+            conexao.execute(Cliente.__table__.insert(), _linhas_clientes(proximo_id[0], tamanho_lote))
+        proximo_id[0] += tamanho_lote
+
+
+def benchmark_sqlite(clientes=50000, segundos=5):
+    """Latência de leitura com e sem escrita em massa concorrente
+
+    Compara o SQLite padrão (journal DELETE) com o perfil do
+    ProductionConfig (WAL + pragmas + pool).
+    """
+    perfis = [
+        ('padrão', Config.SQLITE_PRAGMAS, {}),
+        ('ProductionConfig', ProductionConfig.SQLITE_PRAGMAS, ProductionConfig.SQLALCHEMY_ENGINE_OPTIONS),
+    ]
+    print(f"\n⏱️  SQLite: leituras durante importação ({clientes} clientes, {segundos}s por fase)\n")
+
+    for nome, pragmas, opcoes in perfis:
+        with tempfile.TemporaryDirectory() as pasta:
+            engine = create_engine(f"sqlite:///{os.path.join(pasta, 'bench.db')}", **opcoes)
+            configurar_engine(engine, pragmas)
+            db.metadata.create_all(engine)
+            with engine.begin() as conexao:
+                conexao.execute(Cliente.__table__.insert(), _linhas_clientes(0, clientes))
+
+            parar = threading.Event()
+            ociosas, erros_ociosas = [], []
+            _medir_leituras(engine, segundos, parar, ociosas, erros_ociosas)
+
+            durante, erros_durante = [], []
+            proximo_id = [clientes]
+            escritor = threading.Thread(target=_escrever_em_lotes, args=(engine, parar, proximo_id))
+            escritor.start()
+            _medir_leituras(engine, segundos, parar, durante, erros_durante)
+            parar.set()
+            escritor.join()
+            engine.dispose()
+
+            print(f"  [{nome}]")
+            print(f"    sem escrita: {_percentis(ociosas)}")
+            print(f"    com escrita: {_percentis(durante)}")
+            print(f"    linhas escritas: {proximo_id[0] - clientes}, leituras com erro: {len(erros_durante)}\n")
+
+
+def _melhor_tempo(funcao, repeticoes=3):
+    tempos = []
+    for _ in range(repeticoes):
+        db.session.expunge_all()
+        inicio = time.perf_counter()
+        tamanho = len(funcao())
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), tamanho
+
+
+def _pico_memoria(funcao):
+    db.session.expunge_all()
+    tracemalloc.start()
+    try:
+        funcao()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_serializacao(clientes=10000):
+    """Listagem completa de clientes: to_dict + jsonify x tuplas + orjson
+
+    Mede consulta + serialização, como na rota GET /api/clientes. O
+    tempo sai sem tracemalloc ativo para não distorcer a comparação.
+    """
+    with tempfile.TemporaryDirectory() as pasta:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(pasta, 'bench.db')}"
+        db.init_app(app)
+        with app.app_context():
+            db.create_all()
+            db.session.execute(Cliente.__table__.insert(), _linhas_clientes(0, clientes))
+            db.session.commit()
+
+            padrao = DefaultJSONProvider(app)
+            padrao.compact = True
+
+            def orm_to_dict():
+                return padrao.dumps([cliente.to_dict() for cliente in Cliente.query.all()])
+
+            def tuplas(provider):
+                def serializar():
+                    linhas = consulta_projetada(CAMPOS_CLIENTE).order_by(Cliente.id).all()
+                    return provider.dumps(serializar_linhas(linhas, CAMPOS_CLIENTE, Cliente))
+                return serializar
+
+            variantes = [
+                ('ORM + to_dict + json', orm_to_dict),
+                ('tuplas + datas em bloco + json', tuplas(padrao)),
+            ]
+            if orjson is not None:
+                rapido = OrjsonProvider(app)
+                rapido.compact = True
+                variantes.append(('tuplas + datas em bloco + orjson', tuplas(rapido)))
+            else:
+                print("  (orjson não instalado: variante com orjson ignorada)")
+
+            # Mesmo conteúdo nas três variantes
+            referencia = json.loads(orm_to_dict())
+            for _, funcao in variantes[1:]:
+                assert json.loads(funcao()) == referencia
+
+            print(f"\n⏱️  Serialização de {clientes} clientes (melhor de 3)\n")
+            base = None
+            for nome, funcao in variantes:
+                tempo, tamanho = _melhor_tempo(funcao)
+                pico = _pico_memoria(funcao)
+                base = base or tempo
+                print(f"  {nome:34s} {tempo * 1000:8.1f}ms  ({base / tempo:4.1f}x)  "
+                      f"pico {pico / 1024 / 1024:6.1f}MB  {tamanho / 1024:,.0f}KB")
+            print()
+
+
+def _app_temporario(caminho):
+    """App com as rotas do backend sobre um banco SQLite descartável"""
+    from backend.migracoes import aplicar_migracoes
+    from backend.routes import main
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{caminho}'
+    db.init_app(app)
+    with app.app_context():
+        aplicar_migracoes()
+    app.register_blueprint(main)
+    return app
+
+
+def benchmark_lote(*tamanhos):
+    """Status + etiqueta para N clientes: um request por cliente x /api/clientes/lote
+
+    O caminho por item é o que o front faz hoje: PUT /api/clientes/<id>
+    e POST /api/clientes/<id>/etiquetas/<eid>, cada um com seu commit.
+    """
+    print("\n⏱️  Alteração em lote (status + etiqueta)\n")
+    for clientes in tamanhos or (1000, 10000):
+        with tempfile.TemporaryDirectory() as pasta:
+            app = _app_temporario(os.path.join(pasta, 'bench.db'))
+            with app.app_context():
+                db.session.execute(Cliente.__table__.insert(), _linhas_clientes(0, clientes))
+                # Uma etiqueta para cada caminho: o lote também precisa inserir tudo
+                db.session.add_all([Etiqueta(nome='Por item', cor='#000000'), Etiqueta(nome='Lote', cor='#000000')])
+                db.session.commit()
+                por_item_id = Etiqueta.query.filter_by(nome='Por item').one().id
+                lote_id = Etiqueta.query.filter_by(nome='Lote').one().id
+                ids = [id for (id,) in db.session.query(Cliente.id).order_by(Cliente.id)]
+
+            cliente_http = app.test_client()
+
+            inicio = time.perf_counter()
+            for id in ids:
+                cliente_http.put(f'/api/clientes/{id}', json={'status': 'pausado'})
+                cliente_http.post(f'/api/clientes/{id}/etiquetas/{por_item_id}')
+            por_item = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            resposta = cliente_http.post('/api/clientes/lote', json={
+                'ids': ids,
+                'alteracoes': {'status': 'ativo'},
+                'adicionar_etiquetas': [lote_id],
+            })
+            em_lote = time.perf_counter() - inicio
+            assert resposta.status_code == 200 and resposta.json['atualizados'] == clientes
+
+            print(f"  {clientes:>6} clientes   por item {por_item:8.2f}s   "
+                  f"lote {em_lote * 1000:8.1f}ms   ({por_item / em_lote:,.0f}x)")
+    print()
+
+
+BENCHMARKS = {
+    'sqlite': benchmark_sqlite,
+    'serializacao': benchmark_serializacao,
+    'lote': benchmark_lote,
+}
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print(__doc__)
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](*[int(arg) for arg in sys.argv[2:]])
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Índice de busca textual de clientes
+
+SQLite: tabela virtual FTS5 (clientes_fts) mantida por triggers.
+Postgres: índice GIN sobre um tsvector calculado a partir das colunas.
+Nos dois casos a busca ignora acentos e maiúsculas ("joao" encontra
+"João") e os resultados vêm ordenados por relevância.
+
+O índice casa palavras pelo começo, e não trechos do meio como o antigo
+ilike '%q%'. Para telefone e email, onde se costuma digitar um pedaço
+qualquer, buscas só com dígitos ou com "@" também procuram o trecho
+(varrendo a tabela) e os resultados extras vêm depois dos do índice.
+Nos demais casos "ilva" não encontra mais "Silva".
+"""
+
+import re
+from sqlalchemy import column, table, text
+from backend.models import db, Cliente
+
+# Remove a formatação do telefone para que "11987654321" encontre
+# "(11) 98765-4321"
+_DIGITOS_SQLITE = (
+    "replace(replace(replace(replace(replace(replace(coalesce({col}, ''), "
+    "' ', ''), '(', ''), ')', ''), '-', ''), '+', ''), '.', '')"
+)
+
+_COLUNAS_FTS = 'nome, email, telefone, objetivos, observacoes, telefone_digitos'
+
+_DIGITOS_POSTGRES = "regexp_replace(coalesce({col}, ''), '\\D', '', 'g')"
+
+# Busca por trecho do telefone só a partir de tantos dígitos
+DIGITOS_MINIMOS_TRECHO = 3
+
+
+def _valores_fts(prefixo):
+    return ', '.join([
+        f'{prefixo}.nome', f'{prefixo}.email', f'{prefixo}.telefone',
+        f'{prefixo}.objetivos', f'{prefixo}.observacoes',
+        _DIGITOS_SQLITE.format(col=f'{prefixo}.telefone'),
+    ])
+
+
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS clientes_fts USING fts5(
+        {_COLUNAS_FTS},
+        tokenize = 'unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS clientes_fts_ai AFTER INSERT ON clientes BEGIN
+        INSERT INTO clientes_fts(rowid, {_COLUNAS_FTS}) VALUES (new.id, {_valores_fts('new')});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS clientes_fts_ad AFTER DELETE ON clientes BEGIN
+        DELETE FROM clientes_fts WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS clientes_fts_au
+        AFTER UPDATE OF nome, email, telefone, objetivos, observacoes ON clientes BEGIN
+        DELETE FROM clientes_fts WHERE rowid = old.id;
+        INSERT INTO clientes_fts(rowid, {_COLUNAS_FTS}) VALUES (new.id, {_valores_fts('new')});
+    END""",
+]
+
+# Pesos do bm25 na ordem das colunas: nome pesa mais que as observações
+SQLITE_RANK = 'bm25(clientes_fts, 10.0, 5.0, 5.0, 1.0, 1.0, 5.0)'
+
+# O tsvector precisa ser idêntico no índice e na consulta para o
+# Postgres usar o GIN
+POSTGRES_VETOR = (
+    "setweight(to_tsvector('simple', andenutri_unaccent(coalesce(nome, ''))), 'A') || "
+    "setweight(to_tsvector('simple', andenutri_unaccent("
+    "coalesce(email, '') || ' ' || coalesce(telefone, '') || ' ' || "
+    "regexp_replace(coalesce(telefone, ''), '\\D', '', 'g'))), 'B') || "
+    "setweight(to_tsvector('simple', andenutri_unaccent("
+    "coalesce(objetivos, '') || ' ' || coalesce(observacoes, ''))), 'C')"
+)
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    # unaccent() não é IMMUTABLE, o que impede seu uso em índices
+    """CREATE OR REPLACE FUNCTION andenutri_unaccent(text) RETURNS text AS
+        $$ SELECT public.unaccent('public.unaccent', $1) $$
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT""",
+    f"CREATE INDEX IF NOT EXISTS ix_clientes_busca ON clientes USING GIN (({POSTGRES_VETOR}))",
+]
+
+
+def _dialeto():
+    return db.engine.dialect.name
+
+
+def inicializar_indice_busca():
+    """Cria o índice de busca (idempotente). Chamar dentro do app context."""
+    dialeto = _dialeto()
+
+    if dialeto == 'sqlite':
+        existia = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'clientes_fts'"
+        )).first() is not None
+        for ddl in SQLITE_DDL:
+            db.session.execute(text(ddl))
+        db.session.commit()
+        if not existia:
+            reconstruir_indice_busca()
+    elif dialeto == 'postgresql':
+        for ddl in POSTGRES_DDL:
+            db.session.execute(text(ddl))
+        db.session.commit()
+
+
+def reconstruir_indice_busca():
+    """Recria o conteúdo do FTS5 a partir da tabela clientes"""
+    if _dialeto() != 'sqlite':
+        return  # No Postgres o índice de expressão nunca fica defasado
+
+    db.session.execute(text('DELETE FROM clientes_fts'))
+    db.session.execute(text(
+        f"INSERT INTO clientes_fts(rowid, {_COLUNAS_FTS}) "
+        f"SELECT c.id, {_valores_fts('c')} FROM clientes c"
+    ))
+    db.session.commit()
+
+
+def _termos(busca):
+    """Quebra a busca em palavras (letras/dígitos), descartando pontuação"""
+    return re.findall(r'\w+', busca.lower())
+
+
+def _filtro_trecho(busca, dialeto):
+    """Trecho de email ("silva@") ou de telefone ("98765"); None nos outros casos"""
+    busca = busca.strip()
+    if '@' in busca:
+        return Cliente.email.icontains(busca, autoescape=True)
+    digitos = re.sub(r'\D', '', busca)
+    if len(digitos) >= DIGITOS_MINIMOS_TRECHO and re.fullmatch(r'[\d\s()+.-]+', busca):
+        formato = _DIGITOS_SQLITE if dialeto == 'sqlite' else _DIGITOS_POSTGRES
+        return text(f"{formato.format(col='clientes.telefone')} LIKE :busca_digitos").bindparams(
+            busca_digitos=f'%{digitos}%'
+        )
+    return None
+
+
+def buscar_clientes(busca, limite=None, opcoes=()):
+    """Busca clientes pelo índice textual, mais relevantes primeiro
+
+    Cada palavra digitada funciona como prefixo e todas precisam
+    aparecer (AND), então "mar sil" encontra "Maria da Silva". Trechos
+    de telefone/email que o índice não cobre vêm no fim da lista.
+    """
+    termos = _termos(busca)
+    if not termos:
+        return []
+
+    query = Cliente.query.options(*opcoes)
+    dialeto = _dialeto()
+
+    if dialeto == 'sqlite':
+        fts = table('clientes_fts', column('rowid'))
+        expressao = ' '.join(f'"{termo}"*' for termo in termos)
+        query = query.join(fts, fts.c.rowid == Cliente.id).filter(
+            text('clientes_fts MATCH :busca_fts')
+        ).params(busca_fts=expressao).order_by(text(SQLITE_RANK))
+    elif dialeto == 'postgresql':
+        expressao = ' & '.join(f'{termo}:*' for termo in termos)
+        tsquery = "to_tsquery('simple', andenutri_unaccent(:busca_fts))"
+        query = query.filter(
+            text(f'({POSTGRES_VETOR}) @@ {tsquery}')
+        ).params(busca_fts=expressao).order_by(
+            text(f'ts_rank(({POSTGRES_VETOR}), {tsquery}) DESC')
+        )
+    else:
+        # Outros bancos: busca simples sem índice
+        for termo in termos:
+            query = query.filter(
+                (Cliente.nome.ilike(f'%{termo}%')) |
+                (Cliente.email.ilike(f'%{termo}%')) |
+                (Cliente.telefone.ilike(f'%{termo}%'))
+            )
+        query = query.order_by(Cliente.nome)
+
+    if limite:
+        query = query.limit(limite)
+    clientes = query.all()
+
+    trecho = _filtro_trecho(busca, dialeto) if dialeto in ('sqlite', 'postgresql') else None
+    if trecho is not None and not (limite and len(clientes) >= limite):
+        extras = Cliente.query.options(*opcoes).filter(trecho)
+        if clientes:
+            extras = extras.filter(Cliente.id.notin_([cliente.id for cliente in clientes]))
+        extras = extras.order_by(Cliente.nome)
+        if limite:
+            extras = extras.limit(limite - len(clientes))
+        clientes += extras.all()
+    return clientes
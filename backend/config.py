@@ -6,6 +6,7 @@ ANDENUTRI - Configurações
 
 import os
 from pathlib import Path
+from sqlalchemy.pool import QueuePool
 
 # Base directory
 BASE_DIR = Path(__file__).parent.parent
@@ -19,6 +20,14 @@ class Config:
     # Database
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f'sqlite:///{BASE_DIR}/andenutri.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLITE_PRAGMAS = {}  # Aplicados em cada conexão (ver backend/banco.py)
+    
+    # JSON: usa orjson nas respostas quando instalado (ver backend/serializacao.py)
+    JSON_ORJSON = True
+    
+    # /api/dashboard/stats lê a tabela contadores_clientes em vez de
+    # contar os clientes (ver backend/estatisticas.py)
+    ESTATISTICAS_MATERIALIZADAS = True
     
     # Uploads
     UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
@@ -49,11 +58,38 @@ class DevelopmentConfig(Config):
 class ProductionConfig(Config):
     DEBUG = False
     TESTING = False
+    
+    # SQLite em WAL: leituras não esperam as escritas (importações)
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',      # seguro com WAL, fsync só no checkpoint
+        'mmap_size': 268435456,       # 256MB
+        'cache_size': -65536,         # 64MB (negativo = KiB)
+        'busy_timeout': 5000,         # ms esperando lock antes de "database is locked"
+        'temp_store': 'MEMORY',
+    }
+    
+    # Pool explícito: o padrão para SQLite varia entre versões do SQLAlchemy
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': QueuePool,
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        'pool_recycle': 3600,
+        'pool_pre_ping': True,
+    }
+
+class TestingConfig(Config):
+    TESTING = True
+    
+    # Banco em memória, novo a cada create_app (ver tests/conftest.py)
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
 
 # Dictionary mapping config names
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
 
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Métricas derivadas das avaliações
+
+IMC, relação cintura/quadril (RCQ) e diferença para a avaliação
+anterior do mesmo cliente ficam gravados na própria avaliação. O
+cálculo roda no flush de qualquer Avaliacao inserida, alterada ou
+removida (na mesma transação), refazendo o histórico dos clientes
+afetados, já que mudar uma avaliação muda o delta da seguinte.
+
+Uso:
+  python3 -m backend.derivadas preencher [tamanho_lote]
+"""
+
+import sys
+from sqlalchemy import bindparam, event, inspect, select
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from backend.models import db, Avaliacao
+
+# Medidas com coluna delta_<medida>
+CAMPOS_DELTA = ('peso', 'imc', 'cintura', 'quadril')
+
+COLUNAS_DERIVADAS = ('imc', 'rcq') + tuple(f'delta_{campo}' for campo in CAMPOS_DELTA)
+
+# Colunas que, alteradas, exigem recalcular o histórico do cliente
+CAMPOS_ORIGEM = ('cliente_id', 'data_avaliacao', 'peso', 'altura', 'imc', 'cintura', 'quadril')
+
+# Alturas acima disso estão em centímetros (mesma regra da análise)
+ALTURA_MAXIMA_METROS = 3
+
+# Clientes por lote no preenchimento (e por SELECT, limite de parâmetros do SQLite)
+TAMANHO_LOTE_PADRAO = 500
+
+
+def _arredondar(valor, casas=2):
+    return None if valor is None else round(valor, casas)
+
+
+def calcular_imc(peso, altura):
+    """peso / altura², com altura em metros ou centímetros; None se faltar dado"""
+    if not peso or not altura:
+        return None
+    altura_m = altura / 100 if altura > ALTURA_MAXIMA_METROS else altura
+    return _arredondar(peso / altura_m ** 2)
+
+
+def calcular_rcq(cintura, quadril):
+    if not cintura or not quadril:
+        return None
+    return _arredondar(cintura / quadril, 3)
+
+
+def derivar_historico(linhas):
+    """Colunas derivadas de cada avaliação de um cliente
+
+    linhas em ordem de data, com id, peso, altura, imc, cintura e
+    quadril. O IMC informado só é mantido quando não há peso e altura
+    para calculá-lo. Retorna {id: {coluna: valor}}.
+    """
+    derivadas = {}
+    anterior = None
+    for linha in linhas:
+        imc = calcular_imc(linha.peso, linha.altura)
+        valores = {
+            'imc': linha.imc if imc is None else imc,
+            'rcq': calcular_rcq(linha.cintura, linha.quadril),
+        }
+        medidas = {campo: getattr(linha, campo) for campo in CAMPOS_DELTA}
+        medidas['imc'] = valores['imc']
+        for campo in CAMPOS_DELTA:
+            valor = medidas[campo]
+            valor_anterior = anterior[campo] if anterior else None
+            valores[f'delta_{campo}'] = (
+                None if valor is None or valor_anterior is None else _arredondar(valor - valor_anterior)
+            )
+        derivadas[linha.id] = valores
+        anterior = medidas
+    return derivadas
+
+
+def atualizar_derivadas(conexao, cliente_ids):
+    """Recalcula o histórico dos clientes e grava só as linhas que mudaram
+
+    Retorna {id: {coluna: valor}} das avaliações atualizadas.
+    """
+    tabela = Avaliacao.__table__
+    colunas = [tabela.c[nome] for nome in ('id', 'cliente_id', 'peso', 'altura', 'cintura', 'quadril')]
+    colunas += [tabela.c[nome] for nome in COLUNAS_DERIVADAS]
+    cliente_ids = sorted(set(cliente_ids))
+
+    alteradas = {}
+    for i in range(0, len(cliente_ids), TAMANHO_LOTE_PADRAO):
+        linhas = conexao.execute(
+            select(*colunas)
+            .where(tabela.c.cliente_id.in_(cliente_ids[i:i + TAMANHO_LOTE_PADRAO]))
+            .order_by(tabela.c.cliente_id, tabela.c.data_avaliacao, tabela.c.id)
+        ).all()
+
+        por_cliente = {}
+        for linha in linhas:
+            por_cliente.setdefault(linha.cliente_id, []).append(linha)
+        gravadas = {linha.id: linha for linha in linhas}
+        for historico in por_cliente.values():
+            for id, valores in derivar_historico(historico).items():
+                if any(getattr(gravadas[id], coluna) != valor for coluna, valor in valores.items()):
+                    alteradas[id] = valores
+
+    if alteradas:
+        conexao.execute(
+            tabela.update()
+            .where(tabela.c.id == bindparam('_id'))
+            .values({coluna: bindparam(coluna) for coluna in COLUNAS_DERIVADAS}),
+            [dict(valores, _id=id) for id, valores in alteradas.items()]
+        )
+    return alteradas
+
+
+def preencher_derivadas(tamanho_lote=TAMANHO_LOTE_PADRAO, confirmar=True, mostrar=False):
+    """Preenche as colunas derivadas de todas as avaliações, por lotes de clientes
+
+    Com confirmar=True faz commit a cada lote (memória e lock de escrita
+    limitados ao lote). Retorna o número de avaliações alteradas.
+    """
+    total = 0
+    ultimo = 0
+    while True:
+        cliente_ids = [
+            id for (id,) in db.session.query(Avaliacao.cliente_id)
+            .filter(Avaliacao.cliente_id > ultimo)
+            .distinct().order_by(Avaliacao.cliente_id).limit(tamanho_lote)
+        ]
+        if not cliente_ids:
+            break
+        total += len(atualizar_derivadas(db.session.connection(), cliente_ids))
+        if confirmar:
+            db.session.commit()
+        ultimo = cliente_ids[-1]
+        if mostrar:
+            print(f"   ... clientes até #{ultimo}: {total} avaliações atualizadas")
+    return total
+
+
+# Cálculo na escrita: no after_flush a sessão ainda mostra o que foi
+# inserido, alterado e removido, e as linhas já estão no banco
+
+def _clientes_afetados(session):
+    cliente_ids = set()
+    for objeto in session.new | session.deleted:
+        if isinstance(objeto, Avaliacao) and objeto.cliente_id is not None:
+            cliente_ids.add(objeto.cliente_id)
+    for objeto in session.dirty:
+        if not isinstance(objeto, Avaliacao):
+            continue
+        estado = inspect(objeto)
+        if any(estado.attrs[campo].history.has_changes() for campo in CAMPOS_ORIGEM):
+            cliente_ids.add(objeto.cliente_id)
+            # Avaliação transferida: o histórico antigo também muda
+            cliente_ids.update(estado.attrs.cliente_id.history.deleted)
+    cliente_ids.discard(None)
+    return cliente_ids
+
+
+@event.listens_for(Session, 'after_flush')
+def _derivar_no_flush(session, flush_context):
+    cliente_ids = _clientes_afetados(session)
+    if not cliente_ids:
+        return
+    alteradas = atualizar_derivadas(session.connection(), cliente_ids)
+
+    # Objetos já carregados recebem os valores sem ficarem "sujos"
+    mapper = inspect(Avaliacao)
+    for id, valores in alteradas.items():
+        objeto = session.identity_map.get(mapper.identity_key_from_primary_key([id]))
+        if objeto is not None:
+            for coluna, valor in valores.items():
+                set_committed_value(objeto, coluna, valor)
+
+
+if __name__ == '__main__':
+    from backend import create_app
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'preencher':
+        print(__doc__)
+        sys.exit(1)
+
+    tamanho_lote = int(sys.argv[2]) if len(sys.argv) > 2 else TAMANHO_LOTE_PADRAO
+    app = create_app()
+    with app.app_context():
+        print(f"🔄 Preenchendo métricas derivadas ({tamanho_lote} clientes por lote)")
+        total = preencher_derivadas(tamanho_lote, mostrar=True)
+        print(f"✅ {total} avaliações atualizadas")
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Estatísticas do dashboard
+
+Contagens de clientes por status, status do plano, Herbalife, indicação
+e desafio. Calculadas com um único GROUP BY ou lidas da tabela
+contadores_clientes, que é mantida na mesma transação de cada escrita
+(eventos do ORM, operações em lote e importadores), deixando o
+endpoint O(1) no número de clientes.
+
+Custo na escrita: toda transação que grava clientes atualiza as
+mesmas poucas linhas de contadores (uma por campo e valor) e, no
+Postgres, segura o lock delas até o commit, então escritores
+concorrentes de clientes esperam uns pelos outros. Por isso os
+ajustes de um flush inteiro (e de cada lote das importações e
+operações em lote) viram um único upsert, com as linhas sempre na
+mesma ordem para as transações não travarem em ciclo.
+
+Uso:
+  python3 -m backend.estatisticas            (mostra as contagens)
+  python3 -m backend.estatisticas recalcular (reconstrói os contadores)
+"""
+
+import sys
+from collections import Counter
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects.postgresql import insert as insert_postgresql
+from sqlalchemy.dialects.sqlite import insert as insert_sqlite
+from sqlalchemy.orm import Session
+from backend.models import db, Cliente, ContadorClientes
+from backend.vencimento import consulta_vencendo
+
+CAMPOS_ESTATISTICAS = ('status', 'status_plano', 'compra_herbalife', 'foi_indicacao', 'esta_desafio')
+
+# Chave usada para NULL/vazio (a coluna valor é parte da chave primária)
+VALOR_VAZIO = 'nao_informado'
+
+DIAS_VENCENDO = 7
+
+# Ids por SELECT ao contar um lote (limite de parâmetros do SQLite)
+TAMANHO_PEDACO = 500
+
+
+def _chave(valor):
+    return VALOR_VAZIO if valor in (None, '') else str(valor)
+
+
+def _agrupar(linhas):
+    """[(valores dos CAMPOS_ESTATISTICAS..., quantidade)] -> Counter {(campo, valor): n}"""
+    contagem = Counter()
+    for *valores, quantidade in linhas:
+        for campo, valor in zip(CAMPOS_ESTATISTICAS, valores):
+            contagem[(campo, _chave(valor))] += quantidade
+    return contagem
+
+
+def _consulta_agrupada():
+    colunas = [getattr(Cliente, campo) for campo in CAMPOS_ESTATISTICAS]
+    return db.session.query(*colunas, func.count(Cliente.id)).group_by(*colunas)
+
+
+def contar_banco():
+    """Um único GROUP BY pelos cinco campos (as combinações são poucas)"""
+    return _agrupar(_consulta_agrupada())
+
+
+def contar_ids(ids):
+    """Contagens só dos clientes informados, como estão agora na transação"""
+    contagem = Counter()
+    ids = list(ids)
+    for i in range(0, len(ids), TAMANHO_PEDACO):
+        contagem += _agrupar(_consulta_agrupada().filter(Cliente.id.in_(ids[i:i + TAMANHO_PEDACO])))
+    return contagem
+
+
+def contar_mapeamentos(mapeamentos):
+    """Contagens de dicts que vão para um bulk insert (com os defaults das colunas)"""
+    padroes = {}
+    for campo in CAMPOS_ESTATISTICAS:
+        default = Cliente.__table__.c[campo].default
+        padroes[campo] = default.arg if default is not None and default.is_scalar else None
+    contagem = Counter()
+    for dados in mapeamentos:
+        for campo in CAMPOS_ESTATISTICAS:
+            contagem[(campo, _chave(dados.get(campo, padroes[campo])))] += 1
+    return contagem
+
+
+def diferenca(antes, depois):
+    """depois - antes mantendo os negativos (Counter - Counter os descarta)"""
+    deltas = Counter(depois)
+    deltas.subtract(antes)
+    return deltas
+
+
+def ajustar_contadores(conexao, deltas):
+    """Soma os deltas {(campo, valor): n} nos contadores, na conexão/transação dada
+
+    Um só INSERT ... ON CONFLICT DO UPDATE: duas transações criando o
+    primeiro cliente com um valor novo não disputam o mesmo INSERT.
+    """
+    tabela = ContadorClientes.__table__
+    linhas = [
+        {'campo': campo, 'valor': valor, 'total': delta}
+        for (campo, valor), delta in sorted(deltas.items()) if delta
+    ]
+    if not linhas:
+        return
+    inserir = {'sqlite': insert_sqlite, 'postgresql': insert_postgresql}.get(conexao.dialect.name)
+    if inserir is not None:
+        comando = inserir(tabela)
+        conexao.execute(comando.on_conflict_do_update(
+            index_elements=[tabela.c.campo, tabela.c.valor],
+            set_={'total': tabela.c.total + comando.excluded.total}
+        ), linhas)
+        return
+
+    # Outros bancos: UPDATE e INSERT se a linha ainda não existe
+    for linha in linhas:
+        resultado = conexao.execute(
+            tabela.update()
+            .where(tabela.c.campo == linha['campo'], tabela.c.valor == linha['valor'])
+            .values(total=tabela.c.total + linha['total'])
+        )
+        if resultado.rowcount == 0:
+            conexao.execute(tabela.insert().values(**linha))
+
+
+def recalcular_contadores():
+    """Reconstrói a tabela de contadores a partir de clientes (commit fica com quem chama)"""
+    db.session.execute(ContadorClientes.__table__.delete())
+    linhas = [
+        {'campo': campo, 'valor': valor, 'total': total}
+        for (campo, valor), total in contar_banco().items()
+    ]
+    if linhas:
+        db.session.execute(ContadorClientes.__table__.insert(), linhas)
+
+
+def _montar(contagem, materializadas):
+    resultado = {campo: {} for campo in CAMPOS_ESTATISTICAS}
+    for (campo, valor), total in contagem.items():
+        if total and campo in resultado:
+            resultado[campo][valor] = total
+    resultado['total'] = sum(resultado['status'].values())
+    # Depende da data de hoje, então não dá para materializar; usa o
+    # índice de data_vencimento
+    resultado[f'vencendo_{DIAS_VENCENDO}_dias'] = consulta_vencendo(DIAS_VENCENDO).count()
+    resultado['materializadas'] = materializadas
+    return resultado
+
+
+def estatisticas_dashboard(materializadas=True):
+    """Contagens do dashboard, dos contadores ou de um GROUP BY"""
+    if materializadas:
+        linhas = db.session.query(ContadorClientes.campo, ContadorClientes.valor, ContadorClientes.total)
+        return _montar(Counter({(campo, valor): total for campo, valor, total in linhas}), True)
+    return _montar(contar_banco(), False)
+
+
+# Manutenção dos contadores pelo ORM: os eventos de cada cliente só
+# acumulam deltas na sessão, e o after_flush grava tudo de uma vez na
+# conexão do flush, então o ajuste entra (ou é desfeito) junto com a
+# escrita dos clientes
+
+def _pendentes(cliente):
+    sessao = Session.object_session(cliente)
+    return sessao.info.setdefault('contadores_pendentes', Counter())
+
+
+def _valores_anteriores(cliente):
+    estado = inspect(cliente)
+    anteriores = {}
+    for campo in CAMPOS_ESTATISTICAS:
+        historico = estado.attrs[campo].history
+        anteriores[campo] = historico.deleted[0] if historico.deleted else getattr(cliente, campo)
+    return anteriores
+
+
+def _carregar_anterior(cliente, valor, anterior, iniciador):
+    """Só liga o active_history do atributo"""
+
+
+# Sem active_history, alterar um atributo expirado (qualquer cliente
+# depois de um commit) não carrega o valor anterior, e o contador
+# antigo nunca seria decrementado
+for _campo in CAMPOS_ESTATISTICAS:
+    event.listen(getattr(Cliente, _campo), 'set', _carregar_anterior, active_history=True)
+
+
+@event.listens_for(Cliente, 'after_insert')
+def _cliente_inserido(mapper, connection, cliente):
+    _pendentes(cliente).update(
+        (campo, _chave(getattr(cliente, campo))) for campo in CAMPOS_ESTATISTICAS
+    )
+
+
+@event.listens_for(Cliente, 'after_update')
+def _cliente_atualizado(mapper, connection, cliente):
+    anteriores = _valores_anteriores(cliente)
+    deltas = _pendentes(cliente)
+    for campo in CAMPOS_ESTATISTICAS:
+        antes, depois = _chave(anteriores[campo]), _chave(getattr(cliente, campo))
+        if antes != depois:
+            deltas[(campo, antes)] -= 1
+            deltas[(campo, depois)] += 1
+
+
+@event.listens_for(Cliente, 'after_delete')
+def _cliente_removido(mapper, connection, cliente):
+    anteriores = _valores_anteriores(cliente)
+    _pendentes(cliente).subtract(
+        (campo, _chave(anteriores[campo])) for campo in CAMPOS_ESTATISTICAS
+    )
+
+
+@event.listens_for(Session, 'after_flush')
+def _gravar_pendentes(session, flush_context):
+    deltas = session.info.pop('contadores_pendentes', None)
+    if deltas:
+        ajustar_contadores(session.connection(), deltas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_pendentes(session):
+    session.info.pop('contadores_pendentes', None)
+
+
+if __name__ == '__main__':
+    import json
+    from backend import create_app
+
+    app = create_app()
+    with app.app_context():
+        if len(sys.argv) > 1 and sys.argv[1] == 'recalcular':
+            recalcular_contadores()
+            db.session.commit()
+            print("✅ Contadores recalculados")
+        elif len(sys.argv) > 1:
+            print(__doc__)
+            sys.exit(1)
+        materializadas = estatisticas_dashboard(True)
+        calculadas = estatisticas_dashboard(False)
+        print(json.dumps(materializadas, indent=2, ensure_ascii=False))
+        del materializadas['materializadas'], calculadas['materializadas']
+        if materializadas != calculadas:
+            print("⚠️  Contadores diferentes do GROUP BY: rode 'recalcular'")
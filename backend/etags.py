@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - GET condicional (ETag / If-None-Match)
+
+O front consulta /api/clientes o tempo todo. Com ETag fraca calculada
+só a partir de atualizado_em, a resposta 304 sai sem carregar nem
+serializar os clientes.
+"""
+
+import hashlib
+from functools import wraps
+from flask import abort, make_response, request
+from sqlalchemy import func
+from backend.models import db, Cliente
+from backend.serializacao import quer_ndjson
+
+
+def _gerar_etag(*partes):
+    bruto = '|'.join(str(parte) for parte in partes).encode('utf-8')
+    return hashlib.sha1(bruto).hexdigest()[:32]
+
+
+def etag_clientes():
+    """Coleção: quantidade de clientes + maior atualizado_em
+
+    Inclui a query string e o formato (JSON/NDJSON), que mudam o
+    conteúdo da resposta. Uma inclusão muda o max(atualizado_em) e uma
+    remoção muda a contagem.
+    """
+    total, ultima_alteracao = db.session.query(
+        func.count(Cliente.id), func.max(Cliente.atualizado_em)
+    ).one()
+    return _gerar_etag(
+        'clientes', total, ultima_alteracao,
+        request.query_string.decode('latin-1'), quer_ndjson()
+    )
+
+
+def etag_cliente(id):
+    """Cliente único: id + atualizado_em (404 se não existe)"""
+    linha = db.session.query(Cliente.atualizado_em).filter(Cliente.id == id).first()
+    if linha is None:
+        abort(404)
+    return _gerar_etag('cliente', id, linha.atualizado_em)
+
+
+def condicional(calcular_etag):
+    """Decorator: responde 304 se o If-None-Match bate com a ETag atual
+
+    calcular_etag recebe os valores da URL da view por posição, na ordem
+    da rota (o nome do parâmetro na view não importa: /clientes/<int:id>
+    e /clientes/<int:cliente_id> chamam etag_cliente(valor)). Só
+    respostas 200 levam a ETag.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = calcular_etag(*args, *kwargs.values())
+            if request.if_none_match.contains_weak(etag):
+                resposta = make_response('', 304)
+            else:
+                resposta = make_response(view(*args, **kwargs))
+                if resposta.status_code != 200:
+                    return resposta
+            resposta.set_etag(etag, weak=True)
+            # O navegador pode guardar, mas sempre revalida
+            resposta.headers['Cache-Control'] = 'no-cache'
+            return resposta
+        return wrapper
+    return decorator
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Importação de clientes em lotes
+
+Lê as linhas como gerador, insere em lotes com bulk_insert_mappings e
+faz commit por lote: memória constante e uma linha ruim não desfaz a
+importação inteira. Linhas rejeitadas vão para um CSV à parte com o
+número da linha original e o motivo.
+"""
+
+import csv
+import hashlib
+import os
+import time
+from bisect import bisect_right, insort
+from datetime import datetime
+from sqlalchemy.exc import SQLAlchemyError
+from backend.models import db, Cliente, ImportacaoJournal
+from backend.estatisticas import ajustar_contadores, contar_ids, contar_mapeamentos, diferenca
+from backend.similaridade import normalizar_email, normalizar_nome, normalizar_whatsapp
+
+TAMANHO_LOTE_PADRAO = 1000
+
+# Campos comparados no upsert para decidir entre atualizar e ignorar
+CAMPOS_COMPARADOS = [
+    'nome', 'email', 'telefone', 'whatsapp', 'status', 'plano_ativo',
+    'objetivos', 'observacoes', 'data_nascimento', 'data_vencimento',
+]
+
+# Sufixos dos emails inventados pelos importadores quando a planilha
+# não tem email (cliente_<nome>@sememail.com, herbalife_<id>@importado.com;
+# importações antigas usavam cliente_<posição da linha>@importado.com)
+DOMINIOS_EMAIL_TEMPORARIO = ('@sememail.com', '@importado.com')
+
+# Telefones com menos dígitos que isso não servem de chave no upsert
+TELEFONE_MINIMO = 8
+
+
+class LinhaRejeitada(ValueError):
+    """Linha que não pode ser importada (dados obrigatórios ausentes etc.)"""
+
+
+def ler_csv(nome_arquivo, encoding='utf-8'):
+    """Gera (numero_linha, row) sem carregar o arquivo inteiro"""
+    with open(nome_arquivo, 'r', encoding=encoding, newline='') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def ler_excel(nome_arquivo, skiprows=0, aba=None):
+    """Gera (numero_linha, row) de uma planilha sem carregá-la inteira
+
+    Usa o modo read_only do openpyxl, que lê o XML da aba em fluxo.
+    skiprows tem o mesmo sentido do pd.read_excel: linhas ignoradas
+    antes do cabeçalho. numero_linha é a linha do Excel (começa em 1).
+    """
+    from openpyxl import load_workbook
+
+    wb = load_workbook(nome_arquivo, read_only=True, data_only=True)
+    try:
+        ws = wb[aba] if aba else wb.worksheets[0]
+        linhas = ws.iter_rows(values_only=True)
+        for _ in range(skiprows):
+            if next(linhas, None) is None:
+                return
+
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+        cabecalho = [
+            str(col).strip() if col is not None else f'Unnamed: {i}'
+            for i, col in enumerate(cabecalho)
+        ]
+
+        for numero_linha, valores in enumerate(linhas, start=skiprows + 2):
+            if all(valor is None or valor == '' for valor in valores):
+                continue
+            yield numero_linha, dict(zip(cabecalho, valores))
+    finally:
+        wb.close()
+
+
+def hash_arquivo(caminho):
+    """sha256 do conteúdo, lido em blocos"""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+
+class JournalImportacao:
+    """Checkpoint de uma importação no banco (tabela importacao_journal)
+
+    A linha do journal é alterada na mesma transação de cada lote, então
+    ultima_linha nunca aponta para dados que não foram gravados. Rodar a
+    importação de novo com o mesmo arquivo pula o que já foi gravado.
+    """
+
+    def __init__(self, arquivo, recomecar=False):
+        self.hash = hash_arquivo(arquivo)
+        registro = ImportacaoJournal.query.filter_by(arquivo_hash=self.hash).first()
+        if registro is None:
+            registro = ImportacaoJournal(arquivo_hash=self.hash, nome_arquivo=os.path.basename(arquivo))
+            db.session.add(registro)
+        elif recomecar:
+            registro.ultima_linha = 0
+            registro.inseridos = 0
+            registro.atualizados = 0
+            registro.rejeitados = 0
+            registro.status = 'em_andamento'
+            registro.iniciado_em = datetime.utcnow()
+        db.session.commit()
+
+        self.registro = registro
+        self.linha_inicial = registro.ultima_linha
+        self.rejeitados_iniciais = registro.rejeitados
+
+    @property
+    def concluida(self):
+        return self.registro.status == 'concluida'
+
+    @property
+    def retomando(self):
+        return self.linha_inicial > 0 and not self.concluida
+
+    def marcar(self, ultima_linha, inseridos, atualizados, rejeitados):
+        """Atualiza o checkpoint; o commit é o do lote"""
+        registro = self.registro
+        registro.ultima_linha = max(registro.ultima_linha, ultima_linha)
+        registro.inseridos += inseridos
+        registro.atualizados += atualizados
+        registro.rejeitados = self.rejeitados_iniciais + rejeitados
+
+    def concluir(self, ultima_linha, rejeitados):
+        self.marcar(ultima_linha, 0, 0, rejeitados)
+        self.registro.status = 'concluida'
+        db.session.commit()
+
+
+def abrir_journal(arquivo, recomecar=False):
+    """Abre o checkpoint do arquivo; None se ele já foi importado por inteiro"""
+    journal = JournalImportacao(arquivo, recomecar=recomecar)
+    if journal.concluida:
+        concluida_em = journal.registro.atualizado_em.strftime('%d/%m/%Y %H:%M')
+        print(f"✅ {os.path.basename(arquivo)} já foi importado em {concluida_em} "
+              f"(use --recomecar para importar de novo)")
+        return None
+    if journal.retomando:
+        print(f"⏩ Retomando a importação a partir da linha {journal.linha_inicial + 1}")
+    return journal
+
+
+class ArquivoRejeitados:
+    """CSV com as linhas rejeitadas (aberto só se houver rejeição)
+
+    Com anexar=True (importação retomada) continua o arquivo existente.
+    As rejeições são gravadas na hora, mas o checkpoint só anda no
+    commit do lote: com ate_linha, as linhas do arquivo depois do
+    checkpoint saem antes de retomar, já que serão lidas (e rejeitadas)
+    de novo.
+    """
+
+    def __init__(self, caminho, anexar=False, ate_linha=None):
+        self.caminho = caminho
+        self.anexar = anexar
+        self._arquivo = None
+        self._writer = None
+        self.total = 0
+        self._linhas = []  # números das linhas rejeitadas, em ordem
+        if anexar and ate_linha is not None and caminho is not None:
+            self._descartar_depois_de(ate_linha)
+
+    def _descartar_depois_de(self, ate_linha):
+        if not os.path.exists(self.caminho):
+            return
+        temporario = f"{self.caminho}.tmp"
+        with open(self.caminho, 'r', encoding='utf-8', newline='') as origem, \
+                open(temporario, 'w', encoding='utf-8', newline='') as destino:
+            leitor = csv.reader(origem)
+            escritor = csv.writer(destino)
+            cabecalho = next(leitor, None)
+            if cabecalho is not None:
+                escritor.writerow(cabecalho)
+                posicao = cabecalho.index('linha')
+                escritor.writerows(linha for linha in leitor if int(linha[posicao]) <= ate_linha)
+        os.replace(temporario, self.caminho)
+
+    def _abrir(self, row):
+        campos = None
+        if self.anexar and os.path.exists(self.caminho) and os.path.getsize(self.caminho) > 0:
+            with open(self.caminho, 'r', encoding='utf-8', newline='') as f:
+                campos = next(csv.reader(f), None)
+        self._arquivo = open(self.caminho, 'a' if campos else 'w', encoding='utf-8', newline='')
+        novo = campos is None
+        if novo:
+            campos = ['linha', 'erro'] + [campo for campo in row.keys() if campo not in ('linha', 'erro')]
+        self._writer = csv.DictWriter(self._arquivo, fieldnames=campos, extrasaction='ignore')
+        if novo:
+            self._writer.writeheader()
+
+    def ate(self, numero_linha):
+        """Rejeições até a linha (inclusive), as que valem para um checkpoint nela"""
+        return bisect_right(self._linhas, numero_linha)
+
+    def registrar(self, numero_linha, row, erro):
+        self.total += 1
+        insort(self._linhas, numero_linha)
+        if self.caminho is None:
+            return
+        if self._writer is None:
+            self._abrir(row)
+        self._writer.writerow({**row, 'linha': numero_linha, 'erro': str(erro)})
+
+    def fechar(self):
+        if self._arquivo is not None:
+            self._arquivo.close()
+
+
+def _completar_mapping(dados):
+    """Preenche os defaults que o bulk insert não aplica via ORM"""
+    agora = datetime.utcnow()
+    dados.setdefault('status', 'inativo')
+    dados.setdefault('tempo_acesso_ativo', True)
+    dados.setdefault('data_cadastro', agora)
+    dados.setdefault('atualizado_em', agora)
+    return dados
+
+
+def email_temporario(email):
+    """Emails gerados pelos importadores para quem não tem email"""
+    return normalizar_email(email).endswith(DOMINIOS_EMAIL_TEMPORARIO)
+
+
+def _telefones(dados):
+    """Telefone/WhatsApp só com dígitos, ignorando valores curtos demais"""
+    digitos = {normalizar_whatsapp(dados.get(campo)) for campo in ('telefone', 'whatsapp')}
+    return [numero for numero in digitos if len(numero) >= TELEFONE_MINIMO]
+
+
+class IndiceClientesExistentes:
+    """Hash dos clientes já no banco para classificar linhas do upsert
+
+    Carrega uma vez as chaves (email normalizado, telefones só com
+    dígitos) e os valores dos CAMPOS_COMPARADOS de cada cliente; depois
+    cada linha é classificada em memória como inserir, atualizar ou
+    ignorar.
+    """
+
+    def __init__(self):
+        self.por_chave = {}  # (tipo, chave) -> id
+        self.valores = {}
+        self.pendentes = set()  # chaves de inserts ainda sem id
+        colunas = [getattr(Cliente, campo) for campo in CAMPOS_COMPARADOS]
+        for linha in db.session.query(Cliente.id, *colunas).yield_per(5000):
+            self.registrar(linha[0], dict(zip(CAMPOS_COMPARADOS, linha[1:])))
+
+    def _chaves(self, dados):
+        chaves = []
+        email = normalizar_email(dados.get('email'))
+        # Email real identifica o cliente; depois telefone. O email
+        # temporário só vale junto com o nome: sozinho ele pode ter vindo
+        # da posição da linha numa planilha antiga e ser de outra pessoa
+        if email and not email_temporario(email):
+            chaves.append(('email', email))
+        chaves.extend(('telefone', numero) for numero in _telefones(dados))
+        if email and email_temporario(email):
+            chaves.append(('temporario', (email, normalizar_nome(dados.get('nome')))))
+        return chaves
+
+    def registrar(self, id, dados):
+        for chave in self._chaves(dados):
+            self.por_chave.setdefault(chave, id)
+        self.valores[id] = {campo: dados.get(campo) for campo in CAMPOS_COMPARADOS}
+
+    def localizar(self, dados):
+        for chave in self._chaves(dados):
+            if chave in self.por_chave:
+                return self.por_chave[chave]
+        return None
+
+    def pendente(self, dados):
+        """A linha bate com um insert do lote ainda não gravado?"""
+        return any(chave in self.pendentes for chave in self._chaves(dados))
+
+    def classificar(self, dados):
+        """Devolve ('inserir', dados), ('atualizar', mudanças) ou ('ignorar', None)"""
+        id = self.localizar(dados)
+        if id is None:
+            self.pendentes.update(self._chaves(dados))
+            return 'inserir', _completar_mapping(dados)
+
+        atuais = self.valores[id]
+        mudancas = {}
+        for campo in CAMPOS_COMPARADOS:
+            valor = dados.get(campo)
+            # Vazio na planilha não apaga o que já foi preenchido
+            if valor in (None, ''):
+                continue
+            if campo == 'email' and email_temporario(valor):
+                continue
+            if valor != atuais.get(campo):
+                mudancas[campo] = valor
+
+        if not mudancas:
+            return 'ignorar', None
+        mudancas['id'] = id
+        mudancas['atualizado_em'] = datetime.utcnow()
+        return 'atualizar', mudancas
+
+    def confirmar(self, lote):
+        """Atualiza o índice depois do commit de um lote"""
+        for _, _, acao, dados in lote:
+            if acao == 'inserir':
+                self.registrar(dados['id'], dados)
+            else:
+                self.registrar(dados['id'], {**self.valores[dados['id']], **dados})
+        self.pendentes.clear()
+
+
+def _gravar_lote(lote, rejeitados, indice=None, journal=None):
+    """Grava um lote; se o commit falhar, isola as linhas problemáticas
+
+    O lote com erro é dividido ao meio recursivamente, então poucas
+    linhas ruins custam O(k log n) commits em vez de um por linha.
+    Retorna (inseridos, atualizados).
+    """
+    inserir = [dados for _, _, acao, dados in lote if acao == 'inserir']
+    atualizar = [dados for _, _, acao, dados in lote if acao == 'atualizar']
+    try:
+        # Bulk não dispara os eventos do ORM: contadores do dashboard
+        # ajustados aqui, na mesma transação
+        deltas = contar_mapeamentos(inserir)
+        if inserir:
+            # No upsert os ids gerados alimentam o índice em memória
+            db.session.bulk_insert_mappings(Cliente, inserir, return_defaults=indice is not None)
+        if atualizar:
+            ids = [dados['id'] for dados in atualizar]
+            antes = contar_ids(ids)
+            db.session.bulk_update_mappings(Cliente, atualizar)
+            deltas.update(diferenca(antes, contar_ids(ids)))
+        ajustar_contadores(db.session.connection(), deltas)
+        if journal is not None:
+            # Num lote dividido, linhas já rejeitadas depois deste pedaço
+            # serão lidas de novo se a importação parar aqui
+            journal.marcar(lote[-1][0], len(inserir), len(atualizar), rejeitados.ate(lote[-1][0]))
+        db.session.commit()
+        if indice is not None:
+            indice.confirmar(lote)
+        return len(inserir), len(atualizar)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        if len(lote) == 1:
+            numero_linha, row, _, _ = lote[0]
+            rejeitados.registrar(numero_linha, row, getattr(e, 'orig', e))
+            return 0, 0
+
+    meio = len(lote) // 2
+    primeira = _gravar_lote(lote[:meio], rejeitados, indice, journal)
+    segunda = _gravar_lote(lote[meio:], rejeitados, indice, journal)
+    return primeira[0] + segunda[0], primeira[1] + segunda[1]
+
+
+def importar_em_lotes(linhas, mapear, tamanho_lote=TAMANHO_LOTE_PADRAO,
+                      arquivo_rejeitados=None, mostrar_progresso=True, upsert=False,
+                      rejeitados=None, journal=None):
+    """Importa (numero_linha, row) em lotes. Chamar dentro do app context.
+
+    mapear(row) devolve o dict de colunas do Cliente ou levanta
+    LinhaRejeitada/ValueError para mandar a linha ao arquivo de
+    rejeitados.
+
+    Com upsert=True a linha que já existe no banco (mesmo email ou
+    telefone normalizado; email temporário só com o mesmo nome) vira
+    UPDATE só dos campos que mudaram, e a que não mudou nada é
+    ignorada: reimportar a mesma planilha não duplica nem falha.
+
+    rejeitados permite passar um ArquivoRejeitados já aberto (por
+    exemplo, para contar rejeições por arquivo de origem).
+
+    Com um JournalImportacao as linhas até o último checkpoint são
+    puladas e cada lote grava o novo checkpoint na mesma transação.
+    """
+    linha_inicial = journal.linha_inicial if journal is not None else 0
+    if rejeitados is None:
+        anexar = journal is not None and journal.retomando
+        rejeitados = ArquivoRejeitados(arquivo_rejeitados, anexar=anexar, ate_linha=linha_inicial)
+    indice = IndiceClientesExistentes() if upsert else None
+    inicio = time.monotonic()
+    lidas = 0
+    inseridos = 0
+    atualizados = 0
+    ignorados = 0
+    pulados = 0
+    ultima_linha = linha_inicial
+    lote = []
+
+    def progresso():
+        if mostrar_progresso:
+            decorrido = max(time.monotonic() - inicio, 1e-9)
+            print(f"  ✓ {lidas} linhas lidas, {inseridos} inseridas, {atualizados} atualizadas, "
+                  f"{ignorados} sem mudança, {rejeitados.total} rejeitadas "
+                  f"({lidas / decorrido:.0f} linhas/s)")
+
+    def gravar():
+        nonlocal inseridos, atualizados, lote
+        novos, alterados = _gravar_lote(lote, rejeitados, indice, journal)
+        inseridos += novos
+        atualizados += alterados
+        lote = []
+        progresso()
+
+    try:
+        for numero_linha, row in linhas:
+            if numero_linha <= linha_inicial:
+                pulados += 1
+                continue
+            lidas += 1
+            ultima_linha = numero_linha
+            try:
+                dados = mapear(row)
+            except ValueError as e:
+                rejeitados.registrar(numero_linha, row, e)
+                continue
+
+            if indice is None:
+                acao, dados = 'inserir', _completar_mapping(dados)
+            else:
+                # Mesma pessoa duas vezes no lote: grava antes para a
+                # segunda ocorrência virar update do insert da primeira
+                if indice.pendente(dados):
+                    gravar()
+                acao, dados = indice.classificar(dados)
+                if acao == 'ignorar':
+                    ignorados += 1
+                    continue
+
+            lote.append((numero_linha, row, acao, dados))
+            if len(lote) >= tamanho_lote:
+                gravar()
+
+        if lote:
+            gravar()
+        if journal is not None:
+            journal.concluir(ultima_linha, rejeitados.total)
+    finally:
+        rejeitados.fechar()
+
+    return {
+        'pulados': pulados,
+        'lidas': lidas,
+        'inseridos': inseridos,
+        'atualizados': atualizados,
+        'ignorados': ignorados,
+        'rejeitados': rejeitados.total,
+        'segundos': round(time.monotonic() - inicio, 3),
+    }
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Índice de etiquetas em bitsets
+
+Para cada etiqueta um int do Python funciona como bitset dos ids de
+cliente (bit n ligado = cliente n tem a etiqueta). Consultas como
+"Em Desafio E Reavaliação E NÃO Inativo" viram &, | e ~ entre inteiros,
+sem JOIN em cliente_etiquetas. O índice é carregado do banco na
+inicialização do app, atualizado a cada commit e recarregado quando a
+assinatura do banco muda (backend/assinatura.py).
+
+O resultado vira um Cliente.id IN (...) com os ids no SQL. Quando o
+filtro é amplo (ex.: not_tags=Inativo em dezenas de milhares de
+clientes) esse IN custaria mais que o ganho do índice, e a consulta
+usa EXISTS em cliente_etiquetas, que o banco resolve pelo índice
+(cliente_id, etiqueta_id).
+"""
+
+import threading
+from sqlalchemy import and_, bindparam, event, exists, func, true
+from sqlalchemy.orm import Session
+from backend.models import db, Cliente, Etiqueta, ClienteEtiqueta
+from backend.assinatura import AssinaturaBanco
+from backend.paginacao import ParametroInvalido
+
+# Acima disso o filtro vai como EXISTS em vez de IN com os ids literais
+LIMITE_IDS_SQL = 1000
+
+# Posições dos bits ligados de cada byte, para converter bitset em ids
+_BITS_DO_BYTE = [tuple(i for i in range(8) if byte >> i & 1) for byte in range(256)]
+
+
+def bitset_de_ids(ids):
+    """Monta o bitset de uma lista de ids de uma vez (bytearray -> int)"""
+    ids = list(ids)
+    if not ids:
+        return 0
+    bytes_ = bytearray(max(ids) // 8 + 1)
+    for id in ids:
+        bytes_[id >> 3] |= 1 << (id & 7)
+    return int.from_bytes(bytes_, 'little')
+
+
+def ids_de_bitset(bits):
+    """Ids em ordem crescente"""
+    if not bits:
+        return []
+    ids = []
+    for posicao, byte in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, 'little')):
+        if byte:
+            base = posicao << 3
+            ids.extend(base + bit for bit in _BITS_DO_BYTE[byte])
+    return ids
+
+
+class IndiceEtiquetas:
+    """etiqueta_id -> bitset de clientes, mais o bitset de todos os clientes"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.assinatura = AssinaturaBanco(self._assinatura_banco)
+        self._limpar()
+
+    def _limpar(self):
+        self.por_etiqueta = {}
+        self.por_nome = {}  # nome em minúsculas -> etiqueta_id
+        self.todos = 0
+        self.carregado = False
+
+    def _assinatura_banco(self):
+        clientes = db.session.query(func.count(Cliente.id), func.max(Cliente.id)).one()
+        vinculos = db.session.query(func.count(ClienteEtiqueta.id), func.max(ClienteEtiqueta.id)).one()
+        etiquetas = db.session.query(func.count(Etiqueta.id), func.max(Etiqueta.id)).one()
+        return tuple(clientes) + tuple(vinculos) + tuple(etiquetas)
+
+    def carregar(self):
+        """(Re)constrói o índice a partir do banco"""
+        with self._lock:
+            self._limpar()
+            self.assinatura.registrar()
+            for id, nome in db.session.query(Etiqueta.id, Etiqueta.nome):
+                self.por_nome[nome.lower()] = id
+                self.por_etiqueta[id] = 0
+
+            por_etiqueta = {}
+            vinculos = db.session.query(ClienteEtiqueta.etiqueta_id, ClienteEtiqueta.cliente_id)
+            for etiqueta_id, cliente_id in vinculos.yield_per(10000):
+                por_etiqueta.setdefault(etiqueta_id, []).append(cliente_id)
+            for etiqueta_id, ids in por_etiqueta.items():
+                self.por_etiqueta[etiqueta_id] = bitset_de_ids(ids)
+
+            self.todos = bitset_de_ids(id for (id,) in db.session.query(Cliente.id).yield_per(10000))
+            self.carregado = True
+
+    def _garantir_atualizado(self):
+        if not self.carregado or self.assinatura.mudou():
+            self.carregar()
+
+    def aplicar(self, alteracoes):
+        """Aplica alterações [(tipo, ...)] confirmadas no banco
+
+        ('vinculo', cliente_id, etiqueta_id, ligado), ('cliente', id, existe)
+        ou ('etiqueta', id, nome ou None para remoção).
+        """
+        with self._lock:
+            if not self.carregado:
+                return  # Será carregado completo na primeira consulta
+            for alteracao in alteracoes:
+                tipo = alteracao[0]
+                if tipo == 'vinculo':
+                    _, cliente_id, etiqueta_id, ligado = alteracao
+                    bits = self.por_etiqueta.get(etiqueta_id, 0)
+                    self.por_etiqueta[etiqueta_id] = bits | (1 << cliente_id) if ligado else bits & ~(1 << cliente_id)
+                elif tipo == 'cliente':
+                    _, cliente_id, existe = alteracao
+                    if existe:
+                        self.todos |= 1 << cliente_id
+                    else:
+                        self.todos &= ~(1 << cliente_id)
+                        for etiqueta_id, bits in self.por_etiqueta.items():
+                            self.por_etiqueta[etiqueta_id] = bits & ~(1 << cliente_id)
+                elif tipo == 'etiqueta':
+                    _, etiqueta_id, nome = alteracao
+                    self.por_nome = {n: i for n, i in self.por_nome.items() if i != etiqueta_id}
+                    if nome is None:
+                        self.por_etiqueta.pop(etiqueta_id, None)
+                    else:
+                        self.por_nome[nome.lower()] = etiqueta_id
+                        self.por_etiqueta.setdefault(etiqueta_id, 0)
+
+    def resolver(self, etiqueta):
+        """Id da etiqueta a partir do id (texto) ou do nome; None se não existe"""
+        with self._lock:
+            self._garantir_atualizado()
+            etiqueta = etiqueta.strip()
+            if etiqueta.isdigit():
+                id = int(etiqueta)
+                return id if id in self.por_etiqueta else None
+            return self.por_nome.get(etiqueta.lower())
+
+    def filtrar(self, com=(), sem=()):
+        """Bitset dos clientes com todas as etiquetas de com e nenhuma de sem"""
+        with self._lock:
+            self._garantir_atualizado()
+            bits = self.todos
+            for etiqueta_id in com:
+                bits &= self.por_etiqueta.get(etiqueta_id, 0)
+            for etiqueta_id in sem:
+                bits &= ~self.por_etiqueta.get(etiqueta_id, 0)
+            return bits
+
+
+indice_etiquetas = IndiceEtiquetas()
+
+
+def filtro_ids(ids):
+    """Cliente.id IN (...) com os valores no SQL, sem limite de parâmetros"""
+    return Cliente.id.in_(bindparam('ids_etiquetas', ids, expanding=True, literal_execute=True))
+
+
+def filtro_exists(com=(), sem=()):
+    """Mesmo filtro de IndiceEtiquetas.filtrar, em SQL (EXISTS por etiqueta)"""
+    def tem(etiqueta_id):
+        return exists().where(ClienteEtiqueta.cliente_id == Cliente.id, ClienteEtiqueta.etiqueta_id == etiqueta_id)
+    return and_(true(), *[tem(id) for id in com], *[~tem(id) for id in sem])
+
+
+def ler_filtro_etiquetas(tags, not_tags):
+    """Converte ?tags=&not_tags= (ids ou nomes, separados por vírgula) em filtro SQL
+
+    Retorna None quando nenhum dos dois foi informado.
+    """
+    if not tags and not not_tags:
+        return None
+
+    def resolver(valor, parametro):
+        ids = []
+        for etiqueta in (valor or '').split(','):
+            if not etiqueta.strip():
+                continue
+            id = indice_etiquetas.resolver(etiqueta)
+            if id is None:
+                raise ParametroInvalido(f'{parametro}: etiqueta não encontrada: {etiqueta.strip()}')
+            ids.append(id)
+        return ids
+
+    com, sem = resolver(tags, 'tags'), resolver(not_tags, 'not_tags')
+    bits = indice_etiquetas.filtrar(com, sem)
+    if bits.bit_count() > LIMITE_IDS_SQL:
+        return filtro_exists(com, sem)
+    return filtro_ids(ids_de_bitset(bits))
+
+
+# Sincronização incremental: mudanças do flush ficam pendentes na
+# sessão e só entram no índice depois do commit
+
+def registrar_alteracoes(session, alteracoes):
+    """Enfileira alterações feitas fora do ORM (ex.: operações em lote)"""
+    session.info.setdefault('etiquetas_pendentes', []).extend(alteracoes)
+
+
+@event.listens_for(ClienteEtiqueta, 'after_insert')
+def _vinculo_criado(mapper, connection, vinculo):
+    sessao = Session.object_session(vinculo)
+    if sessao is not None:
+        registrar_alteracoes(sessao, [('vinculo', vinculo.cliente_id, vinculo.etiqueta_id, True)])
+
+
+@event.listens_for(ClienteEtiqueta, 'after_delete')
+def _vinculo_removido(mapper, connection, vinculo):
+    sessao = Session.object_session(vinculo)
+    if sessao is not None:
+        registrar_alteracoes(sessao, [('vinculo', vinculo.cliente_id, vinculo.etiqueta_id, False)])
+
+
+@event.listens_for(Cliente, 'after_insert')
+def _cliente_criado(mapper, connection, cliente):
+    sessao = Session.object_session(cliente)
+    if sessao is not None:
+        registrar_alteracoes(sessao, [('cliente', cliente.id, True)])
+
+
+@event.listens_for(Cliente, 'after_delete')
+def _cliente_removido(mapper, connection, cliente):
+    sessao = Session.object_session(cliente)
+    if sessao is not None:
+        registrar_alteracoes(sessao, [('cliente', cliente.id, False)])
+
+
+@event.listens_for(Etiqueta, 'after_insert')
+@event.listens_for(Etiqueta, 'after_update')
+def _etiqueta_salva(mapper, connection, etiqueta):
+    sessao = Session.object_session(etiqueta)
+    if sessao is not None:
+        registrar_alteracoes(sessao, [('etiqueta', etiqueta.id, etiqueta.nome)])
+
+
+@event.listens_for(Etiqueta, 'after_delete')
+def _etiqueta_removida(mapper, connection, etiqueta):
+    sessao = Session.object_session(etiqueta)
+    if sessao is not None:
+        registrar_alteracoes(sessao, [('etiqueta', etiqueta.id, None)])
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_pendentes(session):
+    alteracoes = session.info.pop('etiquetas_pendentes', None)
+    if alteracoes:
+        indice_etiquetas.aplicar(alteracoes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_pendentes(session):
+    session.info.pop('etiquetas_pendentes', None)
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Operações em lote sobre clientes
+
+Status, plano e etiquetas de muitos clientes alterados em uma única
+transação, com UPDATE/INSERT/DELETE por conjunto de ids em vez de um
+request (e um commit) por cliente.
+"""
+
+from datetime import datetime
+from backend.models import db, Cliente, Etiqueta, ClienteEtiqueta
+from backend.paginacao import ParametroInvalido
+from backend.indice_etiquetas import registrar_alteracoes
+from backend.estatisticas import CAMPOS_ESTATISTICAS, ajustar_contadores, contar_ids, diferenca
+
+# Campos de Cliente que podem ser alterados em lote
+CAMPOS_LOTE = ('status', 'plano_ativo', 'status_plano')
+
+# Filtros aceitos no lugar da lista de ids
+FILTROS_LOTE = ('status', 'plano_ativo', 'status_plano', 'etiqueta_id')
+
+# Ids por comando SQL (limite de parâmetros do SQLite)
+TAMANHO_PEDACO = 500
+
+
+def _pedacos(ids):
+    for i in range(0, len(ids), TAMANHO_PEDACO):
+        yield ids[i:i + TAMANHO_PEDACO]
+
+
+def _ler_ids(valores, nome):
+    if not isinstance(valores, list):
+        raise ParametroInvalido(f'{nome} deve ser uma lista de ids')
+    try:
+        return [int(valor) for valor in valores]
+    except (TypeError, ValueError):
+        raise ParametroInvalido(f'{nome} deve conter apenas números inteiros')
+
+
+def ler_operacao(dados):
+    """Valida o corpo do request e devolve a operação normalizada
+
+    {ids | filtro, alteracoes, adicionar_etiquetas, remover_etiquetas}
+    """
+    if not isinstance(dados, dict):
+        raise ParametroInvalido('Corpo JSON inválido')
+
+    if ('ids' in dados) == ('filtro' in dados):
+        raise ParametroInvalido('Informe ids ou filtro (apenas um dos dois)')
+
+    operacao = {
+        'ids': None,
+        'filtro': None,
+        'alteracoes': dados.get('alteracoes') or {},
+        'adicionar_etiquetas': _ler_ids(dados.get('adicionar_etiquetas', []), 'adicionar_etiquetas'),
+        'remover_etiquetas': _ler_ids(dados.get('remover_etiquetas', []), 'remover_etiquetas'),
+    }
+
+    if 'ids' in dados:
+        operacao['ids'] = list(dict.fromkeys(_ler_ids(dados['ids'], 'ids')))
+    else:
+        filtro = dados['filtro']
+        if not isinstance(filtro, dict) or not filtro:
+            raise ParametroInvalido('filtro deve ser um objeto não vazio')
+        invalidos = [campo for campo in filtro if campo not in FILTROS_LOTE]
+        if invalidos:
+            raise ParametroInvalido(f"Filtros inválidos: {', '.join(invalidos)}")
+        operacao['filtro'] = filtro
+
+    if not isinstance(operacao['alteracoes'], dict):
+        raise ParametroInvalido('alteracoes deve ser um objeto')
+    invalidos = [campo for campo in operacao['alteracoes'] if campo not in CAMPOS_LOTE]
+    if invalidos:
+        raise ParametroInvalido(f"Campos não alteráveis em lote: {', '.join(invalidos)}")
+
+    if not (operacao['alteracoes'] or operacao['adicionar_etiquetas'] or operacao['remover_etiquetas']):
+        raise ParametroInvalido('Nada para alterar')
+
+    etiquetas = set(operacao['adicionar_etiquetas']) | set(operacao['remover_etiquetas'])
+    if etiquetas:
+        existentes = {id for (id,) in db.session.query(Etiqueta.id).filter(Etiqueta.id.in_(etiquetas))}
+        faltando = sorted(etiquetas - existentes)
+        if faltando:
+            raise ParametroInvalido(f"Etiquetas não encontradas: {', '.join(map(str, faltando))}")
+
+    return operacao
+
+
+def _ids_do_filtro(filtro):
+    query = db.session.query(Cliente.id)
+    for campo, valor in filtro.items():
+        if campo == 'etiqueta_id':
+            query = query.filter(Cliente.id.in_(
+                db.session.query(ClienteEtiqueta.cliente_id).filter(ClienteEtiqueta.etiqueta_id == valor)
+            ))
+        else:
+            query = query.filter(getattr(Cliente, campo) == valor)
+    return [id for (id,) in query.order_by(Cliente.id)]
+
+
+def _adicionar_etiquetas(ids, etiquetas):
+    for etiqueta_id in etiquetas:
+        for pedaco in _pedacos(ids):
+            ja_tem = {
+                cliente_id for (cliente_id,) in db.session.query(ClienteEtiqueta.cliente_id).filter(
+                    ClienteEtiqueta.etiqueta_id == etiqueta_id,
+                    ClienteEtiqueta.cliente_id.in_(pedaco)
+                )
+            }
+            novos = [
+                {'cliente_id': cliente_id, 'etiqueta_id': etiqueta_id}
+                for cliente_id in pedaco if cliente_id not in ja_tem
+            ]
+            if novos:
+                db.session.execute(ClienteEtiqueta.__table__.insert(), novos)
+                registrar_alteracoes(db.session(), [
+                    ('vinculo', novo['cliente_id'], etiqueta_id, True) for novo in novos
+                ])
+
+
+def _remover_etiquetas(ids, etiquetas):
+    for pedaco in _pedacos(ids):
+        db.session.execute(ClienteEtiqueta.__table__.delete().where(
+            ClienteEtiqueta.etiqueta_id.in_(etiquetas),
+            ClienteEtiqueta.cliente_id.in_(pedaco)
+        ))
+        registrar_alteracoes(db.session(), [
+            ('vinculo', cliente_id, etiqueta_id, False) for cliente_id in pedaco for etiqueta_id in etiquetas
+        ])
+
+
+def aplicar_lote(operacao):
+    """Aplica a operação em uma transação
+
+    Retorna {atualizados, resultados: [{id, ok, erro?}]}. Ids que não
+    existem aparecem com ok=False; os demais são alterados juntos (se
+    algo falhar no banco, nada é gravado).
+    """
+    if operacao['ids'] is not None:
+        pedidos = operacao['ids']
+        existentes = set()
+        for pedaco in _pedacos(pedidos):
+            existentes.update(id for (id,) in db.session.query(Cliente.id).filter(Cliente.id.in_(pedaco)))
+        ids = [id for id in pedidos if id in existentes]
+    else:
+        pedidos = ids = _ids_do_filtro(operacao['filtro'])
+        existentes = set(ids)
+
+    try:
+        if ids:
+            # Etiquetas também contam como alteração do cliente (ETag, /changes)
+            valores = dict(operacao['alteracoes'], atualizado_em=datetime.utcnow())
+            contados = set(operacao['alteracoes']) & set(CAMPOS_ESTATISTICAS)
+            for pedaco in _pedacos(ids):
+                antes = contar_ids(pedaco) if contados else None
+                db.session.execute(Cliente.__table__.update().where(Cliente.id.in_(pedaco)).values(**valores))
+                if contados:
+                    ajustar_contadores(db.session.connection(), diferenca(antes, contar_ids(pedaco)))
+            if operacao['remover_etiquetas']:
+                _remover_etiquetas(ids, operacao['remover_etiquetas'])
+            if operacao['adicionar_etiquetas']:
+                _adicionar_etiquetas(ids, operacao['adicionar_etiquetas'])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'atualizados': len(ids),
+        'resultados': [
+            {'id': id, 'ok': True} if id in existentes else
+            {'id': id, 'ok': False, 'erro': 'Cliente não encontrado'}
+            for id in pedidos
+        ],
+    }
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Migrações de schema
+
+Substitui o db.create_all(): cada migração roda uma única vez, na ordem
+da lista MIGRACOES, e fica registrada na tabela schema_migracoes. Toda
+migração precisa ser idempotente, porque bancos novos recebem o schema
+completo já na 0001.
+
+Uso:
+  python3 -m backend.migracoes status
+  python3 -m backend.migracoes aplicar
+"""
+
+import sys
+from sqlalchemy import inspect, text
+from backend.models import (
+    db, MigracaoAplicada, Cliente, ClienteEtiqueta, ClienteRemovido, ContadorClientes, ExecucaoTarefa,
+    Avaliacao, Consulta, SerieConsulta, ExcecaoSerie, Cardapio
+)
+from backend.busca import inicializar_indice_busca
+from backend.estatisticas import recalcular_contadores
+from backend.derivadas import COLUNAS_DERIVADAS, preencher_derivadas
+from backend.agenda import DURACAO_PADRAO
+
+
+def _conexao():
+    # DDL na mesma transação da sessão (no SQLite outra conexão ficaria
+    # esperando o lock de escrita da sessão)
+    return db.session.connection()
+
+
+def criar_indices(model):
+    """Cria os índices declarados no model que ainda não existem"""
+    for indice in model.__table__.indexes:
+        indice.create(bind=_conexao(), checkfirst=True)
+
+
+def tem_unique(tabela, colunas):
+    """Existe constraint ou índice único exatamente nessas colunas?"""
+    inspetor = inspect(_conexao())
+    colunas = set(colunas)
+    for constraint in inspetor.get_unique_constraints(tabela):
+        if set(constraint['column_names']) == colunas:
+            return True
+    for indice in inspetor.get_indexes(tabela):
+        if indice.get('unique') and set(indice['column_names']) == colunas:
+            return True
+    return False
+
+
+def tem_coluna(tabela, coluna):
+    return coluna in {c['name'] for c in inspect(_conexao()).get_columns(tabela)}
+
+
+def adicionar_coluna(model, nome):
+    """ALTER TABLE ADD COLUMN para uma coluna declarada no model"""
+    tabela = model.__tablename__
+    if tem_coluna(tabela, nome):
+        return
+    coluna = model.__table__.c[nome]
+    tipo = coluna.type.compile(dialect=db.engine.dialect)
+    db.session.execute(text(f'ALTER TABLE {tabela} ADD COLUMN {nome} {tipo}'))
+
+
+# Migrações --------------------------------------------------------------
+
+def _0001_schema_inicial():
+    db.metadata.create_all(bind=_conexao())
+
+
+def _0002_indices_consultas_frequentes():
+    for model in (Cliente, ClienteEtiqueta, Avaliacao, Consulta, Cardapio):
+        criar_indices(model)
+
+    # A UniqueConstraint ficava solta no corpo da classe e nunca foi
+    # criada; remove duplicatas antes de criar o índice único
+    if not tem_unique('cliente_etiquetas', ['cliente_id', 'etiqueta_id']):
+        db.session.execute(text(
+            'DELETE FROM cliente_etiquetas WHERE id NOT IN ('
+            'SELECT MIN(id) FROM cliente_etiquetas GROUP BY cliente_id, etiqueta_id)'
+        ))
+        db.session.execute(text(
+            'CREATE UNIQUE INDEX uq_cliente_etiqueta ON cliente_etiquetas (cliente_id, etiqueta_id)'
+        ))
+
+
+def _0003_indice_busca():
+    db.session.commit()
+    inicializar_indice_busca()
+
+
+def _0004_clientes_removidos():
+    ClienteRemovido.__table__.create(bind=_conexao(), checkfirst=True)
+
+
+def _0005_tarefas_execucoes():
+    ExecucaoTarefa.__table__.create(bind=_conexao(), checkfirst=True)
+
+
+def _0006_contadores_clientes():
+    ContadorClientes.__table__.create(bind=_conexao(), checkfirst=True)
+    recalcular_contadores()
+
+
+def _0007_avaliacoes_derivadas():
+    for coluna in COLUNAS_DERIVADAS:
+        adicionar_coluna(Avaliacao, coluna)
+    criar_indices(Avaliacao)
+    preencher_derivadas(confirmar=False)
+
+
+def _0008_agenda_consultas():
+    for coluna in ('duracao', 'profissional', 'atualizado_em'):
+        adicionar_coluna(Consulta, coluna)
+    db.session.execute(text(f'UPDATE consultas SET duracao = {DURACAO_PADRAO} WHERE duracao IS NULL'))
+    db.session.execute(text('UPDATE consultas SET atualizado_em = data_criacao WHERE atualizado_em IS NULL'))
+    criar_indices(Consulta)
+
+
+def _0009_series_consultas():
+    SerieConsulta.__table__.create(bind=_conexao(), checkfirst=True)
+    ExcecaoSerie.__table__.create(bind=_conexao(), checkfirst=True)
+
+
+MIGRACOES = [
+    ('0001_schema_inicial', _0001_schema_inicial),
+    ('0002_indices_consultas_frequentes', _0002_indices_consultas_frequentes),
+    ('0003_indice_busca', _0003_indice_busca),
+    ('0004_clientes_removidos', _0004_clientes_removidos),
+    ('0005_tarefas_execucoes', _0005_tarefas_execucoes),
+    ('0006_contadores_clientes', _0006_contadores_clientes),
+    ('0007_avaliacoes_derivadas', _0007_avaliacoes_derivadas),
+    ('0008_agenda_consultas', _0008_agenda_consultas),
+    ('0009_series_consultas', _0009_series_consultas),
+]
+
+
+def migracoes_aplicadas():
+    MigracaoAplicada.__table__.create(bind=_conexao(), checkfirst=True)
+    return {m.id for m in MigracaoAplicada.query.all()}
+
+
+def aplicar_migracoes(mostrar=False):
+    """Aplica as migrações pendentes. Chamar dentro do app context."""
+    aplicadas = migracoes_aplicadas()
+    novas = []
+    for id, migracao in MIGRACOES:
+        if id in aplicadas:
+            continue
+        try:
+            migracao()
+            db.session.add(MigracaoAplicada(id=id))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        novas.append(id)
+        if mostrar:
+            print(f"  ✓ {id}")
+    return novas
+
+
+if __name__ == '__main__':
+    from backend import create_app
+
+    comando = sys.argv[1] if len(sys.argv) > 1 else 'status'
+    app = create_app(migrar=False)
+    with app.app_context():
+        if comando == 'aplicar':
+            novas = aplicar_migracoes(mostrar=True)
+            print(f"✅ {len(novas)} migrações aplicadas")
+        elif comando == 'status':
+            aplicadas = migracoes_aplicadas()
+            for id, _ in MIGRACOES:
+                print(f"  {'✓' if id in aplicadas else '·'} {id}")
+        else:
+            print(__doc__)
+            sys.exit(1)
@@ -33,11 +33,11 @@ class Cliente(db.Model):
     endereco = db.Column(db.String(300))
     
     # Status e plano
-    status = db.Column(db.String(20), default='inativo')  # ativo, inativo, pausado, cancelado
+    status = db.Column(db.String(20), default='inativo', index=True)  # ativo, inativo, pausado, cancelado
     plano_ativo = db.Column(db.String(100))
     status_plano = db.Column(db.String(20))  # ativo, inativo
     data_inicio = db.Column(db.Date)
-    data_vencimento = db.Column(db.Date)
+    data_vencimento = db.Column(db.Date, index=True)
     tempo_acesso_ativo = db.Column(db.Boolean, default=True)  # True = acesso liberado
     
     # Herbalife
@@ -61,10 +61,16 @@ class Cliente(db.Model):
     data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
     atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Paginação por cursor (ordem=atualizado_em) e buscas por alteração
+    __table_args__ = (
+        db.Index('ix_clientes_atualizado_em_id', 'atualizado_em', 'id'),
+    )
+    
     # Relacionamentos
     avaliacoes = db.relationship('Avaliacao', backref='cliente', lazy=True, cascade='all, delete-orphan')
     etiquetas = db.relationship('ClienteEtiqueta', backref='cliente', lazy=True, cascade='all, delete-orphan')
     consultas = db.relationship('Consulta', backref='cliente', lazy=True, cascade='all, delete-orphan')
+    series = db.relationship('SerieConsulta', backref='cliente', lazy=True, cascade='all, delete-orphan')
     
     def to_dict(self):
         """Converte para dicionário"""
@@ -128,9 +134,12 @@ class ClienteEtiqueta(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False)
-    etiqueta_id = db.Column(db.Integer, db.ForeignKey('etiquetas.id'), nullable=False)
+    etiqueta_id = db.Column(db.Integer, db.ForeignKey('etiquetas.id'), nullable=False, index=True)
     
-    db.UniqueConstraint('cliente_id', 'etiqueta_id', name='uq_cliente_etiqueta')
+    # A constraint também serve de índice para buscas por cliente_id
+    __table_args__ = (
+        db.UniqueConstraint('cliente_id', 'etiqueta_id', name='uq_cliente_etiqueta'),
+    )
 
 
 class Avaliacao(db.Model):
@@ -138,7 +147,7 @@ class Avaliacao(db.Model):
     __tablename__ = 'avaliacoes'
     
     id = db.Column(db.Integer, primary_key=True)
-    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False, index=True)
     
     # Medidas
     peso = db.Column(db.Float)
@@ -150,6 +159,13 @@ class Avaliacao(db.Model):
     coxa = db.Column(db.Float)
     pescoco = db.Column(db.Float)
     
+    # Derivadas, preenchidas na escrita (backend/derivadas.py)
+    rcq = db.Column(db.Float)  # Relação cintura/quadril
+    delta_peso = db.Column(db.Float)  # Diferença para a avaliação anterior
+    delta_imc = db.Column(db.Float)
+    delta_cintura = db.Column(db.Float)
+    delta_quadril = db.Column(db.Float)
+    
     # Fotos
     foto_frente = db.Column(db.String(500))
     foto_lateral = db.Column(db.String(500))
@@ -162,6 +178,11 @@ class Avaliacao(db.Model):
     # Timestamps
     data_avaliacao = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Histórico do cliente em ordem de data (relatórios e cálculo dos deltas)
+    __table_args__ = (
+        db.Index('ix_avaliacoes_cliente_data', 'cliente_id', 'data_avaliacao'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -174,6 +195,11 @@ class Avaliacao(db.Model):
             'braco': self.braco,
             'coxa': self.coxa,
             'pescoco': self.pescoco,
+            'rcq': self.rcq,
+            'delta_peso': self.delta_peso,
+            'delta_imc': self.delta_imc,
+            'delta_cintura': self.delta_cintura,
+            'delta_quadril': self.delta_quadril,
             'foto_frente': self.foto_frente,
             'foto_lateral': self.foto_lateral,
             'foto_costa': self.foto_costa,
@@ -188,9 +214,11 @@ class Consulta(db.Model):
     __tablename__ = 'consultas'
     
     id = db.Column(db.Integer, primary_key=True)
-    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False, index=True)
     
-    data_hora = db.Column(db.DateTime, nullable=False)
+    data_hora = db.Column(db.DateTime, nullable=False, index=True)
+    duracao = db.Column(db.Integer, default=60)  # minutos
+    profissional = db.Column(db.String(100))  # None = agenda padrão
     tipo = db.Column(db.String(50))  # presencial, online, retorno
     status = db.Column(db.String(20), default='agendada')  # agendada, realizada, cancelada
     observacoes = db.Column(db.Text)
@@ -200,12 +228,20 @@ class Consulta(db.Model):
     sincronizado_google = db.Column(db.Boolean, default=False)
     
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Conflitos de horário: consultas do profissional a partir de uma data
+    __table_args__ = (
+        db.Index('ix_consultas_profissional_data', 'profissional', 'data_hora'),
+    )
     
     def to_dict(self):
         return {
             'id': self.id,
             'cliente_id': self.cliente_id,
             'data_hora': self.data_hora.strftime('%Y-%m-%d %H:%M:%S') if self.data_hora else None,
+            'duracao': self.duracao,
+            'profissional': self.profissional,
             'tipo': self.tipo,
             'status': self.status,
             'observacoes': self.observacoes,
@@ -213,12 +249,85 @@ class Consulta(db.Model):
         }
 
 
+class SerieConsulta(db.Model):
+    """Consultas recorrentes (semanal, quinzenal...) guardadas como regra
+
+    As ocorrências não viram linhas: são geradas só para o período
+    consultado (ver backend/recorrencia.py). Ocorrências canceladas ou
+    remarcadas ficam em ExcecaoSerie.
+    """
+    __tablename__ = 'series_consultas'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False, index=True)
+    
+    # Primeira ocorrência; as demais repetem o mesmo horário
+    inicio = db.Column(db.DateTime, nullable=False)
+    duracao = db.Column(db.Integer, default=60)  # minutos
+    profissional = db.Column(db.String(100))
+    tipo = db.Column(db.String(50))
+    observacoes = db.Column(db.Text)
+    
+    # Regra no estilo RRULE: FREQ, INTERVAL, COUNT e UNTIL
+    frequencia = db.Column(db.String(10), nullable=False, default='semanal')  # diaria, semanal, mensal
+    intervalo = db.Column(db.Integer, nullable=False, default=1)  # 2 + semanal = quinzenal
+    ocorrencias = db.Column(db.Integer)  # None = sem limite
+    ate = db.Column(db.DateTime)  # Última data possível (inclusive)
+    
+    # Calculada ao salvar (None = série sem fim); filtra as séries do período
+    ultima_ocorrencia = db.Column(db.DateTime)
+    
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    excecoes = db.relationship('ExcecaoSerie', backref='serie', lazy=True, cascade='all, delete-orphan')
+    
+    __table_args__ = (
+        db.Index('ix_series_consultas_profissional_inicio', 'profissional', 'inicio'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'cliente_id': self.cliente_id,
+            'inicio': self.inicio.strftime('%Y-%m-%d %H:%M:%S') if self.inicio else None,
+            'duracao': self.duracao,
+            'profissional': self.profissional,
+            'tipo': self.tipo,
+            'observacoes': self.observacoes,
+            'frequencia': self.frequencia,
+            'intervalo': self.intervalo,
+            'ocorrencias': self.ocorrencias,
+            'ate': self.ate.strftime('%Y-%m-%d %H:%M:%S') if self.ate else None,
+            'ultima_ocorrencia': self.ultima_ocorrencia.strftime('%Y-%m-%d %H:%M:%S') if self.ultima_ocorrencia else None,
+        }
+
+
+class ExcecaoSerie(db.Model):
+    """Ocorrência de uma série cancelada, remarcada ou alterada"""
+    __tablename__ = 'series_excecoes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    serie_id = db.Column(db.Integer, db.ForeignKey('series_consultas.id'), nullable=False)
+    data_original = db.Column(db.DateTime, nullable=False)  # Data gerada pela regra
+    
+    # None = mantém o valor da série
+    data_hora = db.Column(db.DateTime, index=True)
+    duracao = db.Column(db.Integer)
+    status = db.Column(db.String(20))  # cancelada, realizada
+    observacoes = db.Column(db.Text)
+    
+    __table_args__ = (
+        db.UniqueConstraint('serie_id', 'data_original', name='uq_excecao_serie_data'),
+    )
+
+
 class Cardapio(db.Model):
     """Modelo de Cardápio"""
     __tablename__ = 'cardapios'
     
     id = db.Column(db.Integer, primary_key=True)
-    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False)
+    cliente_id = db.Column(db.Integer, db.ForeignKey('clientes.id'), nullable=False, index=True)
     
     titulo = db.Column(db.String(200))
     conteudo = db.Column(db.Text)  # HTML ou texto do cardápio
@@ -246,3 +355,83 @@ class Cardapio(db.Model):
             'cliente_tem_acesso': self.cliente_tem_acesso
         }
 
+
+class ImportacaoJournal(db.Model):
+    """Checkpoint de importação de planilhas (permite retomar de onde parou)"""
+    __tablename__ = 'importacao_journal'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    arquivo_hash = db.Column(db.String(64), unique=True, nullable=False)  # sha256 do conteúdo
+    nome_arquivo = db.Column(db.String(500))
+    
+    # Última linha do arquivo já gravada (commit no mesmo lote dos clientes)
+    ultima_linha = db.Column(db.Integer, default=0, nullable=False)
+    inseridos = db.Column(db.Integer, default=0, nullable=False)
+    atualizados = db.Column(db.Integer, default=0, nullable=False)
+    rejeitados = db.Column(db.Integer, default=0, nullable=False)
+    status = db.Column(db.String(20), default='em_andamento')  # em_andamento, concluida
+    
+    iniciado_em = db.Column(db.DateTime, default=datetime.utcnow)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'arquivo_hash': self.arquivo_hash,
+            'nome_arquivo': self.nome_arquivo,
+            'ultima_linha': self.ultima_linha,
+            'inseridos': self.inseridos,
+            'atualizados': self.atualizados,
+            'rejeitados': self.rejeitados,
+            'status': self.status,
+            'iniciado_em': self.iniciado_em.strftime('%Y-%m-%d %H:%M:%S') if self.iniciado_em else None,
+            'atualizado_em': self.atualizado_em.strftime('%Y-%m-%d %H:%M:%S') if self.atualizado_em else None
+        }
+
+
+class ClienteRemovido(db.Model):
+    """Registro (tombstone) de cliente removido, para a sincronização incremental"""
+    __tablename__ = 'clientes_removidos'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    cliente_id = db.Column(db.Integer, nullable=False)  # Sem FK: o cliente não existe mais
+    removido_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class ContadorClientes(db.Model):
+    """Contagem materializada de clientes por valor de campo (ver backend/estatisticas.py)"""
+    __tablename__ = 'contadores_clientes'
+    
+    campo = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.String(100), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ExecucaoTarefa(db.Model):
+    """Histórico das tarefas agendadas (ver backend/tarefas.py)"""
+    __tablename__ = 'tarefas_execucoes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    tarefa = db.Column(db.String(100), nullable=False, index=True)
+    iniciada_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    duracao_ms = db.Column(db.Integer)
+    afetados = db.Column(db.Integer, default=0)
+    erro = db.Column(db.Text)  # Preenchido se a tarefa falhou
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tarefa': self.tarefa,
+            'iniciada_em': self.iniciada_em.strftime('%Y-%m-%d %H:%M:%S') if self.iniciada_em else None,
+            'duracao_ms': self.duracao_ms,
+            'afetados': self.afetados,
+            'erro': self.erro
+        }
+
+
+class MigracaoAplicada(db.Model):
+    """Migrações de schema já aplicadas (ver backend/migracoes.py)"""
+    __tablename__ = 'schema_migracoes'
+    
+    id = db.Column(db.String(100), primary_key=True)
+    aplicada_em = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Paginação por cursor e projeção de campos
+"""
+
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+from backend.models import db, Cliente
+from backend.serializacao import serializar_linhas
+
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+
+# Campos expostos pela API (mesmos de Cliente.to_dict)
+CAMPOS_CLIENTE = [
+    'id', 'nome', 'email', 'pais_telefone', 'telefone', 'whatsapp',
+    'pais', 'estado', 'cidade', 'endereco', 'data_nascimento', 'foto',
+    'status', 'plano_ativo', 'status_plano', 'compra_herbalife',
+    'status_herbalife', 'usuario_herbalife', 'senha_herbalife',
+    'foi_indicacao', 'indicado_por', 'esta_desafio', 'data_inicio',
+    'data_vencimento', 'tempo_acesso_ativo', 'objetivos', 'observacoes',
+    'data_cadastro',
+]
+
+# Ordenações aceitas para o cursor
+ORDENACOES = ('id', 'atualizado_em')
+
+
+class ParametroInvalido(ValueError):
+    """Parâmetro de paginação ou projeção inválido"""
+
+
+def codificar_cursor(ordem, linha):
+    """Gera o cursor opaco a partir da última linha da página"""
+    dados = {'id': linha.id}
+    if ordem == 'atualizado_em':
+        dados['atualizado_em'] = linha.atualizado_em.isoformat() if linha.atualizado_em else None
+    bruto = json.dumps(dados, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(bruto).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Lê o cursor opaco enviado pelo cliente
+
+    Retorna (ultimo_id, atualizado_em, por_atualizado_em); atualizado_em
+    pode ser None quando a página terminou num cliente sem a data.
+    """
+    try:
+        preenchimento = '=' * (-len(cursor) % 4)
+        dados = json.loads(base64.urlsafe_b64decode(cursor + preenchimento))
+        ultimo_id = int(dados['id'])
+        atualizado_em = dados.get('atualizado_em')
+        if atualizado_em:
+            atualizado_em = datetime.fromisoformat(atualizado_em)
+        return ultimo_id, atualizado_em, 'atualizado_em' in dados
+    except (ValueError, KeyError, TypeError) as e:
+        raise ParametroInvalido(f'Cursor inválido: {e}')
+
+
+def ler_campos(fields):
+    """Valida o parâmetro fields= e devolve a lista de campos pedidos"""
+    if not fields:
+        return list(CAMPOS_CLIENTE)
+
+    campos = [campo.strip() for campo in fields.split(',') if campo.strip()]
+    invalidos = [campo for campo in campos if campo not in CAMPOS_CLIENTE]
+    if invalidos:
+        raise ParametroInvalido(f"Campos inválidos: {', '.join(invalidos)}")
+    return campos
+
+
+def ler_limite(limit):
+    """Valida o parâmetro limit="""
+    if limit in (None, ''):
+        return LIMITE_PADRAO
+    try:
+        limite = int(limit)
+    except ValueError:
+        raise ParametroInvalido('limit deve ser um número inteiro')
+    if limite < 1:
+        raise ParametroInvalido('limit deve ser maior que zero')
+    return min(limite, LIMITE_MAXIMO)
+
+
+def consulta_projetada(campos, ordem='id', filtros=()):
+    """Monta a consulta selecionando apenas as colunas pedidas
+
+    id (e atualizado_em, quando é a ordenação) sempre entram no SELECT
+    porque o cursor depende deles.
+    """
+    colunas = list(campos)
+    if 'id' not in colunas:
+        colunas.append('id')
+    if ordem == 'atualizado_em' and 'atualizado_em' not in colunas:
+        colunas.append('atualizado_em')
+    return db.session.query(*[getattr(Cliente, coluna) for coluna in colunas]).filter(*filtros)
+
+
+def paginar_clientes(campos, limite, cursor=None, ordem='id', filtros=()):
+    """Busca uma página de clientes por keyset (sem OFFSET)
+
+    Em ordem=atualizado_em os clientes sem a data (cadastros antigos) vêm
+    no fim, por id, como no padrão do Postgres para o índice
+    ix_clientes_atualizado_em_id.
+
+    Retorna (registros, proximo_cursor, tem_mais).
+    """
+    if ordem not in ORDENACOES:
+        raise ParametroInvalido(f"ordem deve ser uma de: {', '.join(ORDENACOES)}")
+
+    query = consulta_projetada(campos, ordem, filtros)
+
+    if cursor:
+        ultimo_id, ultimo_atualizado, por_atualizado_em = decodificar_cursor(cursor)
+        if ordem == 'atualizado_em':
+            if not por_atualizado_em:
+                raise ParametroInvalido('Cursor não corresponde à ordenação atualizado_em')
+            if ultimo_atualizado is None:
+                query = query.filter(Cliente.atualizado_em.is_(None), Cliente.id > ultimo_id)
+            else:
+                query = query.filter(or_(
+                    Cliente.atualizado_em > ultimo_atualizado,
+                    and_(Cliente.atualizado_em == ultimo_atualizado, Cliente.id > ultimo_id),
+                    Cliente.atualizado_em.is_(None)
+                ))
+        else:
+            query = query.filter(Cliente.id > ultimo_id)
+
+    if ordem == 'atualizado_em':
+        query = query.order_by(Cliente.atualizado_em.asc().nulls_last(), Cliente.id)
+    else:
+        query = query.order_by(Cliente.id)
+
+    # Busca um registro a mais só para saber se existe próxima página
+    linhas = query.limit(limite + 1).all()
+    tem_mais = len(linhas) > limite
+    linhas = linhas[:limite]
+
+    registros = serializar_linhas(linhas, campos, Cliente)
+    proximo_cursor = codificar_cursor(ordem, linhas[-1]) if tem_mais else None
+    return registros, proximo_cursor, tem_mais
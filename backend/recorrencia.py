@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Séries de consultas recorrentes
+
+Uma série guarda só a regra (primeira data, frequência, intervalo e fim
+por quantidade ou data, como FREQ/INTERVAL/COUNT/UNTIL do RRULE). As
+ocorrências são geradas sob demanda e apenas para o período pedido: a
+primeira ocorrência da janela é calculada direto (sem percorrer as
+anteriores) e as seguintes saem de um gerador. Exceções (ExcecaoSerie)
+cancelam ou alteram ocorrências específicas, inclusive movendo-as para
+outro dia.
+"""
+
+import heapq
+from calendar import monthrange
+from datetime import timedelta
+from sqlalchemy import or_
+from backend.models import db, SerieConsulta, ExcecaoSerie
+from backend.paginacao import ParametroInvalido
+
+FREQUENCIAS = ('diaria', 'semanal', 'mensal')
+
+DIAS_FREQUENCIA = {'diaria': 1, 'semanal': 7}
+
+# Ocorrências neste status não aparecem na agenda nem ocupam horário
+STATUS_CANCELADA = 'cancelada'
+
+
+def _somar_meses(data, meses):
+    """Mesmo dia em outro mês; em meses mais curtos cai no último dia"""
+    mes = data.month - 1 + meses
+    ano, mes = data.year + mes // 12, mes % 12 + 1
+    return data.replace(year=ano, month=mes, day=min(data.day, monthrange(ano, mes)[1]))
+
+
+def data_ocorrencia(serie, indice):
+    """Data da ocorrência de número `indice` (0 = início), sem limites"""
+    if serie.frequencia == 'mensal':
+        return _somar_meses(serie.inicio, indice * serie.intervalo)
+    return serie.inicio + timedelta(days=DIAS_FREQUENCIA[serie.frequencia] * serie.intervalo) * indice
+
+
+def _primeiro_indice(serie, desde):
+    """Menor índice cuja data é >= desde, calculado em O(1)"""
+    if desde <= serie.inicio:
+        return 0
+    if serie.frequencia == 'mensal':
+        meses = (desde.year - serie.inicio.year) * 12 + desde.month - serie.inicio.month
+        indice = max(meses // serie.intervalo - 1, 0)
+    else:
+        passo = timedelta(days=DIAS_FREQUENCIA[serie.frequencia] * serie.intervalo)
+        indice = -(-(desde - serie.inicio) // passo)
+    while data_ocorrencia(serie, indice) < desde:
+        indice += 1
+    return indice
+
+
+def datas_serie(serie, desde, ate):
+    """Gera as datas da regra em [desde, ate), respeitando ocorrencias e ate da série"""
+    indice = _primeiro_indice(serie, desde)
+    while serie.ocorrencias is None or indice < serie.ocorrencias:
+        data = data_ocorrencia(serie, indice)
+        if data >= ate or (serie.ate is not None and data > serie.ate):
+            return
+        yield data
+        indice += 1
+
+
+def calcular_ultima_ocorrencia(serie):
+    """Data da última ocorrência da regra (None se a série não termina)"""
+    if serie.ocorrencias is None and serie.ate is None:
+        return None
+    if serie.ocorrencias is not None:
+        ultima = data_ocorrencia(serie, serie.ocorrencias - 1)
+        if serie.ate is None or ultima <= serie.ate:
+            return ultima
+    indice = _primeiro_indice(serie, serie.ate + timedelta(seconds=1)) - 1
+    return data_ocorrencia(serie, indice) if indice >= 0 else None
+
+
+def eh_ocorrencia(serie, data):
+    return next(datas_serie(serie, data, data + timedelta(seconds=1)), None) == data
+
+
+def dividir_serie(serie, a_partir_de):
+    """Encerra a série antes de a_partir_de e devolve a continuação (nova série)
+
+    Usado para alterar "esta e as próximas" ocorrências: as exceções a
+    partir da data passam para a nova série. Nada é gravado aqui.
+    """
+    if not eh_ocorrencia(serie, a_partir_de) or a_partir_de == serie.inicio:
+        raise ParametroInvalido('a_partir_de deve ser uma ocorrência da série (que não a primeira)')
+    indice = _primeiro_indice(serie, a_partir_de)
+    nova = SerieConsulta(
+        cliente_id=serie.cliente_id, inicio=a_partir_de, duracao=serie.duracao,
+        profissional=serie.profissional, tipo=serie.tipo, observacoes=serie.observacoes,
+        frequencia=serie.frequencia, intervalo=serie.intervalo, ate=serie.ate,
+        ocorrencias=serie.ocorrencias - indice if serie.ocorrencias is not None else None,
+    )
+    for excecao in list(serie.excecoes):
+        if excecao.data_original >= a_partir_de:
+            excecao.serie = nova
+    serie.ocorrencias = indice if serie.ocorrencias is not None else None
+    serie.ate = a_partir_de - timedelta(seconds=1)
+    serie.ultima_ocorrencia = calcular_ultima_ocorrencia(serie)
+    return nova
+
+
+def descartar_excecoes_orfas(serie):
+    """Remove exceções de datas que a regra (alterada) não gera mais"""
+    for excecao in list(serie.excecoes):
+        if not eh_ocorrencia(serie, excecao.data_original):
+            serie.excecoes.remove(excecao)
+
+
+def validar_serie(serie):
+    if serie.frequencia not in FREQUENCIAS:
+        raise ParametroInvalido(f"frequencia deve ser uma de: {', '.join(FREQUENCIAS)}")
+    if not isinstance(serie.intervalo, int) or serie.intervalo < 1:
+        raise ParametroInvalido('intervalo deve ser um inteiro maior que zero')
+    if serie.ocorrencias is not None and (not isinstance(serie.ocorrencias, int) or serie.ocorrencias < 1):
+        raise ParametroInvalido('ocorrencias deve ser um inteiro maior que zero')
+    if serie.ate is not None and serie.ate < serie.inicio:
+        raise ParametroInvalido('ate deve ser depois do início da série')
+    serie.ultima_ocorrencia = calcular_ultima_ocorrencia(serie)
+    descartar_excecoes_orfas(serie)
+
+
+class Ocorrencia:
+    """Ocorrência gerada de uma série (com a exceção aplicada, se houver)"""
+
+    __slots__ = ('serie', 'data_original', 'data_hora', 'duracao', 'status', 'observacoes', 'alterada')
+
+    def __init__(self, serie, data_original, excecao=None):
+        self.serie = serie
+        self.data_original = data_original
+        self.data_hora = data_original
+        self.duracao = serie.duracao
+        self.status = 'agendada'
+        self.observacoes = serie.observacoes
+        self.alterada = excecao is not None
+        if excecao is not None:
+            self.data_hora = excecao.data_hora or data_original
+            self.duracao = excecao.duracao or serie.duracao
+            self.status = excecao.status or self.status
+            self.observacoes = excecao.observacoes if excecao.observacoes is not None else serie.observacoes
+
+    @property
+    def fim(self):
+        return self.data_hora + timedelta(minutes=self.duracao)
+
+    @property
+    def chave(self):
+        return (self.serie.id, self.data_original)
+
+    def __lt__(self, outra):
+        return (self.data_hora, self.serie.id) < (outra.data_hora, outra.serie.id)
+
+    def to_dict(self):
+        """Mesmos campos de Consulta.to_dict, mais a origem na série"""
+        return {
+            'id': None,
+            'serie_id': self.serie.id,
+            'data_original': self.data_original.strftime('%Y-%m-%d %H:%M:%S'),
+            'cliente_id': self.serie.cliente_id,
+            'data_hora': self.data_hora.strftime('%Y-%m-%d %H:%M:%S'),
+            'duracao': self.duracao,
+            'profissional': self.serie.profissional,
+            'tipo': self.serie.tipo,
+            'status': self.status,
+            'observacoes': self.observacoes,
+            'alterada': self.alterada,
+        }
+
+
+def expandir(serie, desde, ate, excecoes=None):
+    """Gera as ocorrências da série com data_hora em [desde, ate), em ordem
+
+    excecoes: {data_original: ExcecaoSerie}. Ocorrências remarcadas saem
+    da sequência da regra e entram pela nova data (podendo vir de fora
+    da janela). Canceladas não são geradas.
+    """
+    excecoes = excecoes or {}
+    movidas = sorted(
+        Ocorrencia(serie, excecao.data_original, excecao)
+        for excecao in excecoes.values()
+        if excecao.data_hora is not None and desde <= excecao.data_hora < ate
+    )
+
+    def da_regra():
+        for data in datas_serie(serie, desde, ate):
+            excecao = excecoes.get(data)
+            if excecao is not None and excecao.data_hora is not None:
+                continue
+            yield Ocorrencia(serie, data, excecao)
+
+    for ocorrencia in heapq.merge(da_regra(), movidas):
+        if ocorrencia.status != STATUS_CANCELADA:
+            yield ocorrencia
+
+
+def carregar_series(desde, ate, filtros=()):
+    """Séries com ocorrências (da regra ou remarcadas) em [desde, ate) e suas exceções
+
+    Retorna [(serie, {data_original: excecao})].
+    """
+    movidas = db.session.query(ExcecaoSerie.serie_id).filter(
+        ExcecaoSerie.data_hora >= desde, ExcecaoSerie.data_hora < ate
+    )
+    series = SerieConsulta.query.filter(
+        or_(
+            (SerieConsulta.inicio < ate) & (
+                SerieConsulta.ultima_ocorrencia.is_(None) | (SerieConsulta.ultima_ocorrencia >= desde)
+            ),
+            SerieConsulta.id.in_(movidas),
+        ),
+        *filtros
+    ).order_by(SerieConsulta.id).all()
+    if not series:
+        return []
+
+    por_serie = {serie.id: {} for serie in series}
+    excecoes = ExcecaoSerie.query.filter(
+        ExcecaoSerie.serie_id.in_(list(por_serie)),
+        or_(
+            (ExcecaoSerie.data_original >= desde) & (ExcecaoSerie.data_original < ate),
+            (ExcecaoSerie.data_hora >= desde) & (ExcecaoSerie.data_hora < ate),
+        )
+    )
+    for excecao in excecoes:
+        por_serie[excecao.serie_id][excecao.data_original] = excecao
+    return [(serie, por_serie[serie.id]) for serie in series]
+
+
+def ocorrencias_periodo(desde, ate, filtros=(), ignorar_serie=None):
+    """Gerador das ocorrências de todas as séries no período, em ordem de data_hora"""
+    geradores = [
+        expandir(serie, desde, ate, excecoes)
+        for serie, excecoes in carregar_series(desde, ate, filtros)
+        if serie.id != ignorar_serie
+    ]
+    return heapq.merge(*geradores)
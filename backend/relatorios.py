@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Relatório de resultados do desafio
+
+Os agregados da coorte (perda de peso média/mediana, percentis, maiores
+evoluções) saem de uma única carga das avaliações em arrays NumPy
+(backend/analise.py). As fichas individuais em HTML são geradas em um
+pool de processos, em tarefas de FICHAS_POR_TAREFA fichas e com no
+máximo TAREFAS_POR_PROCESSO tarefas na fila de cada processo; os
+processos recebem só os dados prontos dos clientes, sem acesso ao
+banco.
+
+Além das fichas, a pasta de saída recebe o resumo.html da coorte e o
+manifest.json com o arquivo, o tamanho e o sha1 de cada ficha.
+
+Uso:
+  python3 -m backend.relatorios desafio [pasta] [processos]
+"""
+
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from html import escape
+import numpy as np
+from backend.models import db, Cliente, Avaliacao
+from backend.analise import MEDIDAS, calcular_evolucao, carregar_avaliacoes, resumir_por_cliente
+
+PASTA_PADRAO = 'relatorios'
+
+PERCENTIS = (10, 25, 50, 75, 90)
+
+TOP_EVOLUCOES = 10
+
+# Fichas por tarefa do pool (uma ficha sozinha custa menos que a ida e
+# volta entre processos)
+FICHAS_POR_TAREFA = 200
+
+# Tarefas na fila de cada processo antes de esperar as anteriores
+# (limita a memória com coortes grandes)
+TAREFAS_POR_PROCESSO = 2
+
+# Medidas da tabela da ficha e seus títulos
+COLUNAS_FICHA = {'peso': 'Peso (kg)', 'imc': 'IMC', 'cintura': 'Cintura (cm)', 'quadril': 'Quadril (cm)'}
+
+
+def _numero(valor, casas=2):
+    return None if valor is None or np.isnan(valor) else round(float(valor), casas)
+
+
+def _estatisticas(valores):
+    """{clientes, media, mediana, percentis} de um array sem NaN"""
+    if not valores.size:
+        return {'clientes': 0, 'media': None, 'mediana': None, 'percentis': {}}
+    percentis = np.percentile(valores, PERCENTIS)
+    return {
+        'clientes': int(valores.size),
+        'media': _numero(valores.mean()),
+        'mediana': _numero(np.median(valores)),
+        'percentis': {f'p{p}': _numero(v) for p, v in zip(PERCENTIS, percentis)},
+    }
+
+
+def dados_desafio(desde=None, ate=None):
+    """Carrega a coorte do desafio e calcula agregados e dados das fichas
+
+    Retorna (agregado, fichas), com uma ficha por cliente em desafio que
+    tenha ao menos uma avaliação no período.
+    """
+    nomes = dict(db.session.query(Cliente.id, Cliente.nome).filter(Cliente.esta_desafio == 'sim'))
+    filtro = Avaliacao.cliente_id.in_(db.session.query(Cliente.id).filter(Cliente.esta_desafio == 'sim'))
+    avaliacoes = carregar_avaliacoes(desde=desde, ate=ate, filtros=[filtro])
+    metricas = calcular_evolucao(avaliacoes)
+    clientes, quantidade, primeira, ultima, _ = resumir_por_cliente(avaliacoes, metricas['medidas'])
+
+    # Perda positiva = emagreceu; só quem tem duas avaliações compara
+    peso, cintura = MEDIDAS.index('peso'), MEDIDAS.index('cintura')
+    perda_kg = primeira[:, peso] - ultima[:, peso]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        perda_pct = perda_kg / primeira[:, peso] * 100
+    perda_pct[~np.isfinite(perda_pct)] = np.nan
+    perda_cintura = primeira[:, cintura] - ultima[:, cintura]
+    comparaveis = quantidade >= 2
+    for perda in (perda_kg, perda_pct, perda_cintura):
+        perda[~comparaveis] = np.nan
+
+    validos = ~np.isnan(perda_pct)
+    ordem = np.flatnonzero(validos)[np.lexsort((-perda_kg[validos], -perda_pct[validos]))]
+    posicao = np.full(len(clientes), -1)
+    posicao[ordem] = np.arange(1, len(ordem) + 1)
+
+    agregado = {
+        'gerado_em': datetime.now().isoformat(' ', 'seconds'),
+        'desde': desde.isoformat(' ', 'seconds') if desde else None,
+        'ate': ate.isoformat(' ', 'seconds') if ate else None,
+        'clientes': len(nomes),
+        'clientes_com_avaliacao': int(len(clientes)),
+        'total_avaliacoes': avaliacoes.n,
+        'perda_peso_kg': _estatisticas(perda_kg[validos]),
+        'perda_peso_percentual': _estatisticas(perda_pct[validos]),
+        'perda_cintura_cm': _estatisticas(perda_cintura[~np.isnan(perda_cintura)]),
+        'perda_total_kg': _numero(perda_kg[validos].sum()),
+        'maiores_evolucoes': [
+            {
+                'posicao': int(posicao[i]),
+                'cliente_id': int(clientes[i]),
+                'nome': nomes.get(int(clientes[i])),
+                'perda_peso_kg': _numero(perda_kg[i]),
+                'perda_peso_percentual': _numero(perda_pct[i]),
+            }
+            for i in ordem[:TOP_EVOLUCOES]
+        ],
+    }
+
+    # Fatias de cada cliente nos arrays (já ordenados por cliente e data)
+    colunas = [MEDIDAS.index(medida) for medida in COLUNAS_FICHA]
+    datas = np.datetime_as_string(avaliacoes.datas, unit='D')
+    fim = np.append(avaliacoes.inicios[1:], avaliacoes.n)
+    fichas = []
+    for i, (ini, fim_) in enumerate(zip(avaliacoes.inicios, fim)):
+        medidas = np.round(metricas['medidas'][ini:fim_][:, colunas], 2)
+        fichas.append({
+            'cliente_id': int(clientes[i]),
+            'nome': nomes.get(int(clientes[i])) or f'Cliente #{clientes[i]}',
+            'posicao': int(posicao[i]) if posicao[i] > 0 else None,
+            'comparaveis': int(len(ordem)),
+            'perda_peso_kg': _numero(perda_kg[i]),
+            'perda_peso_percentual': _numero(perda_pct[i]),
+            'perda_cintura_cm': _numero(perda_cintura[i]),
+            'avaliacoes': [
+                [data if data != 'NaT' else None] + [None if np.isnan(v) else float(v) for v in linha]
+                for data, linha in zip(datas[ini:fim_], medidas)
+            ],
+        })
+    return agregado, fichas
+
+
+# Renderização (roda nos processos do pool) --------------------------------
+
+ESTILO = """
+body { font-family: Arial, sans-serif; color: #333; margin: 32px; }
+h1 { color: #8B6F4D; margin-bottom: 4px; }
+table { border-collapse: collapse; margin-top: 16px; }
+th, td { border: 1px solid #ddd; padding: 6px 12px; text-align: right; }
+th { background: #F5E6D3; }
+.destaque { font-size: 1.3em; color: #2E7D32; }
+"""
+
+
+def _formatar(valor, sufixo=''):
+    return '—' if valor is None else f'{valor:.2f}'.rstrip('0').rstrip('.') + sufixo
+
+
+def _grafico_peso(avaliacoes, largura=480, altura=140):
+    """Linha do peso em SVG (sem depender de biblioteca de gráficos)"""
+    pontos = [(i, linha[1]) for i, linha in enumerate(avaliacoes) if linha[1] is not None]
+    if len(pontos) < 2:
+        return ''
+    pesos = [peso for _, peso in pontos]
+    minimo, maximo = min(pesos), max(pesos)
+    faixa = (maximo - minimo) or 1
+    passo = (largura - 20) / max(len(avaliacoes) - 1, 1)
+    coordenadas = ' '.join(
+        f'{10 + i * passo:.1f},{10 + (maximo - peso) / faixa * (altura - 20):.1f}' for i, peso in pontos
+    )
+    return (
+        f'<svg width="{largura}" height="{altura}" xmlns="http://www.w3.org/2000/svg">'
+        f'<polyline points="{coordenadas}" fill="none" stroke="#8B6F4D" stroke-width="2"/></svg>'
+    )
+
+
+def renderizar_ficha(ficha):
+    """HTML da ficha de progresso de um cliente"""
+    linhas = ''.join(
+        '<tr><td>{}</td>{}</tr>'.format(
+            escape(data or '—'), ''.join(f'<td>{_formatar(valor)}</td>' for valor in valores)
+        )
+        for data, *valores in ficha['avaliacoes']
+    )
+    cabecalho = ''.join(f'<th>{titulo}</th>' for titulo in COLUNAS_FICHA.values())
+    posicao = (
+        f"<p>Posição no desafio: {ficha['posicao']}º de {ficha['comparaveis']}</p>"
+        if ficha['posicao'] else ''
+    )
+    return f"""<!DOCTYPE html>
+<html lang="pt-BR"><head><meta charset="utf-8">
+<title>Resultados do desafio - {escape(ficha['nome'])}</title><style>{ESTILO}</style></head>
+<body>
+<h1>{escape(ficha['nome'])}</h1>
+<p class="destaque">Perda de peso: {_formatar(ficha['perda_peso_kg'], ' kg')}
+({_formatar(ficha['perda_peso_percentual'], '%')}) · Cintura: {_formatar(ficha['perda_cintura_cm'], ' cm')}</p>
+{posicao}
+{_grafico_peso(ficha['avaliacoes'])}
+<table><tr><th>Data</th>{cabecalho}</tr>{linhas}</table>
+</body></html>
+"""
+
+
+def gravar_ficha(pasta, ficha):
+    """Renderiza e grava a ficha; retorna a entrada do manifest"""
+    conteudo = renderizar_ficha(ficha).encode('utf-8')
+    arquivo = f"cliente_{ficha['cliente_id']}.html"
+    with open(os.path.join(pasta, arquivo), 'wb') as f:
+        f.write(conteudo)
+    return {
+        'cliente_id': ficha['cliente_id'],
+        'nome': ficha['nome'],
+        'arquivo': arquivo,
+        'bytes': len(conteudo),
+        'sha1': hashlib.sha1(conteudo).hexdigest(),
+    }
+
+
+def renderizar_resumo(agregado):
+    def linha(titulo, estatisticas, sufixo):
+        percentis = ' · '.join(
+            f'{p}: {_formatar(v, sufixo)}' for p, v in estatisticas['percentis'].items()
+        )
+        return (
+            f"<tr><td>{titulo}</td><td>{estatisticas['clientes']}</td>"
+            f"<td>{_formatar(estatisticas['media'], sufixo)}</td>"
+            f"<td>{_formatar(estatisticas['mediana'], sufixo)}</td><td>{percentis}</td></tr>"
+        )
+
+    top = ''.join(
+        f"<tr><td>{item['posicao']}</td><td>{escape(item['nome'] or '')}</td>"
+        f"<td>{_formatar(item['perda_peso_kg'], ' kg')}</td>"
+        f"<td>{_formatar(item['perda_peso_percentual'], '%')}</td></tr>"
+        for item in agregado['maiores_evolucoes']
+    )
+    return f"""<!DOCTYPE html>
+<html lang="pt-BR"><head><meta charset="utf-8">
+<title>Resultados do desafio</title><style>{ESTILO}</style></head>
+<body>
+<h1>Resultados do desafio</h1>
+<p>{agregado['clientes_com_avaliacao']} de {agregado['clientes']} clientes com avaliação ·
+{agregado['total_avaliacoes']} avaliações · perda total {_formatar(agregado['perda_total_kg'], ' kg')}</p>
+<table><tr><th>Medida</th><th>Clientes</th><th>Média</th><th>Mediana</th><th>Percentis</th></tr>
+{linha('Peso', agregado['perda_peso_kg'], ' kg')}
+{linha('Peso (%)', agregado['perda_peso_percentual'], '%')}
+{linha('Cintura', agregado['perda_cintura_cm'], ' cm')}
+</table>
+<h2>Maiores evoluções</h2>
+<table><tr><th>#</th><th>Cliente</th><th>Perda</th><th>%</th></tr>{top}</table>
+</body></html>
+"""
+
+
+def gravar_fichas(pasta, fichas):
+    return [gravar_ficha(pasta, ficha) for ficha in fichas]
+
+
+def _gravar_em_paralelo(pasta, fichas, processos):
+    if processos <= 1 or len(fichas) <= FICHAS_POR_TAREFA:
+        return gravar_fichas(pasta, fichas)
+
+    entradas = []
+    limite = processos * TAREFAS_POR_PROCESSO
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        pendentes = set()
+        for i in range(0, len(fichas), FICHAS_POR_TAREFA):
+            if len(pendentes) >= limite:
+                prontas, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                for futuro in prontas:
+                    entradas.extend(futuro.result())
+            pendentes.add(executor.submit(gravar_fichas, pasta, fichas[i:i + FICHAS_POR_TAREFA]))
+        for futuro in wait(pendentes).done:
+            entradas.extend(futuro.result())
+    return sorted(entradas, key=lambda entrada: entrada['cliente_id'])
+
+
+def gerar_relatorio_desafio(pasta=PASTA_PADRAO, processos=None, desde=None, ate=None):
+    """Gera resumo.html, uma ficha por cliente e o manifest.json na pasta
+
+    Retorna o manifest.
+    """
+    processos = processos or min(os.cpu_count() or 1, 8)
+    os.makedirs(pasta, exist_ok=True)
+    agregado, fichas = dados_desafio(desde, ate)
+
+    with open(os.path.join(pasta, 'resumo.html'), 'w', encoding='utf-8') as f:
+        f.write(renderizar_resumo(agregado))
+    entradas = _gravar_em_paralelo(pasta, fichas, processos)
+
+    manifest = {'agregado': agregado, 'resumo': 'resumo.html', 'fichas': entradas}
+    with open(os.path.join(pasta, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+if __name__ == '__main__':
+    import time
+    from backend import create_app
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'desafio':
+        print(__doc__)
+        sys.exit(1)
+
+    pasta = sys.argv[2] if len(sys.argv) > 2 else PASTA_PADRAO
+    processos = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    app = create_app()
+    with app.app_context():
+        inicio = time.perf_counter()
+        manifest = gerar_relatorio_desafio(pasta, processos)
+        agregado = manifest['agregado']
+        print(f"✅ {len(manifest['fichas'])} fichas em {pasta}/ ({time.perf_counter() - inicio:.1f}s)")
+        print(f"📊 Perda de peso: média {agregado['perda_peso_kg']['media']} kg, "
+              f"mediana {agregado['perda_peso_kg']['mediana']} kg")
@@ -4,12 +4,37 @@
 ANDENUTRI - Rotas da API
 """
 
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, current_app, request, jsonify, render_template
 from datetime import datetime
-from backend.models import db, Cliente, Etiqueta, ClienteEtiqueta, Avaliacao, Consulta, Cardapio
+from sqlalchemy.orm import selectinload
+from backend.models import (
+    db, Cliente, Etiqueta, ClienteEtiqueta, Avaliacao, Consulta, SerieConsulta, ExcecaoSerie, Cardapio
+)
+from backend.analise import MEDIDAS, evolucao_cliente, evolucao_coorte, ler_data
+from backend.agenda import (
+    DURACAO_PADRAO, QUANTIDADE_MAXIMA, ConflitoHorario, agenda_periodo, fim_consulta, indice_agenda, ler_duracao,
+    salvar_consulta, salvar_excecao, salvar_serie
+)
+from backend.busca import buscar_clientes
+from backend.lote import aplicar_lote, ler_operacao
+from backend.estatisticas import estatisticas_dashboard
+from backend.etags import condicional, etag_cliente, etag_clientes
+from backend.similaridade import indice_similaridade
+from backend.indice_etiquetas import ler_filtro_etiquetas
+from backend.recorrencia import Ocorrencia, carregar_series, dividir_serie, expandir
+from backend.paginacao import ParametroInvalido, consulta_projetada, ler_campos, ler_limite, paginar_clientes
+from backend.sincronizacao import SincronizacaoExpirada, alteracoes_desde, ler_desde
+from backend.serializacao import quer_ndjson, resposta_ndjson, serializar_linhas
+from backend.vencimento import consulta_vencendo, esta_vencido, obter_status_vencimento
 
 main = Blueprint('main', __name__)
 
+# Mesmos campos de Etiqueta.to_dict
+CAMPOS_ETIQUETA = ['id', 'nome', 'cor', 'categoria', 'descricao']
+
+# Campos livres de Avaliacao aceitos no POST/PUT (as medidas vêm de MEDIDAS)
+CAMPOS_TEXTO_AVALIACAO = ['foto_frente', 'foto_lateral', 'foto_costa', 'observacoes', 'queixas']
+
 
 @main.route('/')
 def index():
@@ -18,19 +43,216 @@ def index():
 
 
 @main.route('/api/clientes', methods=['GET'])
+@condicional(etag_clientes)
 def listar_clientes():
-    """Lista todos os clientes"""
-    clientes = Cliente.query.all()
-    return jsonify([cliente.to_dict() for cliente in clientes])
+    """Lista os clientes
+
+    Sem parâmetros devolve a lista completa (formato antigo). Com
+    ?limit= ou ?cursor= pagina por keyset (ordem=id|atualizado_em) e
+    devolve também proximo_cursor e tem_mais. ?fields=id,nome,...
+    seleciona e serializa apenas as colunas pedidas. Com ?stream=1 ou
+    Accept: application/x-ndjson a lista completa sai em NDJSON, um
+    cliente por linha, sem ser montada inteira em memória.
+    ?tags=a,b&not_tags=c (ids ou nomes) filtra pelas etiquetas em todos
+    os modos: precisa ter todas de tags e nenhuma de not_tags.
+    """
+    fields = request.args.get('fields')
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    ordem = request.args.get('ordem', 'id')
+
+    try:
+        campos = ler_campos(fields)
+        filtro_etiquetas = ler_filtro_etiquetas(request.args.get('tags'), request.args.get('not_tags'))
+        filtros = [filtro_etiquetas] if filtro_etiquetas is not None else []
+
+        if quer_ndjson():
+            consulta = consulta_projetada(campos, filtros=filtros).order_by(Cliente.id)
+            return resposta_ndjson(consulta, campos, Cliente)
+
+        if limit is None and cursor is None:
+            # Tuplas de colunas em vez de objetos do ORM: mesmo JSON do
+            # to_dict, sem o custo de montar cada Cliente
+            linhas = consulta_projetada(campos, filtros=filtros).order_by(Cliente.id).all()
+            return jsonify(serializar_linhas(linhas, campos, Cliente))
+
+        limite = ler_limite(limit)
+        clientes, proximo_cursor, tem_mais = paginar_clientes(campos, limite, cursor, ordem, filtros)
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'clientes': clientes,
+        'limit': limite,
+        'proximo_cursor': proximo_cursor,
+        'tem_mais': tem_mais
+    })
+
+
+@main.route('/api/clientes/similares', methods=['GET'])
+def clientes_similares():
+    """Possíveis duplicados por nome (trigramas), email ou WhatsApp"""
+    nome = request.args.get('nome')
+    email = request.args.get('email')
+    whatsapp = request.args.get('whatsapp')
+    
+    if not (nome or email or whatsapp):
+        return jsonify({'error': 'Informe nome, email ou whatsapp'}), 400
+    
+    candidatos = indice_similaridade.buscar(
+        nome=nome,
+        email=email,
+        whatsapp=whatsapp,
+        limite=request.args.get('limite', 10, type=int),
+        minimo=request.args.get('minimo', 60, type=int)
+    )
+    return jsonify(candidatos)
+
+
+@main.route('/api/clientes/changes', methods=['GET'])
+def clientes_alterados():
+    """Clientes alterados e removidos desde ?since= (sincronização incremental)
+
+    Devolve {clientes, removidos, ate}; o valor de ate vai como since
+    na próxima chamada. Sem since devolve todos os clientes. Pode repetir
+    o que já foi enviado nos minutos anteriores ao since (ver
+    backend/sincronizacao.py): aplicar por id. Responde 410 se o since
+    for mais antigo que a janela de sincronização: descartar a réplica e
+    pedir tudo de novo sem since.
+    """
+    try:
+        desde = ler_desde(request.args.get('since'))
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        clientes, removidos, ate = alteracoes_desde(desde)
+    except SincronizacaoExpirada as e:
+        return jsonify({'error': str(e)}), 410
+    return jsonify({
+        'clientes': clientes,
+        'removidos': removidos,
+        'ate': ate
+    })
+
+
+@main.route('/api/clientes/vencendo', methods=['GET'])
+def clientes_vencendo():
+    """Clientes com acesso ativo que vencem nos próximos ?dias= (padrão 7)"""
+    dias = request.args.get('dias', 7, type=int)
+    if dias < 0:
+        return jsonify({'error': 'dias não pode ser negativo'}), 400
+    
+    try:
+        campos = ler_campos(request.args.get('fields'))
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    
+    colunas = campos if 'data_vencimento' in campos else campos + ['data_vencimento']
+    linhas = consulta_vencendo(dias, consulta_projetada(colunas)).all()
+    clientes = serializar_linhas(linhas, campos, Cliente)
+    for cliente, linha in zip(clientes, linhas):
+        cliente['dias_restantes'] = obter_status_vencimento(linha.data_vencimento)['dias_restantes']
+    return jsonify(clientes)
 
 
 @main.route('/api/clientes/<int:id>', methods=['GET'])
+@condicional(etag_cliente)
 def obter_cliente(id):
     """Obtém um cliente específico"""
     cliente = Cliente.query.get_or_404(id)
     return jsonify(cliente.to_dict())
 
 
+@main.route('/api/clientes/<int:id>/evolucao', methods=['GET'])
+def evolucao_do_cliente(id):
+    """Evolução das medidas do cliente (?desde=&ate= opcionais)"""
+    Cliente.query.get_or_404(id)
+    try:
+        desde = ler_data(request.args.get('desde'), 'desde')
+        ate = ler_data(request.args.get('ate'), 'ate')
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(evolucao_cliente(id, desde, ate))
+
+
+@main.route('/api/avaliacoes/coorte', methods=['GET'])
+def evolucao_da_coorte():
+    """Resumo da evolução de um grupo de clientes
+
+    Coorte por ?ids=1,2,3, ?status= e/ou ?tags=&not_tags=; sem filtro
+    usa todos os clientes. ?desde=&ate= limitam o período.
+    """
+    try:
+        desde = ler_data(request.args.get('desde'), 'desde')
+        ate = ler_data(request.args.get('ate'), 'ate')
+        ids = request.args.get('ids')
+        cliente_ids = [int(id) for id in ids.split(',') if id.strip()] if ids else None
+        filtros_cliente = []
+        if request.args.get('status'):
+            filtros_cliente.append(Cliente.status == request.args['status'])
+        filtro_etiquetas = ler_filtro_etiquetas(request.args.get('tags'), request.args.get('not_tags'))
+        if filtro_etiquetas is not None:
+            filtros_cliente.append(filtro_etiquetas)
+    except ValueError as e:
+        # ParametroInvalido ou ids não numéricos
+        return jsonify({'error': str(e)}), 400
+
+    filtros = []
+    if filtros_cliente:
+        filtros.append(Avaliacao.cliente_id.in_(db.session.query(Cliente.id).filter(*filtros_cliente)))
+    return jsonify(evolucao_coorte(cliente_ids, desde, ate, filtros))
+
+
+def _preencher_avaliacao(avaliacao, data):
+    """Copia do JSON os campos informados (IMC, RCQ e deltas são derivados no flush)"""
+    for campo in MEDIDAS:
+        if campo in data:
+            valor = data[campo]
+            setattr(avaliacao, campo, float(valor) if valor not in (None, '') else None)
+    for campo in CAMPOS_TEXTO_AVALIACAO:
+        if campo in data:
+            setattr(avaliacao, campo, data[campo])
+    if data.get('data_avaliacao'):
+        avaliacao.data_avaliacao = ler_data(data['data_avaliacao'], 'data_avaliacao')
+
+
+@main.route('/api/clientes/<int:id>/avaliacoes', methods=['GET'])
+def listar_avaliacoes(id):
+    """Avaliações do cliente em ordem de data, com as métricas já gravadas"""
+    Cliente.query.get_or_404(id)
+    avaliacoes = Avaliacao.query.filter_by(cliente_id=id).order_by(Avaliacao.data_avaliacao, Avaliacao.id)
+    return jsonify([avaliacao.to_dict() for avaliacao in avaliacoes])
+
+
+@main.route('/api/clientes/<int:id>/avaliacoes', methods=['POST'])
+def criar_avaliacao(id):
+    """Registra uma avaliação do cliente"""
+    Cliente.query.get_or_404(id)
+    avaliacao = Avaliacao(cliente_id=id)
+    try:
+        _preencher_avaliacao(avaliacao, request.json or {})
+        db.session.add(avaliacao)
+        db.session.commit()
+        return jsonify(avaliacao.to_dict()), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+
+@main.route('/api/avaliacoes/<int:id>', methods=['PUT'])
+def atualizar_avaliacao(id):
+    """Atualiza uma avaliação (as seguintes do cliente têm os deltas refeitos)"""
+    avaliacao = Avaliacao.query.get_or_404(id)
+    try:
+        _preencher_avaliacao(avaliacao, request.json or {})
+        db.session.commit()
+        return jsonify(avaliacao.to_dict())
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+
 @main.route('/api/clientes', methods=['POST'])
 def criar_cliente():
     """Cria um novo cliente"""
@@ -80,8 +302,9 @@ def atualizar_cliente(id):
         cliente.data_nascimento = datetime.strptime(data['data_nascimento'], '%Y-%m-%d').date()
     if data.get('data_vencimento'):
         cliente.data_vencimento = datetime.strptime(data['data_vencimento'], '%Y-%m-%d').date()
-        # Atualizar tempo de acesso baseado em vencimento
-        if datetime.utcnow().date() > cliente.data_vencimento:
+        # Atualizar tempo de acesso baseado em vencimento (os demais
+        # vencidos são bloqueados por backend/tarefas.py)
+        if esta_vencido(cliente.data_vencimento):
             cliente.tempo_acesso_ativo = False
     
     try:
@@ -96,25 +319,52 @@ def atualizar_cliente(id):
 def deletar_cliente(id):
     """Deleta um cliente"""
     cliente = Cliente.query.get_or_404(id)
+    # O tombstone de /api/clientes/changes sai do after_delete
     db.session.delete(cliente)
     db.session.commit()
     return jsonify({'message': 'Cliente deletado com sucesso'})
 
 
+@main.route('/api/clientes/lote', methods=['POST'])
+def alterar_clientes_lote():
+    """Altera status/plano/etiquetas de vários clientes em uma transação
+
+    Corpo: {"ids": [...]} ou {"filtro": {"status": ..., "etiqueta_id": ...}},
+    mais "alteracoes": {"status", "plano_ativo", "status_plano"},
+    "adicionar_etiquetas": [...] e/ou "remover_etiquetas": [...].
+    """
+    try:
+        operacao = ler_operacao(request.get_json(silent=True))
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        return jsonify(aplicar_lote(operacao))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+
 @main.route('/api/buscar', methods=['GET'])
 def buscar():
-    """Busca inteligente de clientes"""
+    """Busca de clientes (?q=, ?limit= opcional)
+
+    Palavras casam pelo começo em nome, email, telefone, objetivos e
+    observações. Trechos do meio só são encontrados em telefones (busca
+    só com dígitos) e emails (busca com "@").
+    """
     query = request.args.get('q', '').lower()
     
     if not query:
         return jsonify([])
     
-    # Busca por nome, email, telefone
-    clientes = Cliente.query.filter(
-        (Cliente.nome.ilike(f'%{query}%')) |
-        (Cliente.email.ilike(f'%{query}%')) |
-        (Cliente.telefone.ilike(f'%{query}%'))
-    ).all()
+    # Busca por nome, email, telefone, objetivos e observações no índice
+    # textual. Etiquetas carregadas com selectinload: o número de
+    # consultas não cresce com a quantidade de clientes encontrados
+    clientes = buscar_clientes(
+        query,
+        limite=request.args.get('limit', type=int),
+        opcoes=[selectinload(Cliente.etiquetas).selectinload(ClienteEtiqueta.etiqueta)]
+    )
     
     # Adiciona etiquetas a cada cliente
     resultado = []
@@ -126,11 +376,24 @@ def buscar():
     return jsonify(resultado)
 
 
+@main.route('/api/dashboard/stats', methods=['GET'])
+def dashboard_stats():
+    """Contagens do dashboard (status, plano, Herbalife, indicação, desafio)
+
+    Lidas da tabela de contadores (ESTATISTICAS_MATERIALIZADAS) ou, com
+    ?calcular=1, de um GROUP BY sobre os clientes.
+    """
+    materializadas = current_app.config.get('ESTATISTICAS_MATERIALIZADAS', True)
+    if request.args.get('calcular') in ('1', 'true'):
+        materializadas = False
+    return jsonify(estatisticas_dashboard(materializadas))
+
+
 @main.route('/api/etiquetas', methods=['GET'])
 def listar_etiquetas():
     """Lista todas as etiquetas"""
-    etiquetas = Etiqueta.query.all()
-    return jsonify([et.to_dict() for et in etiquetas])
+    linhas = db.session.query(*[getattr(Etiqueta, campo) for campo in CAMPOS_ETIQUETA]).order_by(Etiqueta.id).all()
+    return jsonify(serializar_linhas(linhas, CAMPOS_ETIQUETA, Etiqueta))
 
 
 @main.route('/api/etiquetas', methods=['POST'])
@@ -164,6 +427,329 @@ def adicionar_etiqueta_cliente(cliente_id, etiqueta_id):
         etiqueta_id=etiqueta_id
     )
     db.session.add(cliente_etiqueta)
+    # Etiqueta conta como alteração do cliente (ETag, /api/clientes/changes)
+    Cliente.query.filter_by(id=cliente_id).update({Cliente.atualizado_em: datetime.utcnow()})
     db.session.commit()
     return jsonify({'message': 'Etiqueta adicionada'})
 
+
+# Agenda ---------------------------------------------------------------
+
+def _ler_periodo(obrigatorio=True):
+    desde = ler_data(request.args.get('desde'), 'desde')
+    ate = ler_data(request.args.get('ate'), 'ate')
+    if obrigatorio and (desde is None or ate is None):
+        raise ParametroInvalido('Informe desde e ate')
+    if desde and ate and ate <= desde:
+        raise ParametroInvalido('ate deve ser depois de desde')
+    return desde, ate
+
+
+def _preencher_consulta(consulta, data):
+    """Copia do JSON os campos informados da consulta"""
+    if 'data_hora' in data:
+        consulta.data_hora = ler_data(data['data_hora'], 'data_hora')
+    if 'duracao' in data:
+        consulta.duracao = ler_duracao(data['duracao'])
+    for campo in ('profissional', 'tipo', 'status', 'observacoes'):
+        if campo in data:
+            setattr(consulta, campo, data[campo] or None)
+    if consulta.data_hora is None:
+        raise ParametroInvalido('data_hora é obrigatório')
+
+
+def _hora(momento):
+    return momento.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _referencia(item):
+    """Id da consulta ou série + data original da ocorrência"""
+    if isinstance(item, Ocorrencia):
+        return {'serie_id': item.serie.id, 'data_original': _hora(item.data_original)}
+    return {'id': item}
+
+
+def _item_agenda(item):
+    if isinstance(item, Ocorrencia):
+        return dict(item.to_dict(), origem='serie')
+    return dict(item.to_dict(), origem='consulta')
+
+
+def _resposta_conflito(erro):
+    return jsonify({'error': str(erro), 'conflitos': [_item_agenda(item) for item in erro.conflitos]}), 409
+
+
+@main.route('/api/consultas', methods=['GET'])
+def listar_consultas():
+    """Consultas por período (?desde=&ate=) e/ou ?profissional= e ?cliente_id="""
+    try:
+        desde, ate = _ler_periodo(obrigatorio=False)
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    query = Consulta.query
+    if 'profissional' in request.args:
+        query = query.filter(Consulta.profissional == (request.args['profissional'] or None))
+    if request.args.get('cliente_id', type=int):
+        query = query.filter(Consulta.cliente_id == request.args.get('cliente_id', type=int))
+    if desde:
+        query = query.filter(Consulta.data_hora >= desde)
+    if ate:
+        query = query.filter(Consulta.data_hora < ate)
+    return jsonify([consulta.to_dict() for consulta in query.order_by(Consulta.data_hora, Consulta.id)])
+
+
+@main.route('/api/consultas', methods=['POST'])
+def criar_consulta():
+    """Agenda uma consulta (409 se o horário do profissional estiver ocupado)"""
+    data = request.json or {}
+    if not isinstance(data.get('cliente_id'), int):
+        return jsonify({'error': 'cliente_id é obrigatório'}), 400
+    Cliente.query.get_or_404(data['cliente_id'])
+    consulta = Consulta(cliente_id=data['cliente_id'], duracao=DURACAO_PADRAO)
+    try:
+        _preencher_consulta(consulta, data)
+        salvar_consulta(consulta)
+        return jsonify(consulta.to_dict()), 201
+    except ConflitoHorario as e:
+        return _resposta_conflito(e)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+
+@main.route('/api/consultas/<int:id>', methods=['PUT'])
+def atualizar_consulta(id):
+    """Remarca ou altera uma consulta (status cancelada libera o horário)"""
+    consulta = Consulta.query.get_or_404(id)
+    try:
+        _preencher_consulta(consulta, request.json or {})
+        salvar_consulta(consulta)
+        return jsonify(consulta.to_dict())
+    except ConflitoHorario as e:
+        return _resposta_conflito(e)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+
+@main.route('/api/consultas/<int:id>', methods=['DELETE'])
+def deletar_consulta(id):
+    """Remove uma consulta avulsa (o horário fica livre)"""
+    consulta = Consulta.query.get_or_404(id)
+    db.session.delete(consulta)
+    db.session.commit()
+    return jsonify({'message': 'Consulta removida com sucesso'})
+
+
+@main.route('/api/consultas/disponibilidade', methods=['GET'])
+def disponibilidade():
+    """O horário está livre? ?data_hora=&duracao=&profissional=&ignorar=<id>"""
+    try:
+        inicio = ler_data(request.args.get('data_hora'), 'data_hora')
+        if inicio is None:
+            raise ParametroInvalido('data_hora é obrigatório')
+        duracao = ler_duracao(request.args.get('duracao'))
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    ocupados = indice_agenda.sobrepostos(
+        request.args.get('profissional') or None, inicio, fim_consulta(inicio, duracao),
+        ignorar=request.args.get('ignorar', type=int)
+    )
+    return jsonify({
+        'livre': not ocupados,
+        'conflitos': [dict(_referencia(id), inicio=_hora(de), fim=_hora(ate)) for id, de, ate in ocupados],
+    })
+
+
+@main.route('/api/consultas/horarios-livres', methods=['GET'])
+def horarios_livres():
+    """Próximos horários livres: ?desde=&ate=&duracao=&quantidade=&profissional="""
+    try:
+        desde, ate = _ler_periodo()
+        duracao = ler_duracao(request.args.get('duracao'))
+        quantidade = min(request.args.get('quantidade', 10, type=int), QUANTIDADE_MAXIMA)
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    livres = indice_agenda.horarios_livres(request.args.get('profissional') or None, desde, ate, duracao, quantidade)
+    return jsonify([{'inicio': _hora(inicio), 'fim': _hora(fim)} for inicio, fim in livres])
+
+
+@main.route('/api/consultas/conflitos', methods=['GET'])
+def conflitos_agenda():
+    """Pares de consultas sobrepostas no período (?desde=&ate=&profissional=)"""
+    try:
+        desde, ate = _ler_periodo()
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    pares = indice_agenda.conflitos(request.args.get('profissional') or None, desde, ate)
+    return jsonify([
+        {
+            'consultas': [item for item in par if not isinstance(item, Ocorrencia)],
+            'ocorrencias': [_referencia(item) for item in par if isinstance(item, Ocorrencia)],
+        }
+        for par in pares
+    ])
+
+
+@main.route('/api/agenda', methods=['GET'])
+def agenda():
+    """Consultas avulsas e ocorrências de séries no período, em ordem de horário
+
+    ?desde=&ate= obrigatórios; ?profissional= e ?cliente_id= opcionais.
+    """
+    try:
+        desde, ate = _ler_periodo()
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    filtros_consulta, filtros_serie = [], []
+    if 'profissional' in request.args:
+        profissional = request.args['profissional'] or None
+        filtros_consulta.append(Consulta.profissional == profissional)
+        filtros_serie.append(SerieConsulta.profissional == profissional)
+    cliente_id = request.args.get('cliente_id', type=int)
+    if cliente_id:
+        filtros_consulta.append(Consulta.cliente_id == cliente_id)
+        filtros_serie.append(SerieConsulta.cliente_id == cliente_id)
+    return jsonify([_item_agenda(item) for item in agenda_periodo(desde, ate, filtros_consulta, filtros_serie)])
+
+
+# Séries recorrentes ----------------------------------------------------
+
+def _inteiro(valor, campo):
+    if valor in (None, ''):
+        return None
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        raise ParametroInvalido(f'{campo} deve ser um número inteiro')
+
+
+def _preencher_serie(serie, data):
+    """Copia do JSON os campos informados da série"""
+    if 'inicio' in data:
+        serie.inicio = ler_data(data['inicio'], 'inicio')
+    if 'duracao' in data:
+        serie.duracao = ler_duracao(data['duracao'])
+    if 'frequencia' in data:
+        serie.frequencia = data['frequencia']
+    if 'intervalo' in data:
+        intervalo = _inteiro(data['intervalo'], 'intervalo')
+        serie.intervalo = 1 if intervalo is None else intervalo
+    if 'ocorrencias' in data:
+        serie.ocorrencias = _inteiro(data['ocorrencias'], 'ocorrencias')
+    if 'ate' in data:
+        serie.ate = ler_data(data['ate'], 'ate')
+    for campo in ('profissional', 'tipo', 'observacoes'):
+        if campo in data:
+            setattr(serie, campo, data[campo] or None)
+    if serie.inicio is None:
+        raise ParametroInvalido('inicio é obrigatório')
+
+
+@main.route('/api/series', methods=['GET'])
+def listar_series():
+    """Séries recorrentes (?cliente_id= e ?profissional= opcionais)"""
+    query = SerieConsulta.query
+    if request.args.get('cliente_id', type=int):
+        query = query.filter(SerieConsulta.cliente_id == request.args.get('cliente_id', type=int))
+    if 'profissional' in request.args:
+        query = query.filter(SerieConsulta.profissional == (request.args['profissional'] or None))
+    return jsonify([serie.to_dict() for serie in query.order_by(SerieConsulta.id)])
+
+
+@main.route('/api/series', methods=['POST'])
+def criar_serie():
+    """Cria uma série (409 se alguma ocorrência dos próximos meses bater com a agenda)"""
+    data = request.json or {}
+    if not isinstance(data.get('cliente_id'), int):
+        return jsonify({'error': 'cliente_id é obrigatório'}), 400
+    Cliente.query.get_or_404(data['cliente_id'])
+    serie = SerieConsulta(cliente_id=data['cliente_id'], duracao=DURACAO_PADRAO, frequencia='semanal', intervalo=1)
+    try:
+        _preencher_serie(serie, data)
+        salvar_serie(serie)
+        return jsonify(serie.to_dict()), 201
+    except ConflitoHorario as e:
+        return _resposta_conflito(e)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+
+@main.route('/api/series/<int:id>', methods=['PUT'])
+def atualizar_serie(id):
+    """Altera a série inteira, ou só a partir de uma ocorrência (a_partir_de)
+
+    Com a_partir_de a série é encerrada antes da data e as alterações vão
+    para uma nova série com o restante das ocorrências (devolvida no
+    corpo). Remarcar a série é uma única escrita, não uma por ocorrência.
+    """
+    serie = SerieConsulta.query.get_or_404(id)
+    data = request.json or {}
+    try:
+        alvo = serie
+        if data.get('a_partir_de'):
+            alvo = dividir_serie(serie, ler_data(data['a_partir_de'], 'a_partir_de'))
+        _preencher_serie(alvo, data)
+        salvar_serie(*dict.fromkeys([serie, alvo]))
+        return jsonify(alvo.to_dict())
+    except ConflitoHorario as e:
+        return _resposta_conflito(e)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+
+@main.route('/api/series/<int:id>', methods=['DELETE'])
+def deletar_serie(id):
+    """Remove a série com todas as ocorrências e exceções"""
+    serie = SerieConsulta.query.get_or_404(id)
+    db.session.delete(serie)
+    db.session.commit()
+    return jsonify({'message': 'Série removida com sucesso'})
+
+
+@main.route('/api/series/<int:id>/ocorrencias', methods=['GET'])
+def ocorrencias_serie(id):
+    """Ocorrências da série no período (?desde=&ate=), geradas na hora"""
+    SerieConsulta.query.get_or_404(id)
+    try:
+        desde, ate = _ler_periodo()
+    except ParametroInvalido as e:
+        return jsonify({'error': str(e)}), 400
+    ocorrencias = []
+    for serie, excecoes in carregar_series(desde, ate, filtros=[SerieConsulta.id == id]):
+        ocorrencias.extend(ocorrencia.to_dict() for ocorrencia in expandir(serie, desde, ate, excecoes))
+    return jsonify(ocorrencias)
+
+
+@main.route('/api/series/<int:id>/excecoes', methods=['POST'])
+def alterar_ocorrencia(id):
+    """Cancela, remarca ou altera uma ocorrência
+
+    {data_original, status?, data_hora?, duracao?, observacoes?}; uma
+    nova chamada para a mesma data_original substitui a anterior.
+    """
+    serie = SerieConsulta.query.get_or_404(id)
+    data = request.json or {}
+    try:
+        data_original = ler_data(data.get('data_original'), 'data_original')
+        if data_original is None:
+            raise ParametroInvalido('data_original é obrigatório')
+        excecao = ExcecaoSerie.query.filter_by(serie_id=id, data_original=data_original).first()
+        if excecao is None:
+            excecao = ExcecaoSerie(serie=serie, data_original=data_original)
+        if 'data_hora' in data:
+            excecao.data_hora = ler_data(data['data_hora'], 'data_hora')
+        if 'duracao' in data:
+            excecao.duracao = ler_duracao(data['duracao']) if data['duracao'] else None
+        for campo in ('status', 'observacoes'):
+            if campo in data:
+                setattr(excecao, campo, data[campo] or None)
+        salvar_excecao(excecao)
+        return jsonify(Ocorrencia(serie, data_original, excecao).to_dict())
+    except ConflitoHorario as e:
+        return _resposta_conflito(e)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
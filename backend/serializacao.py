@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Serialização JSON das listagens
+
+Listagens somente leitura selecionam tuplas de colunas (sem montar
+objetos do ORM), formatam as datas coluna a coluna e são codificadas
+com orjson quando ele está instalado. Coleções grandes podem sair em
+NDJSON (um registro por linha), geradas à medida que o banco devolve
+as linhas.
+"""
+
+from itertools import islice
+from flask import Response, current_app, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import Date, DateTime
+
+try:
+    import orjson
+except ImportError:  # opcional: sem ele o Flask usa o json da stdlib
+    orjson = None
+
+# Linhas lidas do banco e serializadas por vez no modo streaming
+TAMANHO_BLOCO_STREAM = 1000
+
+MIMETYPE_NDJSON = 'application/x-ndjson'
+
+
+def _formatar_data(valor):
+    # Igual a strftime('%Y-%m-%d'), bem mais rápido
+    return valor.isoformat()
+
+
+def _formatar_data_hora(valor):
+    # Igual a strftime('%Y-%m-%d %H:%M:%S')
+    return valor.isoformat(' ', 'seconds')
+
+
+def formatador_coluna(model, campo):
+    """Função que formata os valores da coluna, ou None se não precisa"""
+    tipo = model.__table__.c[campo].type
+    if isinstance(tipo, DateTime):
+        return _formatar_data_hora
+    if isinstance(tipo, Date):
+        return _formatar_data
+    return None
+
+
+def codificar_coluna(valores, formatar):
+    """Formata uma coluna inteira; datas repetidas são formatadas uma vez"""
+    cache = {None: None}
+    resultado = []
+    for valor in valores:
+        texto = cache.get(valor)
+        if texto is None and valor is not None:
+            texto = cache[valor] = formatar(valor)
+        resultado.append(texto)
+    return resultado
+
+
+def serializar_linhas(linhas, campos, model):
+    """Converte tuplas do banco em dicts prontos para o JSON
+
+    As primeiras len(campos) colunas de cada linha precisam estar na
+    ordem de campos; colunas extras (ex.: as do cursor) são ignoradas.
+    Datas saem no mesmo formato dos to_dict dos models.
+    """
+    if not linhas:
+        return []
+
+    colunas = list(zip(*linhas))[:len(campos)]
+    for i, campo in enumerate(campos):
+        formatar = formatador_coluna(model, campo)
+        if formatar is not None:
+            colunas[i] = codificar_coluna(colunas[i], formatar)
+    return [dict(zip(campos, valores)) for valores in zip(*colunas)]
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSONProvider do Flask que codifica com orjson
+
+    Tipos que o orjson não conhece (e datetime, para manter o formato
+    do Flask) caem no default() do DefaultJSONProvider.
+    """
+
+    def dumps(self, obj, **kwargs):
+        # Sempre em uma linha, como no DefaultJSONProvider (o NDJSON depende disso)
+        return self._codificar(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indentar = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self._codificar(obj, indentar), mimetype=self.mimetype)
+
+    def _codificar(self, obj, indentar=False):
+        opcoes = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            opcoes |= orjson.OPT_SORT_KEYS
+        if indentar:
+            opcoes |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=opcoes)
+
+
+def configurar_json(app):
+    """Troca o encoder JSON do app pelo orjson, se disponível e habilitado"""
+    if orjson is not None and app.config.get('JSON_ORJSON', True):
+        app.json = OrjsonProvider(app)
+
+
+def quer_ndjson():
+    """O cliente pediu streaming? (?stream=1 ou Accept: application/x-ndjson)"""
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    melhor = request.accept_mimetypes.best_match(['application/json', MIMETYPE_NDJSON])
+    return melhor == MIMETYPE_NDJSON
+
+
+def resposta_ndjson(query, campos, model, tamanho_bloco=TAMANHO_BLOCO_STREAM):
+    """Resposta NDJSON gerada enquanto a consulta é lida
+
+    A consulta usa yield_per (cursor do lado do servidor onde o driver
+    suporta), então a memória e o tempo até o primeiro byte não
+    dependem do total de linhas.
+    """
+    provider = current_app.json
+
+    def gerar():
+        linhas = iter(query.yield_per(tamanho_bloco))
+        while True:
+            bloco = list(islice(linhas, tamanho_bloco))
+            if not bloco:
+                return
+            registros = serializar_linhas(bloco, campos, model)
+            yield ''.join(provider.dumps(registro) + '\n' for registro in registros)
+
+    return Response(stream_with_context(gerar()), mimetype=MIMETYPE_NDJSON)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Detecção de clientes duplicados
+
+Índice em memória com trigramas do nome (mesma ideia do pg_trgm) e
+índices exatos por email normalizado e WhatsApp só com dígitos. O
+índice é carregado do banco na primeira consulta, atualizado a cada
+commit que cria, altera ou remove um Cliente e recarregado quando a
+assinatura do banco muda (backend/assinatura.py).
+"""
+
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from math import ceil
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from backend.models import db, Cliente
+from backend.assinatura import AssinaturaBanco
+
+SIMILARIDADE_MINIMA = 60
+LIMITE_PADRAO = 10
+
+# Custo relativo de uma interseção de conjuntos em Python frente a uma
+# entrada de posting list contada pelo Counter
+CUSTO_INTERSECAO = 20
+
+
+def normalizar_nome(nome):
+    """Minúsculas, sem acentos e com espaços simples"""
+    if not nome:
+        return ''
+    sem_acento = unicodedata.normalize('NFKD', nome)
+    sem_acento = ''.join(c for c in sem_acento if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', sem_acento.lower()))
+
+
+def normalizar_email(email):
+    return (email or '').strip().lower()
+
+
+def normalizar_whatsapp(whatsapp):
+    return re.sub(r'\D', '', whatsapp or '')
+
+
+def trigramas(nome_normalizado):
+    """Trigramas de cada palavra com o mesmo preenchimento do pg_trgm"""
+    resultado = set()
+    for palavra in nome_normalizado.split():
+        palavra = f'  {palavra} '
+        for i in range(len(palavra) - 2):
+            resultado.add(palavra[i:i + 3])
+    return resultado
+
+
+class IndiceSimilaridade:
+    """Índice de trigramas + hashes exatos sobre os clientes"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.assinatura = AssinaturaBanco(self._assinatura_banco)
+        self._limpar()
+
+    def _limpar(self):
+        self.clientes = {}  # id -> (nome, email, whatsapp, trigramas)
+        self.por_trigrama = defaultdict(set)
+        self.por_email = defaultdict(set)
+        self.por_whatsapp = defaultdict(set)
+        self.carregado = False
+
+    def _assinatura_banco(self):
+        return tuple(db.session.query(
+            func.count(Cliente.id), func.max(Cliente.id), func.max(Cliente.atualizado_em)
+        ).one())
+
+    def carregar(self):
+        """(Re)constrói o índice a partir do banco"""
+        linhas = db.session.query(Cliente.id, Cliente.nome, Cliente.email, Cliente.whatsapp)
+        with self._lock:
+            self._limpar()
+            self.assinatura.registrar()
+            for linha in linhas.yield_per(5000):
+                self._adicionar(linha.id, linha.nome, linha.email, linha.whatsapp)
+            self.carregado = True
+
+    def _garantir_atualizado(self):
+        if not self.carregado or self.assinatura.mudou():
+            self.carregar()
+
+    def _adicionar(self, id, nome, email, whatsapp):
+        nome_norm = normalizar_nome(nome)
+        email_norm = normalizar_email(email)
+        whatsapp_norm = normalizar_whatsapp(whatsapp)
+        tris = trigramas(nome_norm)
+
+        self.clientes[id] = (nome, email, whatsapp, tris)
+        for tri in tris:
+            self.por_trigrama[tri].add(id)
+        if email_norm:
+            self.por_email[email_norm].add(id)
+        if whatsapp_norm:
+            self.por_whatsapp[whatsapp_norm].add(id)
+
+    def _remover(self, id):
+        anterior = self.clientes.pop(id, None)
+        if anterior is None:
+            return
+        nome, email, whatsapp, tris = anterior
+        for tri in tris:
+            self.por_trigrama[tri].discard(id)
+        self.por_email.get(normalizar_email(email), set()).discard(id)
+        self.por_whatsapp.get(normalizar_whatsapp(whatsapp), set()).discard(id)
+
+    def aplicar(self, alteracoes):
+        """Aplica alterações [(id, dados ou None para remoção)]"""
+        with self._lock:
+            if not self.carregado:
+                return  # Será carregado completo na primeira busca
+            for id, dados in alteracoes:
+                self._remover(id)
+                if dados is not None:
+                    self._adicionar(id, *dados)
+
+    def _comuns_por_candidato(self, tris, minimo):
+        """Conta quantos trigramas cada candidato compartilha com o nome buscado
+
+        Filtro por prefixo: com Jaccard >= t o candidato precisa ter ao
+        menos t*|A| trigramas em comum, logo ao menos um dos
+        (|A| - ceil(t*|A|) + 1) trigramas mais raros de A. Só esses
+        posting lists geram candidatos. Para nomes raros sobram poucos
+        candidatos e a interseção é feita um a um; para nomes comuns
+        ("Maria Silva") sai mais barato somar os demais posting lists
+        no mesmo Counter (em C).
+        """
+        ordenados = sorted(tris, key=lambda tri: len(self.por_trigrama.get(tri, ())))
+        necessarios = max(ceil(minimo / 100 * len(ordenados)), 1)
+        corte = len(ordenados) - necessarios + 1
+        contagem = Counter()
+        for tri in ordenados[:corte]:
+            contagem.update(self.por_trigrama.get(tri, ()))
+
+        restantes = [self.por_trigrama.get(tri, ()) for tri in ordenados[corte:]]
+        if len(contagem) * CUSTO_INTERSECAO > sum(len(posting) for posting in restantes):
+            # Quem não está em nenhum posting do prefixo soma no máximo
+            # necessarios - 1 e é descartado pelo filtro abaixo
+            for posting in restantes:
+                contagem.update(posting)
+            return [(id, comuns) for id, comuns in contagem.items() if comuns >= necessarios]
+
+        resultado = []
+        for id in contagem:
+            comuns = len(tris.intersection(self.clientes[id][3]))
+            if comuns >= necessarios:
+                resultado.append((id, comuns))
+        return resultado
+
+    def buscar(self, nome=None, email=None, whatsapp=None, limite=LIMITE_PADRAO, minimo=SIMILARIDADE_MINIMA):
+        """Retorna candidatos [{id, nome, email, whatsapp, similaridade}]"""
+        with self._lock:
+            self._garantir_atualizado()
+            pontuacao = {}
+
+            email_norm = normalizar_email(email)
+            if email_norm:
+                for id in self.por_email.get(email_norm, ()):
+                    pontuacao[id] = 100
+
+            whatsapp_norm = normalizar_whatsapp(whatsapp)
+            if whatsapp_norm:
+                for id in self.por_whatsapp.get(whatsapp_norm, ()):
+                    pontuacao[id] = 100
+
+            tris = trigramas(normalizar_nome(nome))
+            total = len(tris)
+            for id, comuns in self._comuns_por_candidato(tris, minimo):
+                # Jaccard = |A ∩ B| / (|A| + |B| - |A ∩ B|)
+                similaridade = round(100 * comuns / (total + len(self.clientes[id][3]) - comuns))
+                if similaridade >= minimo and similaridade > pontuacao.get(id, 0):
+                    pontuacao[id] = similaridade
+
+            melhores = sorted(pontuacao.items(), key=lambda item: (-item[1], item[0]))[:limite]
+            return [
+                {
+                    'id': id,
+                    'nome': self.clientes[id][0],
+                    'email': self.clientes[id][1] or '',
+                    'whatsapp': self.clientes[id][2] or '',
+                    'similaridade': similaridade,
+                }
+                for id, similaridade in melhores
+            ]
+
+
+indice_similaridade = IndiceSimilaridade()
+
+
+# Sincronização incremental: as mudanças do flush ficam pendentes na
+# sessão e só entram no índice depois do commit
+
+def _pendentes(session):
+    return session.info.setdefault('similaridade_pendentes', [])
+
+
+@event.listens_for(Cliente, 'after_insert')
+@event.listens_for(Cliente, 'after_update')
+def _cliente_salvo(mapper, connection, cliente):
+    sessao = Session.object_session(cliente)
+    if sessao is not None:
+        _pendentes(sessao).append((cliente.id, (cliente.nome, cliente.email, cliente.whatsapp)))
+
+
+@event.listens_for(Cliente, 'after_delete')
+def _cliente_removido(mapper, connection, cliente):
+    sessao = Session.object_session(cliente)
+    if sessao is not None:
+        _pendentes(sessao).append((cliente.id, None))
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_pendentes(session):
+    alteracoes = session.info.pop('similaridade_pendentes', None)
+    if alteracoes:
+        indice_similaridade.aplicar(alteracoes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_pendentes(session):
+    session.info.pop('similaridade_pendentes', None)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Sincronização incremental de clientes
+
+O front guarda uma réplica local e pede só o que mudou desde a última
+sincronização: clientes com atualizado_em mais novo e os ids removidos
+(tabela clientes_removidos, gravada no after_delete de Cliente).
+
+atualizado_em é preenchido no flush, não no commit: uma transação que
+demora a confirmar aparece com um horário anterior ao de alterações
+já entregues. Por isso a consulta volta SOBREPOSICAO antes do since, e
+quem sincroniza aplica o resultado por id (repetições são inofensivas).
+
+Os tombstones só ficam guardados por JANELA_SINCRONIZACAO (a tarefa
+limpar-removidos, em backend/tarefas.py, apaga os mais antigos). Uma
+réplica com since mais antigo que isso pode ter perdido remoções: a
+rota responde 410 e o front refaz a sincronização completa (sem since).
+"""
+
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import event
+from backend.models import db, Cliente, ClienteRemovido
+from backend.paginacao import CAMPOS_CLIENTE, ParametroInvalido, consulta_projetada
+from backend.serializacao import serializar_linhas
+
+# Maior atraso esperado entre o flush e o commit de quem grava clientes
+# (importações confirmam a cada lote) mais a diferença de relógio entre
+# os processos
+SOBREPOSICAO = timedelta(minutes=5)
+
+# Por quanto tempo os tombstones ficam guardados: o maior intervalo
+# aceito entre duas sincronizações de uma réplica
+JANELA_SINCRONIZACAO = timedelta(days=30)
+
+
+class SincronizacaoExpirada(Exception):
+    """since mais antigo que JANELA_SINCRONIZACAO: refazer a sincronização completa"""
+
+
+def ler_desde(since):
+    """Valida o parâmetro since= (ISO 8601, UTC). Vazio = desde o início."""
+    if not since:
+        return None
+    try:
+        desde = datetime.fromisoformat(since.replace('Z', '+00:00'))
+    except ValueError:
+        raise ParametroInvalido('since deve ser uma data ISO 8601 (ex.: 2024-01-31T12:00:00)')
+    if desde.tzinfo is not None:
+        # atualizado_em é gravado em UTC sem fuso
+        desde = desde.astimezone(timezone.utc).replace(tzinfo=None)
+    return desde
+
+
+def alteracoes_desde(desde, agora=None):
+    """Clientes alterados e ids removidos depois de desde
+
+    Retorna (clientes, removidos, ate). ate é o maior timestamp visto
+    (com microssegundos) e deve ser enviado como since na próxima vez.
+    Quem aplica o resultado deve processar removidos antes de clientes.
+    Alterações dos últimos SOBREPOSICAO antes de desde vêm de novo.
+    Levanta SincronizacaoExpirada se os tombstones desse período já
+    podem ter sido apagados.
+    """
+    agora = agora or datetime.utcnow()
+    if desde is not None and desde - SOBREPOSICAO < agora - JANELA_SINCRONIZACAO:
+        raise SincronizacaoExpirada(
+            f'since mais antigo que {JANELA_SINCRONIZACAO.days} dias: sincronize de novo sem since'
+        )
+
+    query = consulta_projetada(CAMPOS_CLIENTE, ordem='atualizado_em')
+    removidos = db.session.query(ClienteRemovido.cliente_id, ClienteRemovido.removido_em)
+    if desde is not None:
+        query = query.filter(Cliente.atualizado_em > desde - SOBREPOSICAO)
+        removidos = removidos.filter(ClienteRemovido.removido_em > desde - SOBREPOSICAO)
+        removidos = removidos.order_by(ClienteRemovido.removido_em).all()
+    else:
+        # Sincronização completa: a réplica começa vazia, não há o que remover
+        removidos = []
+
+    linhas = query.order_by(Cliente.atualizado_em, Cliente.id).all()
+
+    marcas = [linha.atualizado_em for linha in linhas if linha.atualizado_em]
+    marcas += [removido.removido_em for removido in removidos]
+    if desde is not None:
+        marcas.append(desde)
+    ate = max(marcas) if marcas else None
+
+    return (
+        serializar_linhas(linhas, CAMPOS_CLIENTE, Cliente),
+        sorted({removido.cliente_id for removido in removidos}),
+        ate.isoformat() if ate else None,
+    )
+
+
+def limpar_removidos(agora=None):
+    """Apaga os tombstones mais antigos que JANELA_SINCRONIZACAO
+
+    Retorna quantos foram apagados (o commit fica com quem chama).
+    """
+    agora = agora or datetime.utcnow()
+    return ClienteRemovido.query.filter(
+        ClienteRemovido.removido_em < agora - JANELA_SINCRONIZACAO
+    ).delete(synchronize_session=False)
+
+
+@event.listens_for(Cliente, 'after_delete')
+def _registrar_remocao(mapper, connection, cliente):
+    """Tombstone na mesma transação, venha a remoção de onde vier
+
+    DELETE em massa (query.delete()) não passa pelo mapper e não gera
+    tombstone.
+    """
+    connection.execute(ClienteRemovido.__table__.insert().values(
+        cliente_id=cliente.id, removido_em=datetime.utcnow()
+    ))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Tarefas agendadas
+
+Feitas para rodar pelo cron (uma vez por dia basta para vencimentos).
+Cada execução fica registrada em tarefas_execucoes com a duração e o
+número de registros afetados.
+
+Uso:
+  python3 -m backend.tarefas expirar-acessos
+  python3 -m backend.tarefas limpar-removidos
+  python3 -m backend.tarefas vencendo [dias]
+  python3 -m backend.tarefas historico [tarefa]
+
+Exemplo de crontab (todo dia às 00:05):
+  5 0 * * * cd /caminho/andenutri && python3 -m backend.tarefas expirar-acessos
+  10 0 * * * cd /caminho/andenutri && python3 -m backend.tarefas limpar-removidos
+"""
+
+import sys
+import time
+from datetime import datetime
+from backend.models import db, ExecucaoTarefa
+from backend.sincronizacao import limpar_removidos
+from backend.vencimento import expirar_acessos
+
+
+def executar_tarefa(nome, funcao, *args):
+    """Roda a tarefa em uma transação e registra duração e afetados
+
+    funcao retorna o número de registros afetados. Em caso de erro a
+    transação é desfeita, o erro fica registrado e a exceção é relançada.
+    """
+    execucao = ExecucaoTarefa(tarefa=nome, iniciada_em=datetime.utcnow())
+    inicio = time.perf_counter()
+    try:
+        execucao.afetados = funcao(*args)
+        execucao.duracao_ms = round((time.perf_counter() - inicio) * 1000)
+        db.session.add(execucao)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        execucao.duracao_ms = round((time.perf_counter() - inicio) * 1000)
+        execucao.erro = str(e)
+        db.session.add(execucao)
+        db.session.commit()
+        raise
+    return execucao
+
+
+def tarefa_expirar_acessos():
+    return executar_tarefa('expirar_acessos', expirar_acessos)
+
+
+def tarefa_limpar_removidos():
+    return executar_tarefa('limpar_removidos', limpar_removidos)
+
+
+if __name__ == '__main__':
+    from backend import create_app
+    from backend.vencimento import consulta_vencendo, obter_status_vencimento
+
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    comando = sys.argv[1]
+    app = create_app()
+    with app.app_context():
+        if comando == 'expirar-acessos':
+            execucao = tarefa_expirar_acessos()
+            print(f"✅ {execucao.afetados} acessos bloqueados em {execucao.duracao_ms}ms")
+        elif comando == 'limpar-removidos':
+            execucao = tarefa_limpar_removidos()
+            print(f"🧹 {execucao.afetados} registros de clientes removidos apagados em {execucao.duracao_ms}ms")
+        elif comando == 'vencendo':
+            dias = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+            clientes = consulta_vencendo(dias).all()
+            print(f"📅 {len(clientes)} clientes vencem nos próximos {dias} dias")
+            for cliente in clientes:
+                status = obter_status_vencimento(cliente.data_vencimento)
+                print(f"  {cliente.data_vencimento}  ({status['dias_restantes']} dias)  {cliente.nome}")
+        elif comando == 'historico':
+            query = ExecucaoTarefa.query
+            if len(sys.argv) > 2:
+                query = query.filter_by(tarefa=sys.argv[2])
+            for execucao in query.order_by(ExecucaoTarefa.id.desc()).limit(20):
+                situacao = f"❌ {execucao.erro}" if execucao.erro else f"{execucao.afetados} afetados"
+                print(f"  {execucao.iniciada_em:%Y-%m-%d %H:%M:%S}  {execucao.tarefa}  "
+                      f"{execucao.duracao_ms}ms  {situacao}")
+        else:
+            print(__doc__)
+            sys.exit(1)
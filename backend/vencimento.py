@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Vencimento de programa e expiração de acesso
+
+calcular_vencimento_programa e obter_status_vencimento espelham
+src/utils/calcularVencimento.ts; mantenha os dois em sincronia.
+"""
+
+from datetime import date, datetime, timedelta
+from sqlalchemy import or_
+from backend.models import db, Cliente
+
+DURACAO_PADRAO_DIAS = 90
+DIAS_AVISO = 7  # Até quantos dias antes o status vira 'proximo'
+
+
+def _para_data(valor):
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return datetime.fromisoformat(valor).date()
+
+
+def calcular_vencimento_programa(data_compra, duracao_dias=DURACAO_PADRAO_DIAS):
+    """Data da compra + duração do programa (90 dias se não informada)"""
+    if not data_compra:
+        return None
+    return _para_data(data_compra) + timedelta(days=duracao_dias or DURACAO_PADRAO_DIAS)
+
+
+def obter_status_vencimento(vencimento, hoje=None):
+    """{status: vencido|proximo|ok, dias_restantes, cor}
+
+    Sem vencimento dias_restantes é None (Infinity no TS, que não cabe
+    em JSON). Para 'vencido' é o número de dias desde o vencimento.
+    """
+    if not vencimento:
+        return {'status': 'ok', 'dias_restantes': None, 'cor': 'text-gray-600'}
+
+    hoje = hoje or datetime.utcnow().date()
+    dias_restantes = (_para_data(vencimento) - hoje).days
+
+    if dias_restantes < 0:
+        return {'status': 'vencido', 'dias_restantes': abs(dias_restantes), 'cor': 'text-red-600'}
+    if dias_restantes <= DIAS_AVISO:
+        return {'status': 'proximo', 'dias_restantes': dias_restantes, 'cor': 'text-orange-600'}
+    return {'status': 'ok', 'dias_restantes': dias_restantes, 'cor': 'text-green-600'}
+
+
+def esta_vencido(vencimento, hoje=None):
+    hoje = hoje or datetime.utcnow().date()
+    return vencimento is not None and hoje > vencimento
+
+
+def _com_acesso_ativo():
+    # NULL conta como liberado (o default da coluna é True)
+    return or_(Cliente.tempo_acesso_ativo.is_(True), Cliente.tempo_acesso_ativo.is_(None))
+
+
+def expirar_acessos(hoje=None):
+    """Bloqueia o acesso de todos os clientes vencidos em um único UPDATE
+
+    Usa o índice de data_vencimento. atualizado_em também muda, para
+    ETags e /api/clientes/changes enxergarem a alteração. Retorna
+    quantos clientes foram bloqueados (o commit fica com quem chama).
+    """
+    hoje = hoje or datetime.utcnow().date()
+    return Cliente.query.filter(
+        Cliente.data_vencimento < hoje,
+        _com_acesso_ativo()
+    ).update(
+        {Cliente.tempo_acesso_ativo: False, Cliente.atualizado_em: datetime.utcnow()},
+        synchronize_session=False
+    )
+
+
+def consulta_vencendo(dias, query=None, hoje=None):
+    """Clientes com acesso ativo que vencem entre hoje e hoje + dias
+
+    query permite partir de uma consulta projetada (tuplas de colunas).
+    """
+    hoje = hoje or datetime.utcnow().date()
+    query = query if query is not None else Cliente.query
+    return query.filter(
+        Cliente.data_vencimento >= hoje,
+        Cliente.data_vencimento <= hoje + timedelta(days=dias),
+        _com_acesso_ativo()
+    ).order_by(Cliente.data_vencimento, Cliente.id)
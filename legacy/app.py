@@ -6,6 +6,12 @@ ANDENUTRI - Aplicação Principal
 
 from flask import Flask, render_template_string, jsonify, request
 from backend.models import db, Cliente, Etiqueta
+from backend.busca import buscar_clientes
+from backend.etags import condicional, etag_clientes
+from backend.migracoes import aplicar_migracoes
+from backend.paginacao import CAMPOS_CLIENTE, consulta_projetada
+from backend.serializacao import quer_ndjson, resposta_ndjson
+import backend.sincronizacao  # tombstones (after_delete) para /api/clientes/changes
 from datetime import datetime
 import os
 
@@ -460,7 +466,12 @@ def index():
 
 # Rotas API
 @app.route('/api/clientes', methods=['GET'])
+@condicional(etag_clientes)
 def listar_clientes():
+    if quer_ndjson():
+        # ?stream=1 ou Accept: application/x-ndjson: um cliente por linha
+        consulta = consulta_projetada(CAMPOS_CLIENTE).order_by(Cliente.id)
+        return resposta_ndjson(consulta, CAMPOS_CLIENTE, Cliente)
     clientes = Cliente.query.all()
     return jsonify([cliente.to_dict() for cliente in clientes])
 
@@ -497,17 +508,13 @@ def buscar():
     if not query:
         clientes = Cliente.query.all()
     else:
-        clientes = Cliente.query.filter(
-            (Cliente.nome.ilike(f'%{query}%')) |
-            (Cliente.email.ilike(f'%{query}%')) |
-            (Cliente.telefone.ilike(f'%{query}%'))
-        ).all()
+        clientes = buscar_clientes(query)
     
     return jsonify([cliente.to_dict() for cliente in clientes])
 
 # Inicializar banco de dados
 with app.app_context():
-    db.create_all()
+    aplicar_migracoes()
     
     # Criar etiquetas padrão se não existirem
     if Etiqueta.query.count() == 0:
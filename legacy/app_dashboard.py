@@ -6,6 +6,13 @@ ANDENUTRI - Dashboard Completo
 
 from flask import Flask, render_template_string, jsonify, request
 from backend.models import db, Cliente, Etiqueta
+from backend.busca import buscar_clientes
+from backend.estatisticas import estatisticas_dashboard
+from backend.etags import condicional, etag_cliente, etag_clientes
+from backend.migracoes import aplicar_migracoes
+from backend.paginacao import CAMPOS_CLIENTE, consulta_projetada
+from backend.serializacao import quer_ndjson, resposta_ndjson
+import backend.sincronizacao  # tombstones (after_delete) para /api/clientes/changes
 from datetime import datetime, date
 import os
 from dotenv import load_dotenv
@@ -18,7 +25,7 @@ app = Flask(__name__)
 
 # Configuração
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(os.path.dirname(__file__), "andenutri.db")}'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL') or f'sqlite:///{os.path.join(os.path.dirname(__file__), "andenutri.db")}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Inicializar Supabase
@@ -776,7 +783,7 @@ HTML_TEMPLATE = open('dashboard_template.html', 'r', encoding='utf-8').read() if
                 const response = await fetch('/api/clientes');
             const clientes = await response.json();
             exibirClientes(clientes);
-            atualizarStats(clientes);
+            atualizarStats();
             exibirTrello(clientes);
             } catch (error) {
                 console.error('Erro:', error);
@@ -800,12 +807,12 @@ HTML_TEMPLATE = open('dashboard_template.html', 'r', encoding='utf-8').read() if
             document.getElementById('clientesListView').innerHTML = grid.innerHTML;
         }
 
-        function atualizarStats(clientes) {
-            document.getElementById('total-clientes').textContent = clientes.length;
-            document.getElementById('clientes-ativos').textContent = 
-                clientes.filter(c => c.status === 'ativo').length;
-            document.getElementById('clientes-inativos').textContent = 
-                clientes.filter(c => c.status === 'inativo').length;
+        async function atualizarStats() {
+            const response = await fetch('/api/dashboard/stats');
+            const stats = await response.json();
+            document.getElementById('total-clientes').textContent = stats.total;
+            document.getElementById('clientes-ativos').textContent = stats.status.ativo || 0;
+            document.getElementById('clientes-inativos').textContent = stats.status.inativo || 0;
         }
 
         // Exibir Trello/Kanban
@@ -1130,7 +1137,12 @@ def index():
     return render_template_string(HTML_TEMPLATE)
 
 @app.route('/api/clientes', methods=['GET'])
+@condicional(etag_clientes)
 def listar_clientes():
+    if quer_ndjson():
+        # ?stream=1 ou Accept: application/x-ndjson: um cliente por linha
+        consulta = consulta_projetada(CAMPOS_CLIENTE).order_by(Cliente.id)
+        return resposta_ndjson(consulta, CAMPOS_CLIENTE, Cliente)
     clientes = Cliente.query.all()
     return jsonify([cliente.to_dict() for cliente in clientes])
 
@@ -1159,7 +1171,13 @@ def criar_cliente():
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
+@app.route('/api/dashboard/stats', methods=['GET'])
+def dashboard_stats():
+    """Contagens do dashboard sem baixar a lista de clientes"""
+    return jsonify(estatisticas_dashboard())
+
 @app.route('/api/clientes/<int:cliente_id>', methods=['GET'])
+@condicional(etag_cliente)
 def obter_cliente(cliente_id):
     """Obtém detalhes de um cliente específico"""
     cliente = Cliente.query.get_or_404(cliente_id)
@@ -1172,17 +1190,13 @@ def buscar():
     if not query:
         clientes = Cliente.query.all()
     else:
-        clientes = Cliente.query.filter(
-            (Cliente.nome.ilike(f'%{query}%')) |
-            (Cliente.email.ilike(f'%{query}%')) |
-            (Cliente.telefone.ilike(f'%{query}%'))
-        ).all()
+        clientes = buscar_clientes(query)
     
     return jsonify([cliente.to_dict() for cliente in clientes])
 
 # Inicializar banco de dados
 with app.app_context():
-    db.create_all()
+    aplicar_migracoes()
     
     if Etiqueta.query.count() == 0:
         etiquetas_default = [
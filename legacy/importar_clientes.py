@@ -8,39 +8,49 @@ import csv
 import sys
 from datetime import datetime
 from backend.models import db, Cliente
+from backend.importacao import LinhaRejeitada, TAMANHO_LOTE_PADRAO, abrir_journal, importar_em_lotes, ler_csv
 from app import app
 
-def importar_cliente(row):
-    """Importa um cliente do CSV/Excel"""
+def mapear_cliente(row):
+    """Converte uma linha do CSV/Excel no dict de colunas do Cliente"""
     
     # Mapeamento de colunas (ajuste conforme sua planilha)
-    cliente = Cliente(
-        nome=row.get('Nome', row.get('nome', '')),
-        email=row.get('Email', row.get('email', '')),
-        telefone=row.get('Telefone', row.get('telefone', '')),
-        whatsapp=row.get('WhatsApp', row.get('whatsapp', '')),
-        status=row.get('Status', row.get('status', 'ativo')).lower(),
-        plano_ativo=row.get('Plano', row.get('plano', '')),
-        objetivos=row.get('Objetivos', row.get('objetivos', '')),
-        observacoes=row.get('Observações', row.get('observacoes', ''))
-    )
+    dados = {
+        'nome': row.get('Nome', row.get('nome', '')),
+        'email': row.get('Email', row.get('email', '')),
+        'telefone': row.get('Telefone', row.get('telefone', '')),
+        'whatsapp': row.get('WhatsApp', row.get('whatsapp', '')),
+        'status': (row.get('Status', row.get('status', 'ativo')) or 'ativo').lower(),
+        'plano_ativo': row.get('Plano', row.get('plano', '')),
+        'objetivos': row.get('Objetivos', row.get('objetivos', '')),
+        'observacoes': row.get('Observações', row.get('observacoes', ''))
+    }
+    
+    if not dados['nome']:
+        raise LinhaRejeitada('Nome vazio')
+    if not dados['email']:
+        raise LinhaRejeitada('Email vazio')
     
     # Datas opcionais
     if row.get('Data Nascimento') or row.get('data_nascimento'):
         try:
             data_nasc = row.get('Data Nascimento') or row.get('data_nascimento')
-            cliente.data_nascimento = datetime.strptime(data_nasc, '%Y-%m-%d').date()
-        except:
+            dados['data_nascimento'] = datetime.strptime(data_nasc, '%Y-%m-%d').date()
+        except ValueError:
             pass
     
     if row.get('Data Vencimento') or row.get('data_vencimento'):
         try:
             data_venc = row.get('Data Vencimento') or row.get('data_vencimento')
-            cliente.data_vencimento = datetime.strptime(data_venc, '%Y-%m-%d').date()
-        except:
+            dados['data_vencimento'] = datetime.strptime(data_venc, '%Y-%m-%d').date()
+        except ValueError:
             pass
     
-    return cliente
+    return dados
+
+def importar_cliente(row):
+    """Importa um cliente do CSV/Excel"""
+    return Cliente(**mapear_cliente(row))
 
 def importar_csv(nome_arquivo):
     """Importa clientes de arquivo CSV"""
@@ -68,6 +78,39 @@ def importar_csv(nome_arquivo):
             print(f"❌ Erro ao salvar: {e}")
             return False
 
+def importar_csv_streaming(nome_arquivo, tamanho_lote=TAMANHO_LOTE_PADRAO, arquivo_rejeitados=None,
+                           upsert=False, recomecar=False):
+    """Importa clientes do CSV em lotes, com commit por lote
+
+    Não guarda o arquivo em memória; linhas rejeitadas vão para
+    <arquivo>.rejeitados.csv com o número da linha e o erro. Com
+    upsert=True clientes já cadastrados (mesmo email/telefone) são
+    atualizados em vez de duplicados. Se a importação for interrompida,
+    rodar de novo retoma do último lote gravado.
+    """
+    if arquivo_rejeitados is None:
+        arquivo_rejeitados = f"{nome_arquivo}.rejeitados.csv"
+    
+    with app.app_context():
+        journal = abrir_journal(nome_arquivo, recomecar=recomecar)
+        if journal is None:
+            return None
+        resultado = importar_em_lotes(
+            ler_csv(nome_arquivo),
+            mapear_cliente,
+            tamanho_lote=tamanho_lote,
+            arquivo_rejeitados=arquivo_rejeitados,
+            upsert=upsert,
+            journal=journal
+        )
+    
+    print(f"\n✅ {resultado['inseridos']} clientes importados em {resultado['segundos']}s")
+    if upsert:
+        print(f"🔄 {resultado['atualizados']} atualizados, {resultado['ignorados']} sem mudança")
+    if resultado['rejeitados']:
+        print(f"⚠️  {resultado['rejeitados']} linhas rejeitadas em {arquivo_rejeitados}")
+    return resultado
+
 def preview_csv(nome_arquivo):
     """Mostra preview do CSV antes de importar"""
     print(f"\n📄 Preview do arquivo: {nome_arquivo}\n")
@@ -94,6 +137,10 @@ def preview_csv(nome_arquivo):
             print(f"\n  ... e mais {len(rows) - 3} linhas")
 
 if __name__ == '__main__':
+    upsert = '--upsert' in sys.argv
+    recomecar = '--recomecar' in sys.argv
+    sys.argv = [arg for arg in sys.argv if arg not in ('--upsert', '--recomecar')]
+    
     if len(sys.argv) < 2:
         print("""
 🥗 Importador de Clientes ANDENUTRI
@@ -102,6 +149,8 @@ if __name__ == '__main__':
 Uso:
   python3 importar_clientes.py preview arquivo.csv   # Ver preview
   python3 importar_clientes.py import arquivo.csv     # Importar dados
+  python3 importar_clientes.py import-stream arquivo.csv [tamanho_lote] [--upsert] [--recomecar]
+                                                      # Importar em lotes (arquivos grandes)
 
 Exemplo:
   python3 importar_clientes.py import clientes.csv
@@ -119,6 +168,14 @@ Exemplo:
             importar_csv(arquivo)
         else:
             print("❌ Importação cancelada")
+    elif comando == 'import-stream' and arquivo:
+        tamanho_lote = int(sys.argv[3]) if len(sys.argv) > 3 else TAMANHO_LOTE_PADRAO
+        modo = ' (upsert)' if upsert else ''
+        resposta = input(f"\n⚠️  Deseja importar {arquivo} em lotes de {tamanho_lote}{modo}? (sim/não): ")
+        if resposta.lower() in ['sim', 's', 'yes', 'y']:
+            importar_csv_streaming(arquivo, tamanho_lote, upsert=upsert, recomecar=recomecar)
+        else:
+            print("❌ Importação cancelada")
     else:
-        print("❌ Comando inválido. Use 'preview' ou 'import'")
+        print("❌ Comando inválido. Use 'preview', 'import' ou 'import-stream'")
 
@@ -7,44 +7,98 @@ Importador Avançado - Suporta Excel e CSV
 import sys
 import os
 import csv
+import time
+import multiprocessing
+import queue
 import pandas as pd
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from backend.models import db, Cliente
+from backend.importacao import ArquivoRejeitados, abrir_journal, importar_em_lotes, ler_excel
 from app_dashboard import app
 
+# Colunas aceitas para cada campo, em ordem de preferência
+ALIASES = {
+    'nome': ['nome', 'name', 'cliente'],
+    'email': ['email', 'e-mail'],
+    'telefone': ['telefone', 'fone', 'tel'],
+    'whatsapp': ['whatsapp', 'whats', 'wa'],
+    'status': ['status'],
+    'plano_ativo': ['plano', 'plano_ativo'],
+    'objetivos': ['objetivos', 'objetivo'],
+    'observacoes': ['observações', 'observacoes', 'obs', 'observa'],
+    'data_nascimento': ['data_nascimento', 'nascimento'],
+    'data_vencimento': ['data_vencimento', 'vencimento'],
+}
+
+FORMATOS_DATA = ['%Y-%m-%d', '%d/%m/%Y', '%d/%m/%y']
+STATUS_VALIDOS = ['ativo', 'inativo', 'pausado']
+
 def detectar_formato(arquivo):
     """Detecta formato do arquivo"""
     ext = arquivo.lower().split('.')[-1]
     return ext
 
-def ler_arquivo(arquivo):
-    """Lê arquivo Excel ou CSV"""
+def ler_em_blocos(arquivo, tamanho_bloco=5000, skiprows=0):
+    """Lê o arquivo em DataFrames de até tamanho_bloco linhas
+
+    Excel é lido em fluxo pelo openpyxl (read_only) e CSV com chunksize,
+    então a memória não cresce com o tamanho da planilha. O índice de
+    cada bloco é numero_linha - 2, como no DataFrame do arquivo inteiro.
+    """
+    if detectar_formato(arquivo) == 'csv':
+        for bloco in pd.read_csv(arquivo, encoding='utf-8', skiprows=skiprows, chunksize=tamanho_bloco):
+            yield bloco
+        return
+    
+    numeros, linhas = [], []
+    for numero_linha, row in ler_excel(arquivo, skiprows=skiprows):
+        numeros.append(numero_linha - 2 - skiprows)
+        linhas.append(row)
+        if len(linhas) >= tamanho_bloco:
+            yield pd.DataFrame(linhas, index=numeros)
+            numeros, linhas = [], []
+    if linhas:
+        yield pd.DataFrame(linhas, index=numeros)
+
+def resumir_arquivo(arquivo, tamanho_bloco=5000):
+    """(primeiro bloco, total de linhas, preenchidos por coluna) ou None se não der para ler
+
+    Percorre o arquivo com ler_em_blocos: só um bloco fica em memória.
+    """
+    primeiro = None
+    total = 0
+    preenchidos = Counter()
     try:
-        if detectar_formato(arquivo) == 'csv':
-            return pd.read_csv(arquivo, encoding='utf-8')
-        else:
-            # Tenta abrir o primeiro sheet do Excel
-            return pd.read_excel(arquivo, engine='openpyxl', nrows=None)
+        for bloco in ler_em_blocos(arquivo, tamanho_bloco):
+            if primeiro is None:
+                primeiro = bloco
+            total += len(bloco)
+            preenchidos.update(bloco.notna().sum().to_dict())
     except Exception as e:
         print(f"❌ Erro ao ler arquivo: {e}")
         return None
+    if primeiro is None:
+        primeiro = pd.DataFrame()
+    return primeiro, total, preenchidos
 
-def mostrar_preview(df, arquivo):
-    """Mostra preview do arquivo"""
+def mostrar_preview(resumo, arquivo):
+    """Mostra preview do arquivo (tipos e primeiras linhas vêm do primeiro bloco)"""
+    df, total, preenchidos = resumo
     print(f"\n📄 Arquivo: {arquivo}")
-    print(f"📊 Total de linhas: {len(df)}")
+    print(f"📊 Total de linhas: {total}")
     print(f"📋 Total de colunas: {len(df.columns)}\n")
     
     print("📋 Colunas encontradas:")
     for col in df.columns:
         tipo = df[col].dtype
-        nao_vazios = df[col].notna().sum()
-        print(f"  - {col} ({tipo}) - {nao_vazios} preenchidos")
+        print(f"  - {col} ({tipo}) - {preenchidos[col]} preenchidos")
     
     print("\n📝 Primeiras 3 linhas:\n")
     print(df.head(3).to_string())
     
-    print(f"\n💡 Total de linhas para importar: {len(df)}\n")
+    print(f"\n💡 Total de linhas para importar: {total}\n")
 
 def importar_cliente(row):
     """Importa um cliente da linha do dataframe"""
@@ -126,51 +180,326 @@ def importar_cliente(row):
     
     return cliente
 
-def importar_clientes(arquivo):
-    """Importa clientes do arquivo"""
-    df = ler_arquivo(arquivo)
+def resolver_colunas(df):
+    """Descobre uma única vez, por arquivo, quais colunas atendem cada campo"""
+    por_nome = {}
+    for col in df.columns:
+        por_nome.setdefault(str(col).strip().lower(), col)
+    return {
+        campo: [por_nome[alias] for alias in aliases if alias in por_nome]
+        for campo, aliases in ALIASES.items()
+    }
+
+def _texto(serie):
+    """Coluna como texto sem espaços nas pontas ('' para vazios)"""
+    return serie.astype(object).where(serie.notna(), '').astype(str).str.strip()
+
+def _primeira_preenchida(df, colunas):
+    """Equivale a dados.get(a) or dados.get(b) or ..., coluna a coluna"""
+    resultado = pd.Series('', index=df.index, dtype=object)
+    for col in colunas:
+        resultado = resultado.where(resultado != '', _texto(df[col]))
+    return resultado
+
+def _datas(df, colunas):
+    """Parse vetorizado tentando os formatos aceitos em sequência"""
+    resultado = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    for col in colunas:
+        serie = df[col]
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            convertida = serie.astype('datetime64[ns]')
+        else:
+            texto = _texto(serie).str.split().str[0]
+            convertida = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+            for fmt in FORMATOS_DATA:
+                faltando = convertida.isna()
+                if not faltando.any():
+                    break
+                convertida = convertida.where(
+                    ~faltando, pd.to_datetime(texto, format=fmt, errors='coerce')
+                )
+        resultado = resultado.fillna(convertida)
+    return resultado.dt.date.astype(object).where(resultado.notna(), None)
+
+def normalizar_dataframe(df):
+    """Mapeia o DataFrame inteiro para as colunas do Cliente (sem iterrows)
+
+    Linhas sem nome são descartadas, como no importar_cliente.
+    """
+    colunas = resolver_colunas(df)
+    saida = pd.DataFrame(index=df.index)
     
-    if df is None or len(df) == 0:
-        print("❌ Arquivo vazio ou com erro")
-        return False
+    for campo in ['nome', 'telefone', 'whatsapp', 'plano_ativo', 'objetivos', 'observacoes']:
+        saida[campo] = _primeira_preenchida(df, colunas[campo])
     
-    print(f"\n📥 Iniciando importação de {len(df)} clientes...\n")
+    # Telefones lidos como número pelo Excel viram "11987654321.0"
+    for campo in ['telefone', 'whatsapp']:
+        saida[campo] = saida[campo].str.replace(r'\.0$', '', regex=True).str.replace(r'\s+', ' ', regex=True)
     
-    clientes = []
-    erros = 0
+    # Sem email: gera um a partir do nome e, se houver, do telefone, para
+    # que homônimos com telefones diferentes não colidam no unique
+    email = _primeira_preenchida(df, colunas['email']).str.lower()
+    digitos = saida['telefone'].where(saida['telefone'] != '', saida['whatsapp']).str.replace(r'\D', '', regex=True)
+    email_gerado = (
+        'cliente_' + saida['nome'].str.lower().str.replace(' ', '_', regex=False)
+        + digitos.where(digitos == '', '_' + digitos) + '@sememail.com'
+    )
+    saida['email'] = email.where(email != '', email_gerado)
     
-    for idx, row in df.iterrows():
-        try:
-            cliente = importar_cliente(row)
-            if cliente:
-                clientes.append(cliente)
-        except Exception as e:
-            print(f"⚠️  Erro na linha {idx+2}: {e}")
-            erros += 1
-    
-    if not clientes:
-        print("❌ Nenhum cliente válido para importar")
-        return False
-    
-    # Confirmar
-    print(f"\n✅ {len(clientes)} clientes prontos para importar")
-    if erros > 0:
-        print(f"⚠️  {erros} linhas com erro ignoradas")
-    
-    # Inserir no banco
-    try:
-        with app.app_context():
-            db.session.add_all(clientes)
-            db.session.commit()
-            print(f"\n🎉 {len(clientes)} clientes importados com sucesso!")
-            print(f"📊 Total no banco agora: {Cliente.query.count()} clientes")
+    status = _primeira_preenchida(df, colunas['status']).str.lower()
+    saida['status'] = status.where(status.isin(STATUS_VALIDOS), 'ativo')
+    
+    saida['data_nascimento'] = _datas(df, colunas['data_nascimento'])
+    saida['data_vencimento'] = _datas(df, colunas['data_vencimento'])
+    
+    agora = datetime.utcnow()
+    saida['tempo_acesso_ativo'] = True
+    saida['data_cadastro'] = agora
+    saida['atualizado_em'] = agora
+    
+    return saida[saida['nome'] != '']
+
+def _registros(df_normalizado, skiprows=0):
+    """Gera (linha da planilha, dict) a partir do DataFrame normalizado"""
+    colunas = list(df_normalizado.columns)
+    for idx, valores in zip(df_normalizado.index, df_normalizado.itertuples(index=False, name=None)):
+        yield idx + 2 + skiprows, dict(zip(colunas, valores))
+
+def importar_clientes(arquivo, skiprows=0, upsert=False, recomecar=False):
+    """Importa clientes do arquivo, bloco a bloco
+
+    Com upsert=True reimportar a mesma planilha atualiza os clientes
+    existentes (por email/telefone) em vez de duplicar. Se a importação
+    for interrompida, rodar de novo retoma do último lote gravado.
+    """
+    print(f"\n📥 Iniciando importação de {arquivo}...\n")
+    
+    descartadas = 0
+    
+    def registros(linha_inicial):
+        nonlocal descartadas
+        for bloco in ler_em_blocos(arquivo, skiprows=skiprows):
+            # Bloco inteiro antes do checkpoint: nem normaliza
+            if bloco.index[-1] + 2 + skiprows <= linha_inicial:
+                continue
+            normalizado = normalizar_dataframe(bloco)
+            descartadas += len(bloco) - len(normalizado)
+            yield from _registros(normalizado, skiprows)
+    
+    # Inserir no banco em lotes (commit por lote)
+    arquivo_rejeitados = f"{arquivo}.rejeitados.csv"
+    with app.app_context():
+        journal = abrir_journal(arquivo, recomecar=recomecar)
+        if journal is None:
             return True
+        resultado = importar_em_lotes(
+            registros(journal.linha_inicial), dict,
+            arquivo_rejeitados=arquivo_rejeitados, upsert=upsert, journal=journal
+        )
+        
+        if resultado['inseridos'] + resultado['atualizados'] + resultado['ignorados'] == 0:
+            print("❌ Nenhum cliente válido para importar")
+            return False
+        
+        print(f"\n🎉 {resultado['inseridos']} clientes importados com sucesso!")
+        if upsert:
+            print(f"🔄 {resultado['atualizados']} atualizados, {resultado['ignorados']} sem mudança")
+        if descartadas > 0:
+            print(f"⚠️  {descartadas} linhas sem nome ignoradas")
+        if resultado['rejeitados']:
+            print(f"⚠️  {resultado['rejeitados']} linhas rejeitadas em {arquivo_rejeitados}")
+        print(f"📊 Total no banco agora: {Cliente.query.count()} clientes")
+    return True
+
+# Importação de vários arquivos: os processos do pool leem e normalizam
+# as planilhas e mandam blocos prontos por uma fila limitada para o
+# processo principal, o único que abre sessão no banco.
+
+# Segundos esperando a fila antes de conferir se algum worker morreu
+ESPERA_FILA = 1.0
+
+_fila = None
+_parar = None
+
+def _iniciar_worker(fila, parar):
+    global _fila, _parar
+    _fila = fila
+    _parar = parar
+
+def _parse_arquivo(arquivo, skiprows=0):
+    """Roda no pool: normaliza o arquivo e envia os blocos para a fila"""
+    resumo = {'arquivo': arquivo, 'linhas': 0, 'descartadas': 0, 'erro': None}
+    try:
+        for bloco in ler_em_blocos(arquivo, skiprows=skiprows):
+            # Escritor desistiu: não adianta ler o resto
+            if _parar.is_set():
+                break
+            normalizado = normalizar_dataframe(bloco)
+            resumo['linhas'] += len(bloco)
+            resumo['descartadas'] += len(bloco) - len(normalizado)
+            registros = [
+                (numero_linha, {'arquivo': arquivo, **dados})
+                for numero_linha, dados in _registros(normalizado, skiprows)
+            ]
+            _fila.put((arquivo, registros))
     except Exception as e:
-        db.session.rollback()
-        print(f"\n❌ Erro ao salvar no banco: {e}")
-        return False
+        resumo['erro'] = str(e)
+    finally:
+        # Sempre avisa o escritor, senão ele esperaria para sempre
+        _fila.put((arquivo, None))
+    return resumo
+
+def _interromper_workers(fila, parar, futuros):
+    """Cancela o que não começou e esvazia a fila até os workers saírem
+
+    Um worker preso no put da fila cheia nunca termina sozinho, e mesmo
+    depois da tarefa o processo só sai quando a thread da fila entrega
+    o que ficou no buffer: sem esvaziar, o `with ProcessPoolExecutor`
+    esperaria por ele para sempre.
+    """
+    parar.set()
+    for futuro in futuros:
+        futuro.cancel()
+    while True:
+        try:
+            fila.get(timeout=0.1)
+        except queue.Empty:
+            if all(futuro.done() for futuro in futuros):
+                return
+
+class RejeitadosPorArquivo(ArquivoRejeitados):
+    """Arquivo de rejeitados único, com contagem por arquivo de origem"""
+    
+    def __init__(self, caminho):
+        super().__init__(caminho)
+        self.por_arquivo = Counter()
+    
+    def registrar(self, numero_linha, row, erro):
+        self.por_arquivo[row.get('arquivo')] += 1
+        super().registrar(numero_linha, row, erro)
+
+def _sem_arquivo(row):
+    return {campo: valor for campo, valor in row.items() if campo != 'arquivo'}
+
+def importar_varios(arquivos, processos=None, upsert=False, arquivo_rejeitados='importacao.rejeitados.csv'):
+    """Importa vários arquivos: parse em paralelo, escrita em um só processo
+
+    Arquivos são identificados pelo caminho completo: dois "clientes.xlsx"
+    de pastas diferentes têm contagens separadas.
+    """
+    processos = processos or min(len(arquivos), os.cpu_count() or 1)
+    print(f"\n📥 Importando {len(arquivos)} arquivos com {processos} processos...\n")
+    
+    # Fila limitada: se o banco ficar para trás os workers esperam, e a
+    # memória não cresce com o tamanho dos arquivos
+    fila = multiprocessing.Queue(maxsize=processos * 2)
+    parar = multiprocessing.Event()
+    rejeitados = RejeitadosPorArquivo(arquivo_rejeitados)
+    concluidos = []
+    futuros = []
+    
+    def registros():
+        pendentes = len(arquivos)
+        while pendentes:
+            try:
+                arquivo, bloco = fila.get(timeout=ESPERA_FILA)
+            except queue.Empty:
+                # _parse_arquivo trata os próprios erros: exceção no
+                # futuro é worker morto (pool quebrado), e o aviso de fim
+                # daquele arquivo não vai chegar
+                for futuro in futuros:
+                    if futuro.done() and not futuro.cancelled() and futuro.exception() is not None:
+                        raise RuntimeError(f"Worker do pool falhou: {futuro.exception()!r}")
+                continue
+            if bloco is None:
+                pendentes -= 1
+                concluidos.append(arquivo)
+                print(f"📄 {arquivo} lido ({len(concluidos)}/{len(arquivos)} arquivos)")
+                continue
+            yield from bloco
+    
+    with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_worker, initargs=(fila, parar)) as pool:
+        futuros.extend(pool.submit(_parse_arquivo, arquivo) for arquivo in arquivos)
+        try:
+            with app.app_context():
+                resultado = importar_em_lotes(registros(), _sem_arquivo, upsert=upsert, rejeitados=rejeitados)
+        except BaseException:
+            # Inclui Ctrl+C: libera os workers antes de sair do with
+            _interromper_workers(fila, parar, futuros)
+            raise
+        resumos = [futuro.result() for futuro in futuros]
+    
+    print("\n📊 Resumo por arquivo:")
+    for resumo in resumos:
+        nome = resumo['arquivo']
+        if resumo['erro']:
+            print(f"  ❌ {nome}: erro ao ler ({resumo['erro']})")
+        else:
+            print(f"  ✅ {nome}: {resumo['linhas']} linhas, {resumo['descartadas']} sem nome, "
+                  f"{rejeitados.por_arquivo[nome]} rejeitadas")
+    
+    print(f"\n🎉 {resultado['inseridos']} clientes importados em {resultado['segundos']}s")
+    if upsert:
+        print(f"🔄 {resultado['atualizados']} atualizados, {resultado['ignorados']} sem mudança")
+    if resultado['rejeitados']:
+        print(f"⚠️  {resultado['rejeitados']} linhas rejeitadas em {arquivo_rejeitados}")
+    return resultado, resumos
+
+def gerar_planilha_sintetica(linhas):
+    """Planilha fake no formato das exportações, para benchmark"""
+    idx = pd.Series(range(linhas))
+    emails = 'c' + idx.astype(str) + '@exemplo.com'
+    return pd.DataFrame({
+        'Nome': 'Cliente ' + idx.astype(str),
+        'E-mail': emails.where(idx % 7 != 0, ''),
+        'Fone': '(11) 9' + idx.astype(str).str.zfill(8),
+        'Status': pd.Series(['Ativo', 'INATIVO', 'pausado', 'outro'] * (linhas // 4 + 1))[:linhas].values,
+        'Plano': 'Premium',
+        'Nascimento': pd.Series(['1990-05-17', '17/05/1990', '17/05/90', ''] * (linhas // 4 + 1))[:linhas].values,
+        'Vencimento': '2025-12-31 00:00:00',
+        'Obs': '',
+    })
+
+def benchmark(linhas=100000):
+    """Compara o mapeamento linha a linha (iterrows) com o vetorizado"""
+    df = gerar_planilha_sintetica(linhas)
+    print(f"\n⏱️  Benchmark com {linhas} linhas sintéticas\n")
+    
+    inicio = time.perf_counter()
+    antigos = [importar_cliente(row) for _, row in df.iterrows()]
+    antes = time.perf_counter() - inicio
+    print(f"  iterrows + importar_cliente: {antes:.2f}s ({linhas / antes:.0f} linhas/s)")
+    
+    inicio = time.perf_counter()
+    novos = normalizar_dataframe(df)
+    depois = time.perf_counter() - inicio
+    print(f"  normalizar_dataframe:        {depois:.2f}s ({linhas / depois:.0f} linhas/s)")
+    
+    print(f"\n🚀 {antes / depois:.1f}x mais rápido ({len(antigos)} / {len(novos)} clientes)")
 
 if __name__ == '__main__':
+    upsert = '--upsert' in sys.argv
+    recomecar = '--recomecar' in sys.argv
+    sys.argv = [arg for arg in sys.argv if arg not in ('--upsert', '--recomecar')]
+    
+    if len(sys.argv) >= 2 and sys.argv[1] == 'benchmark':
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100000)
+        sys.exit(0)
+    
+    if len(sys.argv) >= 3 and sys.argv[1] == 'import-lote':
+        argumentos = sys.argv[2:]
+        processos = None
+        if '--processos' in argumentos:
+            posicao = argumentos.index('--processos')
+            processos = int(argumentos[posicao + 1])
+            del argumentos[posicao:posicao + 2]
+        faltando = [arquivo for arquivo in argumentos if not os.path.exists(arquivo)]
+        if faltando:
+            print(f"❌ Arquivos não encontrados: {', '.join(faltando)}")
+            sys.exit(1)
+        importar_varios(argumentos, processos=processos, upsert=upsert)
+        sys.exit(0)
+    
     if len(sys.argv) < 3:
         print("""
 🥗 Importador Avançado de Clientes ANDENUTRI
@@ -178,7 +507,9 @@ if __name__ == '__main__':
 
 Uso:
   python3 importar_clientes_avancado.py preview arquivo.xlsx
-  python3 importar_clientes_avancado.py import arquivo.xlsx
+  python3 importar_clientes_avancado.py import arquivo.xlsx [--upsert] [--recomecar]
+  python3 importar_clientes_avancado.py import-lote a.xlsx b.xlsx ... [--processos N] [--upsert]
+  python3 importar_clientes_avancado.py benchmark [linhas]
 
 Formato suportado:
   - Excel (.xlsx, .xls)
@@ -194,16 +525,18 @@ Formato suportado:
         sys.exit(1)
     
     if comando == 'preview':
-        df = ler_arquivo(arquivo)
-        if df is not None:
-            mostrar_preview(df, arquivo)
+        resumo = resumir_arquivo(arquivo)
+        if resumo is not None:
+            mostrar_preview(resumo, arquivo)
     elif comando == 'import':
-        df = ler_arquivo(arquivo)
+        # Preview só do primeiro bloco: o arquivo inteiro pode não caber na memória
+        df = next(ler_em_blocos(arquivo, tamanho_bloco=5), None)
         if df is not None:
-            mostrar_preview(df, arquivo)
-            resposta = input(f"\n⚠️  Deseja importar {len(df)} linhas? (sim/não): ")
+            print(f"\n📄 Arquivo: {arquivo}\n")
+            print(df.to_string())
+            resposta = input(f"\n⚠️  Deseja importar {arquivo}? (sim/não): ")
             if resposta.lower() in ['sim', 's', 'yes', 'y', 'ok']:
-                importar_clientes(arquivo)
+                importar_clientes(arquivo, upsert=upsert, recomecar=recomecar)
             else:
                 print("❌ Importação cancelada")
     else:
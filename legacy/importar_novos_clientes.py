@@ -4,104 +4,116 @@
 Importa Novos Clientes do Excel
 """
 
-import pandas as pd
 import os
+import re
+import sys
 from datetime import datetime
 from backend.models import db, Cliente
+from backend.importacao import LinhaRejeitada, TAMANHO_LOTE_PADRAO, abrir_journal, importar_em_lotes, ler_excel
+from backend.similaridade import normalizar_nome
 from app_dashboard import app
 
-def importar_clientes():
-    arquivo = os.path.expanduser('~/Downloads/43501792C_Novos Clientes Premium_20250219114701.xlsx')
-    
-    print("📥 Lendo arquivo Excel...")
-    df = pd.read_excel(arquivo, skiprows=8)
+ARQUIVO_PADRAO = '~/Downloads/43501792C_Novos Clientes Premium_20250219114701.xlsx'
+LINHAS_ANTES_CABECALHO = 8
+
+def ler_planilha(arquivo):
+    """Gera (numero_linha, row) da exportação em fluxo (openpyxl read_only)"""
+    return ler_excel(arquivo, skiprows=LINHAS_ANTES_CABECALHO)
+
+def _texto(valor):
+    return '' if valor is None else str(valor).strip()
+
+def email_temporario(nome, id_consultor):
+    """Email para quem não tem: do ID Herbalife ou, sem ele, do nome
+
+    Nunca da posição da linha, que em outra exportação é de outra pessoa.
+    """
+    if id_consultor:
+        return "herbalife_" + re.sub(r'\W+', '', id_consultor.lower()) + "@importado.com"
+    return "cliente_" + normalizar_nome(nome).replace(' ', '_') + "@importado.com"
+
+def mapear_cliente(row):
+    """Converte uma linha da exportação Herbalife no dict do Cliente"""
+    nome = _texto(row.get('Nome'))
+    if not nome or nome == 'nan':
+        raise LinhaRejeitada('Nome vazio')
     
-    print(f"✅ {len(df)} clientes encontrados")
-    print(f"📋 Colunas: {list(df.columns[:10])}")
+    status_str = _texto(row.get('Status')) or 'PB15'
+    # Mapear status para ativo/inativo
+    if 'PB15' in status_str or 'PG35' in status_str or 'PS25' in status_str:
+        status = 'ativo'
+    elif 'BPM' in status_str:
+        status = 'inativo'
+    else:
+        status = 'ativo'
     
-    # Importar clientes
-    clientes_importados = []
-    erros = 0
+    id_consultor = _texto(row.get('ID do Consultor'))
+    dados = {
+        'nome': nome,
+        'email': email_temporario(nome, id_consultor),
+        'telefone': '',
+        'whatsapp': '',
+        'status': status,
+        'plano_ativo': 'Premium',
+        'objetivos': f"Status: {status_str}",
+        'observacoes': f"ID Consultor: {id_consultor}",
+        'tempo_acesso_ativo': True,
+    }
     
-    for idx, row in df.iterrows():
+    # Data de cadastro se disponível
+    data_cad = row.get('Data de Cadastro do CI')
+    if isinstance(data_cad, datetime):
+        dados['data_cadastro'] = data_cad
+    elif data_cad:
         try:
-            nome = str(row.get('Nome', '')).strip()
-            if not nome or nome == 'nan' or nome == '':
-                continue
-            
-            status_str = str(row.get('Status', 'PB15')).strip()
-            # Mapear status para ativo/inativo
-            if 'PB15' in status_str or 'PG35' in status_str or 'PS25' in status_str:
-                status = 'ativo'
-            elif 'BPM' in status_str:
-                status = 'inativo'
-            else:
-                status = 'ativo'
-            
-            # Criar cliente
-            cliente = Cliente(
-                nome=nome,
-                email=f"cliente_{idx}@importado.com",  # Email temporário
-                telefone='',
-                whatsapp='',
-                status=status,
-                plano_ativo='Premium',
-                objetivos=f"Status: {status_str}",
-                observacoes=f"ID Consultor: {row.get('ID do Consultor', '')}",
-                tempo_acesso_ativo=True,
-                data_cadastro=datetime.utcnow(),
-                atualizado_em=datetime.utcnow()
-            )
-            
-            # Data de cadastro se disponível
-            try:
-                data_cad = row.get('Data de Cadastro do CI')
-                if pd.notna(data_cad):
-                    if isinstance(data_cad, str):
-                        cliente.data_cadastro = datetime.strptime(data_cad, '%d/%m/%Y')
-                    else:
-                        cliente.data_cadastro = data_cad
-            except:
-                pass
-            
-            clientes_importados.append(cliente)
-            
-            if (idx + 1) % 100 == 0:
-                print(f"  ✓ {idx + 1} clientes processados...")
-                
-        except Exception as e:
-            erros += 1
-            if erros < 5:
-                print(f"  ⚠️ Erro na linha {idx+2}: {e}")
+            dados['data_cadastro'] = datetime.strptime(str(data_cad).strip(), '%d/%m/%Y')
+        except ValueError:
+            pass
     
-    print(f"\n✅ {len(clientes_importados)} clientes prontos para importar")
-    
-    if not clientes_importados:
-        print("❌ Nenhum cliente válido")
-        return False
+    return dados
+
+def importar_clientes(arquivo=ARQUIVO_PADRAO, tamanho_lote=TAMANHO_LOTE_PADRAO, upsert=False, recomecar=False):
+    arquivo = os.path.expanduser(arquivo)
     
     # Confirmar
-    resposta = input(f"\n⚠️  Deseja importar {len(clientes_importados)} clientes? (sim/não): ")
+    resposta = input(f"\n⚠️  Deseja importar {os.path.basename(arquivo)}? (sim/não): ")
     if resposta.lower() not in ['sim', 's', 'yes', 'y']:
         print("❌ Importação cancelada")
         return False
     
-    # Salvar no banco
-    try:
-        with app.app_context():
-            db.session.add_all(clientes_importados)
-            db.session.commit()
-            
-            total = Cliente.query.count()
-            print(f"\n🎉 {len(clientes_importados)} clientes importados com sucesso!")
-            print(f"📊 Total no banco: {total} clientes")
-            
+    print("📥 Lendo arquivo Excel em fluxo...")
+    
+    # Salvar no banco em lotes, sem carregar a planilha inteira
+    arquivo_rejeitados = f"{arquivo}.rejeitados.csv"
+    with app.app_context():
+        # Retoma do último lote gravado se a importação foi interrompida
+        journal = abrir_journal(arquivo, recomecar=recomecar)
+        if journal is None:
             return True
-    except Exception as e:
-        db.session.rollback()
-        print(f"❌ Erro ao salvar: {e}")
-        return False
+        resultado = importar_em_lotes(
+            ler_planilha(arquivo),
+            mapear_cliente,
+            tamanho_lote=tamanho_lote,
+            arquivo_rejeitados=arquivo_rejeitados,
+            upsert=upsert,
+            journal=journal
+        )
+        
+        if resultado['inseridos'] + resultado['atualizados'] + resultado['ignorados'] == 0:
+            print("❌ Nenhum cliente válido")
+            return False
+        
+        total = Cliente.query.count()
+        print(f"\n🎉 {resultado['inseridos']} clientes importados com sucesso!")
+        if upsert:
+            print(f"🔄 {resultado['atualizados']} atualizados, {resultado['ignorados']} sem mudança")
+        if resultado['rejeitados']:
+            print(f"⚠️  {resultado['rejeitados']} linhas rejeitadas em {arquivo_rejeitados}")
+        print(f"📊 Total no banco: {total} clientes")
+        
+        return True
 
 if __name__ == '__main__':
-    importar_clientes()
-
+    # Uso: python3 importar_novos_clientes.py [arquivo.xlsx] [--upsert] [--recomecar]
+    argumentos = [arg for arg in sys.argv[1:] if arg not in ('--upsert', '--recomecar')]
+    importar_clientes(*argumentos[:1], upsert='--upsert' in sys.argv, recomecar='--recomecar' in sys.argv)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Fixtures dos testes
+
+Cada teste recebe uma aplicação nova (config 'testing', SQLite em
+memória) com as migrações aplicadas.
+"""
+
+import itertools
+import pytest
+from sqlalchemy import event
+from backend import create_app
+from backend.agenda import indice_agenda
+from backend.models import db, Cliente
+from backend.similaridade import indice_similaridade
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        # Os índices em memória são do processo: recarregam no banco novo
+        indice_agenda.carregado = False
+        indice_similaridade.carregado = False
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def criar_clientes(app):
+    """criar_clientes(n, **campos) -> lista de Cliente já gravados"""
+    numeros = itertools.count()
+
+    def criar(quantidade, **campos):
+        clientes = []
+        for _ in range(quantidade):
+            i = next(numeros)
+            clientes.append(Cliente(nome=f'Cliente {i}', email=f'cliente{i}@exemplo.com', **campos))
+        db.session.add_all(clientes)
+        db.session.commit()
+        return clientes
+    return criar
+
+
+@pytest.fixture
+def contar_comandos(app):
+    """Contexto que conta os comandos SQL executados (before_cursor_execute)"""
+    class Contador:
+        def __init__(self):
+            self.total = 0
+
+        def _contar(self, *args):
+            self.total += 1
+
+        def __enter__(self):
+            event.listen(db.engine, 'before_cursor_execute', self._contar)
+            return self
+
+        def __exit__(self, *exc):
+            event.remove(db.engine, 'before_cursor_execute', self._contar)
+    return Contador
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes da agenda de consultas
+"""
+
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import insert
+from backend import assinatura, recorrencia
+from backend.models import db, Consulta, SerieConsulta
+from backend.recorrencia import datas_serie
+from backend.routes import criar_consulta, criar_serie
+
+
+def _consulta(cliente_id, data_hora, **campos):
+    return {'cliente_id': cliente_id, 'data_hora': data_hora, 'profissional': 'Deise', **campos}
+
+
+def test_horario_ocupado_devolve_409(client, criar_clientes):
+    a, b = criar_clientes(2)
+    assert client.post('/api/consultas', json=_consulta(a.id, '2030-01-07T10:00')).status_code == 201
+
+    resposta = client.post('/api/consultas', json=_consulta(b.id, '2030-01-07T10:30'))
+    assert resposta.status_code == 409
+    assert [conflito['cliente_id'] for conflito in resposta.get_json()['conflitos']] == [a.id]
+
+    outro_profissional = _consulta(b.id, '2030-01-07T10:30', profissional='Ana')
+    assert client.post('/api/consultas', json=outro_profissional).status_code == 201
+
+
+@pytest.mark.parametrize('view,corpo', [
+    (criar_consulta, {'data_hora': '2030-01-07T10:00', 'duracao': 9999}),
+    (criar_serie, {'inicio': '2030-01-07T10:00', 'intervalo': 'x'}),
+])
+def test_erro_antes_de_salvar_desfaz_a_sessao(app, criar_clientes, view, corpo):
+    """Erro no preenchimento (antes de salvar_*) não deixa a transação aberta"""
+    cliente, = criar_clientes(1)
+    with app.test_request_context(json={'cliente_id': cliente.id, **corpo}):
+        resposta, status = view()
+    assert status == 400
+    assert not db.session().in_transaction()
+
+
+def test_consulta_de_outro_processo_depois_de_um_commit_local(client, criar_clientes, monkeypatch):
+    """O commit local não faz o índice adotar a assinatura sem recarregar"""
+    a, b = criar_clientes(2)
+    consulta = {'data_hora': '2030-01-07T14:00', 'profissional': 'Deise'}
+    assert client.get('/api/consultas/disponibilidade', query_string=consulta).get_json()['livre']
+    assert client.post('/api/consultas', json=_consulta(a.id, '2030-01-07T10:00')).status_code == 201
+
+    # Fora do ORM: nenhum evento chega ao índice
+    db.session.execute(insert(Consulta).values(
+        cliente_id=b.id, data_hora=datetime(2030, 1, 7, 14), duracao=60, profissional='Deise'
+    ))
+    db.session.commit()
+
+    monkeypatch.setattr(assinatura, 'INTERVALO_VERIFICACAO', 0)
+    assert not client.get('/api/consultas/disponibilidade', query_string=consulta).get_json()['livre']
+
+
+# Séries recorrentes --------------------------------------------------
+
+def _serie(cliente_id, inicio='2030-01-07T10:00', **campos):
+    return {'cliente_id': cliente_id, 'inicio': inicio, 'profissional': 'Deise', 'frequencia': 'semanal', **campos}
+
+
+def _horarios(client, caminho, desde='2030-01-01T00:00', ate='2030-03-01T00:00'):
+    resposta = client.get(caminho, query_string={'desde': desde, 'ate': ate})
+    assert resposta.status_code == 200
+    return [(item['data_hora'], item['duracao']) for item in resposta.get_json()]
+
+
+def test_mensal_no_fim_do_mes_volta_ao_dia_original(app):
+    serie = SerieConsulta(inicio=datetime(2030, 1, 31, 9), frequencia='mensal', intervalo=1)
+    datas = list(datas_serie(serie, datetime(2030, 1, 1), datetime(2030, 6, 1)))
+    assert [data.date().isoformat() for data in datas] == [
+        '2030-01-31', '2030-02-28', '2030-03-31', '2030-04-30', '2030-05-31'
+    ]
+
+
+@pytest.mark.parametrize('frequencia,intervalo', [('diaria', 1), ('semanal', 2), ('mensal', 1), ('mensal', 5)])
+def test_primeira_ocorrencia_da_janela_sem_percorrer_as_anteriores(app, monkeypatch, frequencia, intervalo):
+    serie = SerieConsulta(inicio=datetime(2030, 1, 31, 9), frequencia=frequencia, intervalo=intervalo)
+    desde = datetime(2045, 6, 15)
+    # Referência: percorre a regra desde o início
+    indice = 0
+    while recorrencia.data_ocorrencia(serie, indice) < desde:
+        indice += 1
+    esperada = recorrencia.data_ocorrencia(serie, indice)
+
+    chamadas = []
+    original = recorrencia.data_ocorrencia
+
+    def contar(*args):
+        chamadas.append(args)
+        return original(*args)
+
+    monkeypatch.setattr(recorrencia, 'data_ocorrencia', contar)
+    assert next(datas_serie(serie, desde, desde + timedelta(days=400))) == esperada
+    assert len(chamadas) <= 4
+
+
+def test_excecoes_cancelam_e_remarcam_ocorrencias(client, criar_clientes):
+    cliente, = criar_clientes(1)
+    serie = client.post('/api/series', json=_serie(cliente.id, ocorrencias=4)).get_json()['id']
+
+    cancelar = {'data_original': '2030-01-14T10:00', 'status': 'cancelada'}
+    remarcar = {'data_original': '2030-01-21T10:00', 'data_hora': '2030-01-23T15:00'}
+    assert client.post(f'/api/series/{serie}/excecoes', json=cancelar).status_code == 200
+    assert client.post(f'/api/series/{serie}/excecoes', json=remarcar).status_code == 200
+
+    assert _horarios(client, f'/api/series/{serie}/ocorrencias') == [
+        ('2030-01-07 10:00:00', 60), ('2030-01-23 15:00:00', 60), ('2030-01-28 10:00:00', 60)
+    ]
+    # A remarcada aparece pela data nova, mesmo com a original fora da janela
+    assert _horarios(client, '/api/agenda', '2030-01-22T00:00', '2030-01-24T00:00') == [('2030-01-23 15:00:00', 60)]
+    livre = {'data_hora': '2030-01-14T10:00', 'profissional': 'Deise'}
+    assert client.get('/api/consultas/disponibilidade', query_string=livre).get_json()['livre']
+
+
+def test_alterar_a_partir_de_uma_ocorrencia_divide_a_serie(client, criar_clientes):
+    cliente, = criar_clientes(1)
+    serie = client.post('/api/series', json=_serie(cliente.id, ocorrencias=4)).get_json()['id']
+    remarcar = {'data_original': '2030-01-28T10:00', 'data_hora': '2030-01-29T10:00'}
+    assert client.post(f'/api/series/{serie}/excecoes', json=remarcar).status_code == 200
+
+    resposta = client.put(f'/api/series/{serie}', json={'a_partir_de': '2030-01-21T10:00', 'duracao': 30})
+    assert resposta.status_code == 200
+    nova = resposta.get_json()
+    assert (nova['inicio'], nova['ocorrencias'], nova['duracao']) == ('2030-01-21 10:00:00', 2, 30)
+
+    assert _horarios(client, f'/api/series/{serie}/ocorrencias') == [
+        ('2030-01-07 10:00:00', 60), ('2030-01-14 10:00:00', 60)
+    ]
+    # A exceção de 28/01 passou para a nova série
+    assert _horarios(client, f"/api/series/{nova['id']}/ocorrencias") == [
+        ('2030-01-21 10:00:00', 30), ('2030-01-29 10:00:00', 30)
+    ]
+
+    primeira = client.put(f'/api/series/{serie}', json={'a_partir_de': '2030-01-07T10:00', 'duracao': 30})
+    assert primeira.status_code == 400
+
+
+def test_conflito_entre_serie_e_consulta_avulsa(client, criar_clientes):
+    a, b = criar_clientes(2)
+    assert client.post('/api/consultas', json=_consulta(a.id, '2030-01-21T10:30')).status_code == 201
+
+    resposta = client.post('/api/series', json=_serie(b.id, ocorrencias=4))
+    assert resposta.status_code == 409
+    assert [conflito['data_hora'] for conflito in resposta.get_json()['conflitos']] == ['2030-01-21 10:30:00']
+
+    assert client.post('/api/series', json=_serie(b.id, inicio='2030-01-07T14:00', ocorrencias=4)).status_code == 201
+    resposta = client.post('/api/consultas', json=_consulta(a.id, '2030-01-14T14:30'))
+    assert resposta.status_code == 409
+    assert [conflito['origem'] for conflito in resposta.get_json()['conflitos']] == ['serie']
+    # Fora das ocorrências (terça) o horário está livre
+    assert client.post('/api/consultas', json=_consulta(a.id, '2030-01-15T14:30')).status_code == 201
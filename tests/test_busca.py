@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes da busca de clientes
+"""
+
+from backend.models import db, Cliente, ClienteEtiqueta, Etiqueta
+
+
+def _etiquetar(clientes, etiqueta_ids):
+    for cliente in clientes:
+        for etiqueta_id in etiqueta_ids:
+            db.session.add(ClienteEtiqueta(cliente_id=cliente.id, etiqueta_id=etiqueta_id))
+    db.session.commit()
+
+
+def _comandos_da_busca(client, contar_comandos, esperados):
+    # Nada em cache na sessão: cada relacionamento precisa ir ao banco
+    db.session.expunge_all()
+    with contar_comandos() as contador:
+        resposta = client.get('/api/buscar?q=cliente')
+    assert resposta.status_code == 200
+    clientes = resposta.get_json()
+    assert len(clientes) == esperados
+    assert all(len(cliente['etiquetas']) == 2 for cliente in clientes)
+    return contador.total
+
+
+def test_buscar_sem_n_mais_1(client, criar_clientes, contar_comandos):
+    """O número de comandos não cresce com os clientes encontrados"""
+    etiquetas = [Etiqueta(nome='Ativo', cor='#90EE90'), Etiqueta(nome='Em Desafio', cor='#FF6B6B')]
+    db.session.add_all(etiquetas)
+    db.session.commit()
+    etiqueta_ids = [etiqueta.id for etiqueta in etiquetas]
+
+    _etiquetar(criar_clientes(1), etiqueta_ids)
+    com_um = _comandos_da_busca(client, contar_comandos, 1)
+
+    _etiquetar(criar_clientes(49), etiqueta_ids)
+    com_cinquenta = _comandos_da_busca(client, contar_comandos, 50)
+
+    assert com_um == com_cinquenta
+
+
+def _nomes(client, busca, **parametros):
+    resposta = client.get('/api/buscar', query_string={'q': busca, **parametros})
+    assert resposta.status_code == 200
+    return [cliente['nome'] for cliente in resposta.get_json()]
+
+
+def test_trechos_de_telefone_e_email(client):
+    db.session.add_all([
+        Cliente(nome='Maria da Silva', email='mariasilva@exemplo.com', telefone='(11) 98765-4321'),
+        Cliente(nome='João Souza', email='joao@outro.com', telefone='(21) 91234-5678'),
+    ])
+    db.session.commit()
+
+    # Índice: prefixo de palavra, sem acento
+    assert _nomes(client, 'joa') == ['João Souza']
+    assert _nomes(client, 'mar sil') == ['Maria da Silva']
+    # Trechos do meio: só telefone (dígitos) e email (com @)
+    assert _nomes(client, '87654') == ['Maria da Silva']
+    assert _nomes(client, '98765-43') == ['Maria da Silva']
+    assert _nomes(client, 'silva@') == ['Maria da Silva']
+    assert _nomes(client, 'ilva') == []
+
+
+def test_trecho_respeita_o_limite(client, criar_clientes):
+    criar_clientes(5, telefone='(11) 98765-4321')
+    assert len(_nomes(client, '8765', limit=3)) == 3
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes das métricas derivadas das avaliações
+"""
+
+from datetime import datetime
+from sqlalchemy import insert
+from backend.derivadas import COLUNAS_DERIVADAS, preencher_derivadas
+from backend.models import db, Avaliacao
+
+
+def _avaliar(client, cliente_id, data, **medidas):
+    resposta = client.post(f'/api/clientes/{cliente_id}/avaliacoes', json={'data_avaliacao': data, **medidas})
+    assert resposta.status_code == 201, resposta.get_json()
+    return resposta.get_json()['id']
+
+
+def _historico(client, cliente_id, *colunas):
+    avaliacoes = client.get(f'/api/clientes/{cliente_id}/avaliacoes').get_json()
+    return [tuple(avaliacao[coluna] for coluna in colunas) for avaliacao in avaliacoes]
+
+
+def test_avaliacao_anterior_refaz_os_deltas_seguintes(client, criar_clientes):
+    cliente, outro = criar_clientes(2)
+    _avaliar(client, cliente.id, '2030-02-01', peso=80, altura=170, cintura=90, quadril=100)
+    _avaliar(client, cliente.id, '2030-03-01', peso=78, altura=1.70, cintura=88, quadril=100)
+    _avaliar(client, outro.id, '2030-01-15', peso=60, altura=160)
+    assert _historico(client, cliente.id, 'imc', 'rcq', 'delta_peso', 'delta_cintura') == [
+        (27.68, 0.9, None, None),
+        (26.99, 0.88, -2.0, -2.0),
+    ]
+
+    # Inserida antes das outras: a de fevereiro passa a ter delta
+    anterior = _avaliar(client, cliente.id, '2030-01-01', peso=85, cintura=95)
+    assert _historico(client, cliente.id, 'delta_peso', 'delta_imc', 'delta_cintura') == [
+        (None, None, None),
+        (-5.0, None, -5.0),
+        (-2.0, -0.69, -2.0),
+    ]
+
+    assert client.put(f'/api/avaliacoes/{anterior}', json={'peso': 82}).status_code == 200
+    assert _historico(client, cliente.id, 'delta_peso') == [(None,), (-2.0,), (-2.0,)]
+
+    db.session.delete(db.session.get(Avaliacao, anterior))
+    db.session.commit()
+    assert _historico(client, cliente.id, 'delta_peso') == [(None,), (-2.0,)]
+    # O histórico do outro cliente não muda
+    assert _historico(client, outro.id, 'imc', 'delta_peso') == [(23.44, None)]
+
+
+def test_preencher_derivadas_de_avaliacoes_antigas(app, criar_clientes):
+    """Linhas gravadas sem o ORM (antes das colunas existirem) são preenchidas em lotes"""
+    clientes = criar_clientes(3)
+    db.session.execute(insert(Avaliacao), [
+        {'cliente_id': cliente.id, 'data_avaliacao': datetime(2030, mes, 1), 'peso': 70 + mes, 'altura': 1.75,
+         'cintura': 80, 'quadril': 100}
+        for cliente in clientes for mes in (2, 1)
+    ])
+    db.session.commit()
+    assert db.session.query(Avaliacao).filter(Avaliacao.imc.isnot(None)).count() == 0
+
+    assert preencher_derivadas(tamanho_lote=2) == 6
+    db.session.expire_all()
+    for cliente in clientes:
+        janeiro, fevereiro = Avaliacao.query.filter_by(cliente_id=cliente.id).order_by(Avaliacao.data_avaliacao)
+        assert (janeiro.imc, janeiro.rcq, janeiro.delta_peso) == (23.18, 0.8, None)
+        assert (fevereiro.imc, fevereiro.delta_peso, fevereiro.delta_imc) == (23.51, 1.0, 0.33)
+
+    # Nada muda numa segunda passada
+    antes = [tuple(getattr(a, coluna) for coluna in COLUNAS_DERIVADAS) for a in Avaliacao.query.order_by(Avaliacao.id)]
+    assert preencher_derivadas(tamanho_lote=2) == 0
+    depois = [tuple(getattr(a, coluna) for coluna in COLUNAS_DERIVADAS) for a in Avaliacao.query.order_by(Avaliacao.id)]
+    assert depois == antes
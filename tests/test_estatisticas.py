@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes dos contadores materializados do dashboard
+"""
+
+from collections import Counter
+from sqlalchemy import event
+from backend.estatisticas import ajustar_contadores, estatisticas_dashboard
+from backend.models import db, Cliente, ContadorClientes
+
+
+def _confere_com_group_by():
+    materializadas = estatisticas_dashboard(True)
+    calculadas = estatisticas_dashboard(False)
+    del materializadas['materializadas'], calculadas['materializadas']
+    assert materializadas == calculadas
+
+
+def test_contadores_acompanham_as_escritas(criar_clientes):
+    clientes = criar_clientes(5, status='ativo')
+    criar_clientes(2, status='pausado', compra_herbalife='sim')
+    _confere_com_group_by()
+
+    clientes[0].status = 'cancelado'
+    clientes[1].status = 'pausado'
+    db.session.delete(clientes[2])
+    db.session.commit()
+    _confere_com_group_by()
+    assert estatisticas_dashboard()['status'] == {'ativo': 2, 'pausado': 3, 'cancelado': 1}
+
+
+def test_rollback_descarta_ajustes(criar_clientes):
+    criar_clientes(1, status='ativo')
+    db.session.add(Cliente(nome='Novo', email='novo@exemplo.com', status='pausado'))
+    db.session.flush()
+    db.session.rollback()
+    _confere_com_group_by()
+
+
+def test_upsert_cria_e_soma_o_mesmo_contador(app):
+    conexao = db.session.connection()
+    ajustar_contadores(conexao, Counter({('status', 'novo'): 1}))
+    ajustar_contadores(conexao, Counter({('status', 'novo'): 2, ('status', 'outro'): 0}))
+    assert db.session.get(ContadorClientes, ('status', 'novo')).total == 3
+    assert db.session.get(ContadorClientes, ('status', 'outro')) is None
+
+
+def test_um_comando_de_contadores_por_flush(app):
+    comandos = []
+
+    def registrar(conn, cursor, statement, *args):
+        if 'contadores_clientes' in statement:
+            comandos.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        db.session.add_all(
+            Cliente(nome=f'Cliente {i}', email=f'c{i}@exemplo.com', status=('ativo', 'inativo')[i % 2])
+            for i in range(20)
+        )
+        db.session.commit()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+
+    assert len(comandos) == 1
+    _confere_com_group_by()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes do GET condicional
+"""
+
+import importlib
+import sys
+import pytest
+from backend.etags import condicional, etag_cliente
+from backend.models import db
+
+
+def _confere_etag(client, url):
+    resposta = client.get(url)
+    assert resposta.status_code == 200
+    etag = resposta.headers['ETag']
+    assert etag.startswith('W/')
+
+    resposta = client.get(url, headers={'If-None-Match': etag})
+    assert resposta.status_code == 304
+    assert resposta.data == b''
+    assert resposta.headers['ETag'] == etag
+
+
+def test_cliente_no_backend(client, criar_clientes):
+    cliente, = criar_clientes(1)
+    _confere_etag(client, f'/api/clientes/{cliente.id}')
+    assert client.get('/api/clientes/999').status_code == 404
+
+
+def test_parametro_da_view_com_outro_nome(app, criar_clientes):
+    """A ETag não depende do nome do parâmetro na view"""
+    cliente, = criar_clientes(1)
+
+    @app.route('/teste/clientes/<int:cliente_id>')
+    @condicional(etag_cliente)
+    def obter(cliente_id):
+        return {'id': cliente_id}
+
+    _confere_etag(app.test_client(), f'/teste/clientes/{cliente.id}')
+
+
+def test_cliente_no_dashboard(tmp_path, monkeypatch):
+    pytest.importorskip('dotenv')
+    pytest.importorskip('supabase')
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "dashboard.db"}')
+    monkeypatch.chdir(tmp_path)
+    sys.modules.pop('legacy.app_dashboard', None)
+    dashboard = importlib.import_module('legacy.app_dashboard')
+
+    with dashboard.app.app_context():
+        resposta = dashboard.app.test_client().post('/api/clientes', json={
+            'nome': 'Cliente', 'email': 'cliente@exemplo.com'
+        })
+        assert resposta.status_code == 201
+        _confere_etag(dashboard.app.test_client(), f"/api/clientes/{resposta.get_json()['id']}")
+        db.session.remove()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes da importação retomável
+"""
+
+import csv
+import pytest
+from backend.importacao import JournalImportacao, LinhaRejeitada, abrir_journal, importar_em_lotes
+from backend.models import db, Cliente
+
+
+class Interrompida(Exception):
+    """Simula a importação morrendo no meio (OOM, Ctrl+C...)"""
+
+
+def _linhas():
+    # Linhas 3 e 9 sem email (rejeitadas no mapeamento)
+    for numero_linha in range(2, 12):
+        email = '' if numero_linha in (3, 9) else f'c{numero_linha}@exemplo.com'
+        yield numero_linha, {'nome': f'Cliente {numero_linha}', 'email': email}
+
+
+def _mapear(interromper_em=None):
+    def mapear(row):
+        numero_linha = int(row['nome'].split()[-1])
+        if numero_linha == interromper_em:
+            raise Interrompida()
+        if not row['email']:
+            raise LinhaRejeitada('email obrigatório')
+        return dict(row)
+    return mapear
+
+
+def _importar(arquivo, rejeitados, mapear):
+    journal = abrir_journal(str(arquivo))
+    return journal, importar_em_lotes(
+        _linhas(), mapear, tamanho_lote=3, arquivo_rejeitados=str(rejeitados),
+        mostrar_progresso=False, journal=journal
+    )
+
+
+def test_retomar_nao_duplica_rejeitados(app, tmp_path):
+    arquivo = tmp_path / 'clientes.csv'
+    arquivo.write_text('planilha de teste')
+    rejeitados = tmp_path / 'clientes.csv.rejeitados.csv'
+
+    # Lotes [2, 4, 5] e [6, 7, 8] gravados; 9 rejeitado depois do
+    # último checkpoint e a importação morre na linha 10
+    with pytest.raises(Interrompida):
+        _importar(arquivo, rejeitados, _mapear(interromper_em=10))
+
+    journal, resultado = _importar(arquivo, rejeitados, _mapear())
+
+    assert journal.linha_inicial == 8
+    with open(rejeitados, encoding='utf-8', newline='') as f:
+        assert [int(linha['linha']) for linha in csv.DictReader(f)] == [3, 9]
+    assert journal.registro.rejeitados == 2
+    assert journal.registro.status == 'concluida'
+    assert Cliente.query.count() == 8
+
+
+def _exportacao(*clientes):
+    """Linhas sem email, como na exportação Herbalife; _idx é a posição na planilha"""
+    return [(idx + 10, {'_idx': idx, 'nome': nome, 'id': id}) for idx, (nome, id) in enumerate(clientes)]
+
+
+def _upsert(linhas, mapear):
+    return importar_em_lotes(iter(linhas), mapear, upsert=True, mostrar_progresso=False)
+
+
+def test_upsert_nao_casa_email_temporario_de_outra_pessoa(app):
+    """cliente_<posição>@importado.com de outra exportação não sobrescreve ninguém"""
+    def por_posicao(row):
+        return {'nome': row['nome'], 'email': f"cliente_{row['_idx']}@importado.com"}
+
+    _upsert(_exportacao(('Ana', 'A1'), ('Bia', 'B2')), por_posicao)
+    resultado = _upsert(_exportacao(('Carla', 'C3'), ('Duda', 'D4')), por_posicao)
+
+    assert resultado['atualizados'] == 0
+    assert sorted(nome for (nome,) in db.session.query(Cliente.nome)) == ['Ana', 'Bia']
+
+
+def test_upsert_com_email_temporario_estavel(app):
+    def por_id(row):
+        return {'nome': row['nome'], 'email': f"herbalife_{row['id'].lower()}@importado.com"}
+
+    _upsert(_exportacao(('Ana', 'A1'), ('Bia', 'B2')), por_id)
+    outra = _upsert(_exportacao(('Carla', 'C3'), ('Duda', 'D4')), por_id)
+    mesma = _upsert(_exportacao(('Ana', 'A1'), ('Bia', 'B2')), por_id)
+
+    assert (outra['inseridos'], outra['atualizados']) == (2, 0)
+    assert (mesma['inseridos'], mesma['atualizados'], mesma['ignorados']) == (0, 0, 2)
+    assert sorted(nome for (nome,) in db.session.query(Cliente.nome)) == ['Ana', 'Bia', 'Carla', 'Duda']
+
+
+def test_lote_dividido_so_conta_rejeitados_ate_o_checkpoint(app, tmp_path, criar_clientes, monkeypatch):
+    """Rejeição depois do pedaço gravado não entra no journal dele"""
+    criar_clientes(1)  # cliente0@exemplo.com
+    arquivo = tmp_path / 'clientes.csv'
+    arquivo.write_text('planilha de teste')
+    # Linha 5 rejeitada no mapeamento, linha 6 no insert (email repetido)
+    emails = {2: 'c2@exemplo.com', 3: 'c3@exemplo.com', 4: 'c4@exemplo.com', 5: '', 6: 'cliente0@exemplo.com'}
+    linhas = [(numero, {'nome': f'Cliente {numero}', 'email': email}) for numero, email in emails.items()]
+
+    checkpoints = []
+    marcar = JournalImportacao.marcar
+
+    def registrar_checkpoint(journal, *args):
+        marcar(journal, *args)
+        checkpoints.append((journal.registro.ultima_linha, journal.registro.rejeitados))
+
+    monkeypatch.setattr(JournalImportacao, 'marcar', registrar_checkpoint)
+    journal = abrir_journal(str(arquivo))
+    # Lote [2, 3, 4, 6] falha pela linha 6 e é dividido em [2, 3] e [4, 6]
+    importar_em_lotes(iter(linhas), _mapear(), tamanho_lote=4, mostrar_progresso=False, journal=journal)
+
+    assert checkpoints == [(3, 0), (4, 0), (6, 2)]
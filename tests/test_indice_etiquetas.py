@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes do filtro por etiquetas (?tags=&not_tags=)
+"""
+
+import pytest
+from sqlalchemy import event, insert
+from backend import assinatura, indice_etiquetas as modulo
+from backend.models import db, ClienteEtiqueta, Etiqueta
+
+
+@pytest.fixture
+def clientes_etiquetados(criar_clientes):
+    """30 clientes: pares em Desafio, múltiplos de 3 Inativos"""
+    desafio = Etiqueta(nome='Em Desafio', cor='#FF6B6B')
+    inativo = Etiqueta(nome='Inativo', cor='#FFB6C1')
+    db.session.add_all([desafio, inativo])
+    db.session.flush()
+    clientes = criar_clientes(30)
+    for i, cliente in enumerate(clientes):
+        if i % 2 == 0:
+            db.session.add(ClienteEtiqueta(cliente_id=cliente.id, etiqueta_id=desafio.id))
+        if i % 3 == 0:
+            db.session.add(ClienteEtiqueta(cliente_id=cliente.id, etiqueta_id=inativo.id))
+    db.session.commit()
+    return [cliente.id for cliente in clientes]
+
+
+def _listar(client, contar_sql, **filtros):
+    comandos = []
+
+    def registrar(conn, cursor, statement, *args):
+        comandos.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        resposta = client.get('/api/clientes', query_string={'fields': 'id', **filtros})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+    assert resposta.status_code == 200
+    contar_sql.extend(comandos)
+    return sorted(cliente['id'] for cliente in resposta.get_json())
+
+
+@pytest.mark.parametrize('filtros', [
+    {'tags': 'Em Desafio'},
+    {'not_tags': 'Inativo'},
+    {'tags': 'Em Desafio', 'not_tags': 'Inativo'},
+])
+def test_filtro_amplo_usa_exists_com_o_mesmo_resultado(client, clientes_etiquetados, monkeypatch, filtros):
+    pelo_in = _listar(client, [], **filtros)
+
+    monkeypatch.setattr(modulo, 'LIMITE_IDS_SQL', 3)
+    comandos = []
+    pelo_exists = _listar(client, comandos, **filtros)
+
+    assert pelo_exists == pelo_in
+    consulta = comandos[-1]  # a listagem (antes vêm ETag e índice)
+    assert 'EXISTS' in consulta and ' IN (' not in consulta
+
+
+def test_not_tags(client, clientes_etiquetados):
+    esperados = [id for i, id in enumerate(clientes_etiquetados) if i % 3 != 0]
+    assert _listar(client, [], not_tags='Inativo') == esperados
+
+
+def test_gravacao_de_outro_processo_depois_de_um_commit_local(client, clientes_etiquetados, monkeypatch):
+    """O commit local não faz o índice adotar a assinatura sem recarregar"""
+    desafio = Etiqueta.query.filter_by(nome='Em Desafio').one()
+    local, externo = clientes_etiquetados[1], clientes_etiquetados[3]
+    db.session.add(ClienteEtiqueta(cliente_id=local, etiqueta_id=desafio.id))
+    db.session.commit()
+
+    # Fora do ORM: nenhum evento chega ao índice
+    db.session.execute(insert(ClienteEtiqueta).values(cliente_id=externo, etiqueta_id=desafio.id))
+    db.session.commit()
+
+    monkeypatch.setattr(assinatura, 'INTERVALO_VERIFICACAO', 0)
+    ids = _listar(client, [], tags='Em Desafio')
+    assert local in ids and externo in ids
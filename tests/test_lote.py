@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes das operações em lote (/api/clientes/lote)
+"""
+
+from datetime import datetime
+import pytest
+from sqlalchemy import event, update
+from backend import lote
+from backend.estatisticas import estatisticas_dashboard
+from backend.models import db, Cliente, Etiqueta
+
+ANTES = datetime(2000, 1, 1)  # atualizado_em inicial dos clientes
+
+
+@pytest.fixture
+def cinco(criar_clientes):
+    """Ids de 5 clientes ativos com atualizado_em = ANTES"""
+    ids = [cliente.id for cliente in criar_clientes(5, status='ativo')]
+    db.session.execute(update(Cliente).values(atualizado_em=ANTES))
+    db.session.commit()
+    return ids
+
+
+@pytest.fixture
+def etiquetas(app):
+    desafio = Etiqueta(nome='Em Desafio', cor='#FF6B6B')
+    inativo = Etiqueta(nome='Inativo', cor='#FFB6C1')
+    db.session.add_all([desafio, inativo])
+    db.session.commit()
+    return desafio.id, inativo.id
+
+
+def _lote(client, **corpo):
+    resposta = client.post('/api/clientes/lote', json=corpo)
+    assert resposta.status_code == 200, resposta.get_json()
+    return resposta.get_json()
+
+
+def _updates_em_clientes(client, **corpo):
+    comandos = []
+
+    def registrar(conn, cursor, statement, *args):
+        if statement.startswith('UPDATE clientes'):
+            comandos.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    try:
+        resultado = _lote(client, **corpo)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', registrar)
+    return resultado, len(comandos)
+
+
+def _alterados(ids):
+    db.session.expire_all()
+    return [id for id in ids if db.session.get(Cliente, id).atualizado_em > ANTES]
+
+
+def _tags(client, **filtros):
+    resposta = client.get('/api/clientes', query_string={'fields': 'id', **filtros})
+    return [cliente['id'] for cliente in resposta.get_json()]
+
+
+def test_um_update_por_pedaco_de_ids(client, cinco, monkeypatch):
+    resultado, updates = _updates_em_clientes(client, ids=cinco[:3] + [9999], alteracoes={'status': 'pausado'})
+    assert updates == 1
+    assert resultado['atualizados'] == 3
+    assert resultado['resultados'][-1] == {'id': 9999, 'ok': False, 'erro': 'Cliente não encontrado'}
+    db.session.expire_all()
+    assert [db.session.get(Cliente, id).status for id in cinco] == ['pausado'] * 3 + ['ativo'] * 2
+
+    monkeypatch.setattr(lote, 'TAMANHO_PEDACO', 2)
+    _, updates = _updates_em_clientes(client, ids=cinco, alteracoes={'plano_ativo': 'Premium'})
+    assert updates == 3
+
+
+def test_atualizado_em_so_dos_clientes_alterados(client, cinco, etiquetas):
+    _lote(client, ids=cinco[:2], alteracoes={'status': 'pausado'})
+    assert _alterados(cinco) == cinco[:2]
+
+    # Só etiquetas também conta como alteração do cliente
+    _lote(client, ids=[cinco[4]], adicionar_etiquetas=[etiquetas[0]])
+    assert _alterados(cinco) == cinco[:2] + [cinco[4]]
+
+
+def test_contadores_do_dashboard(client, cinco):
+    _lote(client, ids=cinco[:3], alteracoes={'status': 'pausado', 'status_plano': 'ativo'})
+    _lote(client, filtro={'status': 'pausado'}, alteracoes={'status': 'cancelado'})
+
+    materializadas, calculadas = estatisticas_dashboard(True), estatisticas_dashboard(False)
+    assert materializadas['status'] == calculadas['status'] == {'ativo': 2, 'cancelado': 3}
+    assert materializadas['status_plano'] == calculadas['status_plano'] == {'ativo': 3, 'nao_informado': 2}
+
+
+def test_indice_de_etiquetas_acompanha_o_lote(client, cinco, etiquetas):
+    desafio, inativo = etiquetas
+    assert _tags(client, tags='Em Desafio') == []
+
+    _lote(client, ids=cinco[:4], adicionar_etiquetas=[desafio, inativo])
+    assert _tags(client, tags='Em Desafio') == cinco[:4]
+
+    _lote(client, filtro={'etiqueta_id': desafio}, remover_etiquetas=[inativo])
+    _lote(client, ids=cinco[:1], remover_etiquetas=[desafio])
+    assert _tags(client, tags='Em Desafio') == cinco[1:4]
+    assert _tags(client, tags='Inativo') == []
+    assert _tags(client, not_tags='Em Desafio') == [cinco[0], cinco[4]]
+
+
+@pytest.mark.parametrize('corpo', [
+    {'alteracoes': {'status': 'ativo'}},
+    {'ids': [1], 'filtro': {'status': 'ativo'}, 'alteracoes': {'status': 'ativo'}},
+    {'ids': [1], 'alteracoes': {'email': 'x@exemplo.com'}},
+    {'ids': [1], 'adicionar_etiquetas': [999]},
+    {'ids': [1]},
+])
+def test_operacao_invalida(client, cinco, corpo):
+    assert client.post('/api/clientes/lote', json=corpo).status_code == 400
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes das migrações (índices das consultas frequentes)
+
+Banco no formato antigo (sem os índices secundários e sem a unique de
+cliente_etiquetas), migração 0002 aplicada, e EXPLAIN QUERY PLAN de
+cada filtro coberto por ela.
+"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from backend.migracoes import _0002_indices_consultas_frequentes
+from backend.models import db
+
+# (consulta, índices aceitos): Avaliacao também tem o composto
+# (cliente_id, data_avaliacao), que serve para o mesmo filtro
+CONSULTAS_FREQUENTES = [
+    ('SELECT * FROM clientes WHERE status = :v', {'ix_clientes_status'}),
+    ('SELECT * FROM clientes WHERE data_vencimento BETWEEN :v AND :v', {'ix_clientes_data_vencimento'}),
+    ('SELECT * FROM avaliacoes WHERE cliente_id = :v', {'ix_avaliacoes_cliente_id', 'ix_avaliacoes_cliente_data'}),
+    ('SELECT * FROM consultas WHERE cliente_id = :v', {'ix_consultas_cliente_id'}),
+    ('SELECT * FROM consultas WHERE data_hora >= :v', {'ix_consultas_data_hora'}),
+    ('SELECT * FROM cardapios WHERE cliente_id = :v', {'ix_cardapios_cliente_id'}),
+    ('SELECT * FROM cliente_etiquetas WHERE etiqueta_id = :v', {'ix_cliente_etiquetas_etiqueta_id'}),
+    ('SELECT * FROM cliente_etiquetas WHERE cliente_id = :v', {'uq_cliente_etiqueta'}),
+]
+
+
+@pytest.fixture
+def banco_antigo(app):
+    """Remove o que a 0002 cria, recriando cliente_etiquetas sem a unique"""
+    for (nome,) in db.session.execute(text(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+        "AND tbl_name IN ('clientes', 'avaliacoes', 'consultas', 'cardapios', 'cliente_etiquetas')"
+    )).all():
+        db.session.execute(text(f'DROP INDEX {nome}'))
+    db.session.execute(text('DROP TABLE cliente_etiquetas'))
+    db.session.execute(text(
+        'CREATE TABLE cliente_etiquetas (id INTEGER PRIMARY KEY, '
+        'cliente_id INTEGER NOT NULL, etiqueta_id INTEGER NOT NULL)'
+    ))
+    db.session.commit()
+
+
+def _plano(sql):
+    return ' '.join(linha[-1] for linha in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'), {'v': 1}))
+
+
+@pytest.mark.parametrize('sql,indices', CONSULTAS_FREQUENTES)
+def test_consulta_usa_indice(banco_antigo, sql, indices):
+    assert 'USING' not in _plano(sql)
+
+    _0002_indices_consultas_frequentes()
+    plano = _plano(sql)
+
+    assert any(f'INDEX {indice} ' in plano for indice in indices), plano
+
+
+def test_unique_cliente_etiqueta_remove_duplicatas(banco_antigo):
+    db.session.execute(text(
+        'INSERT INTO cliente_etiquetas (cliente_id, etiqueta_id) VALUES (1, 1), (1, 1), (1, 2)'
+    ))
+
+    _0002_indices_consultas_frequentes()
+
+    linhas = db.session.execute(text('SELECT cliente_id, etiqueta_id FROM cliente_etiquetas ORDER BY id')).all()
+    assert [tuple(linha) for linha in linhas] == [(1, 1), (1, 2)]
+    with pytest.raises(IntegrityError, match='UNIQUE'):
+        db.session.execute(text('INSERT INTO cliente_etiquetas (cliente_id, etiqueta_id) VALUES (1, 2)'))
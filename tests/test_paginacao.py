@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes da paginação por cursor (/api/clientes?limit=)
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from backend.models import db, Cliente
+
+
+def _percorrer(client, **parametros):
+    """Segue proximo_cursor até a última página e devolve os ids vistos"""
+    ids = []
+    cursor = None
+    while True:
+        resposta = client.get('/api/clientes', query_string=dict(parametros, cursor=cursor or ''))
+        assert resposta.status_code == 200, resposta.get_json()
+        dados = resposta.get_json()
+        ids += [cliente['id'] for cliente in dados['clientes']]
+        cursor = dados['proximo_cursor']
+        if not dados['tem_mais']:
+            return ids
+
+
+def test_atualizado_em_nulo_no_limite_da_pagina(client, criar_clientes):
+    """Clientes antigos sem atualizado_em não quebram o cursor e vêm no fim"""
+    clientes = criar_clientes(5)
+    ids = [cliente.id for cliente in clientes]
+    inicio = datetime(2024, 1, 1)
+    for posicao, id in enumerate(ids):
+        db.session.execute(update(Cliente).where(Cliente.id == id).values(
+            atualizado_em=None if posicao in (1, 3) else inicio + timedelta(days=posicao)
+        ))
+    db.session.commit()
+
+    for limite in (1, 2):
+        vistos = _percorrer(client, limit=limite, ordem='atualizado_em')
+        assert vistos == [ids[0], ids[2], ids[4], ids[1], ids[3]]
+
+
+def test_cursor_de_id_nao_serve_para_atualizado_em(client, criar_clientes):
+    criar_clientes(3)
+    cursor = client.get('/api/clientes', query_string={'limit': 1}).get_json()['proximo_cursor']
+
+    resposta = client.get('/api/clientes', query_string={'limit': 1, 'cursor': cursor, 'ordem': 'atualizado_em'})
+    assert resposta.status_code == 400
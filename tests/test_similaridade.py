@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes da detecção de duplicados (/api/clientes/similares)
+"""
+
+import pytest
+from sqlalchemy import insert
+from backend import assinatura
+from backend.models import db, Cliente
+
+
+@pytest.fixture
+def fernanda(client):
+    resposta = client.post('/api/clientes', json={
+        'nome': 'Fernanda Oliveira', 'email': 'Fernanda@Exemplo.com', 'whatsapp': '(11) 98765-4321'
+    })
+    assert resposta.status_code == 201
+    return resposta.get_json()['id']
+
+
+def _similares(client, **parametros):
+    resposta = client.get('/api/clientes/similares', query_string=parametros)
+    assert resposta.status_code == 200
+    return {candidato['id']: candidato['similaridade'] for candidato in resposta.get_json()}
+
+
+def test_sem_parametros_devolve_400(client):
+    assert client.get('/api/clientes/similares').status_code == 400
+
+
+@pytest.mark.parametrize('nome,similaridade', [
+    ('fernanda  OLIVEIRA', 100),   # só caixa e espaços
+    ('Fernando Oliveira', 80),
+    ('Fernanda Olivera', 75),
+])
+def test_nome_parecido(client, fernanda, nome, similaridade):
+    assert _similares(client, nome=nome) == {fernanda: similaridade}
+
+
+def test_abaixo_do_minimo_fica_de_fora(client, fernanda):
+    # Jaccard de "Fernanda" com "Fernanda Oliveira" é 50
+    assert _similares(client, nome='Fernanda') == {}
+    assert _similares(client, nome='Fernanda', minimo=50) == {fernanda: 50}
+    assert _similares(client, nome='Fernanda Olivera', minimo=76) == {}
+    assert _similares(client, nome='Roberto Souza', minimo=1) == {}
+
+
+def test_email_e_whatsapp_exatos(client, fernanda):
+    assert _similares(client, email=' fernanda@exemplo.COM ') == {fernanda: 100}
+    assert _similares(client, whatsapp='11987654321') == {fernanda: 100}
+    assert _similares(client, nome='Outra Pessoa', whatsapp='+55 (11) 98765-4321') == {}
+    assert _similares(client, email='fernanda@exemplo.com.br') == {}
+
+
+def test_indice_acompanha_criacao_alteracao_e_remocao(client, fernanda):
+    assert _similares(client, nome='Roberta Souza') == {}
+
+    roberta = client.post('/api/clientes', json={'nome': 'Roberta Souza', 'email': 'roberta@exemplo.com'})
+    roberta = roberta.get_json()['id']
+    assert _similares(client, nome='Roberta Souza') == {roberta: 100}
+
+    assert client.put(f'/api/clientes/{fernanda}', json={'email': 'fe@exemplo.com'}).status_code == 200
+    assert _similares(client, email='fernanda@exemplo.com') == {}
+    assert _similares(client, email='fe@exemplo.com') == {fernanda: 100}
+
+    assert client.delete(f'/api/clientes/{roberta}').status_code == 200
+    assert _similares(client, nome='Roberta Souza') == {}
+
+
+def test_cliente_de_outro_processo_depois_de_um_commit_local(client, fernanda, monkeypatch):
+    """O commit local não faz o índice adotar a assinatura sem recarregar"""
+    assert _similares(client, nome='Fernanda Oliveira') == {fernanda: 100}
+    local = client.post('/api/clientes', json={'nome': 'Roberta Souza', 'email': 'roberta@exemplo.com'})
+    local = local.get_json()['id']
+
+    # Fora do ORM: nenhum evento chega ao índice
+    db.session.execute(insert(Cliente).values(nome='Fernanda Oliveira', email='outra@exemplo.com'))
+    db.session.commit()
+    externo = db.session.query(Cliente.id).filter_by(email='outra@exemplo.com').scalar()
+
+    monkeypatch.setattr(assinatura, 'INTERVALO_VERIFICACAO', 0)
+    assert _similares(client, nome='Fernanda Oliveira') == {fernanda: 100, externo: 100}
+    assert _similares(client, nome='Roberta Souza') == {local: 100}
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes da sincronização incremental (/api/clientes/changes)
+"""
+
+from datetime import datetime, timedelta
+from functools import partial
+import pytest
+from backend.models import db, Cliente, ClienteRemovido
+from backend.sincronizacao import (
+    JANELA_SINCRONIZACAO, SincronizacaoExpirada, alteracoes_desde, limpar_removidos
+)
+from backend.tarefas import executar_tarefa
+
+
+def _alteracoes(client, since=None):
+    resposta = client.get('/api/clientes/changes', query_string={'since': since} if since else {})
+    assert resposta.status_code == 200
+    return resposta.get_json()
+
+
+def test_commit_atrasado_nao_se_perde(client, criar_clientes):
+    """Cliente gravado com horário anterior ao ate já entregue ainda chega"""
+    criar_clientes(1)
+    ate = _alteracoes(client)['ate']
+
+    # Flush antes da última sincronização, commit só depois dela
+    atrasado = Cliente(nome='Atrasado', email='atrasado@exemplo.com')
+    atrasado.atualizado_em = datetime.fromisoformat(ate) - timedelta(seconds=1)
+    db.session.add(atrasado)
+    db.session.commit()
+
+    ids = [cliente['id'] for cliente in _alteracoes(client, ate)['clientes']]
+    assert atrasado.id in ids
+
+
+def test_tombstone_de_remocao_fora_das_rotas(client, criar_clientes):
+    cliente, outro = criar_clientes(2)
+    ate = _alteracoes(client)['ate']
+
+    db.session.delete(cliente)
+    db.session.commit()
+
+    assert _alteracoes(client, ate)['removidos'] == [cliente.id]
+
+
+def test_rota_de_remocao_grava_um_tombstone(client, criar_clientes):
+    cliente, = criar_clientes(1)
+    id = cliente.id
+    ate = _alteracoes(client)['ate']
+
+    assert client.delete(f'/api/clientes/{id}').status_code == 200
+
+    assert ClienteRemovido.query.filter_by(cliente_id=id).count() == 1
+    assert _alteracoes(client, ate)['removidos'] == [id]
+
+
+def test_limpeza_de_tombstones_antigos(app):
+    agora = datetime(2030, 3, 10)
+    for dias in (40, 31, 29, 1):
+        db.session.add(ClienteRemovido(cliente_id=dias, removido_em=agora - timedelta(days=dias)))
+    db.session.commit()
+
+    execucao = executar_tarefa('limpar_removidos', partial(limpar_removidos, agora))
+    assert execucao.afetados == 2
+    assert sorted(removido.cliente_id for removido in ClienteRemovido.query) == [1, 29]
+
+    # Dentro da janela os tombstones restantes ainda chegam
+    desde = agora - timedelta(days=29, minutes=1)
+    assert alteracoes_desde(desde, agora=agora)[1] == [1, 29]
+    with pytest.raises(SincronizacaoExpirada):
+        alteracoes_desde(agora - JANELA_SINCRONIZACAO, agora=agora)
+
+
+def test_since_mais_antigo_que_a_janela_devolve_410(client, criar_clientes):
+    criar_clientes(1)
+    antigo = (datetime.utcnow() - JANELA_SINCRONIZACAO - timedelta(days=1)).isoformat()
+    resposta = client.get('/api/clientes/changes', query_string={'since': antigo})
+    assert resposta.status_code == 410
+    assert 'error' in resposta.get_json()
+
+    # A sincronização completa continua valendo
+    assert len(_alteracoes(client)['clientes']) == 1
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ANDENUTRI - Testes do vencimento e da expiração de acesso
+
+As datas são fixas (hoje = HOJE); os casos de obter_status_vencimento
+seguem src/utils/calcularVencimento.ts.
+"""
+
+from datetime import date, datetime, timedelta
+from functools import partial
+import pytest
+from sqlalchemy import update
+from backend.models import db, Cliente, ExecucaoTarefa
+from backend.tarefas import executar_tarefa
+from backend.vencimento import (
+    calcular_vencimento_programa, consulta_vencendo, expirar_acessos, obter_status_vencimento
+)
+
+HOJE = date(2030, 3, 10)
+ANTES = datetime(2000, 1, 1)  # atualizado_em inicial dos clientes
+
+
+def _dia(dias):
+    return HOJE + timedelta(days=dias)
+
+
+@pytest.mark.parametrize('vencimento,status,dias_restantes', [
+    (_dia(-1), 'vencido', 1),
+    (_dia(0), 'proximo', 0),
+    (_dia(7), 'proximo', 7),
+    (_dia(8), 'ok', 8),
+    (None, 'ok', None),
+])
+def test_status_vencimento(vencimento, status, dias_restantes):
+    resultado = obter_status_vencimento(vencimento, hoje=HOJE)
+    assert (resultado['status'], resultado['dias_restantes']) == (status, dias_restantes)
+
+
+def test_vencimento_do_programa():
+    assert calcular_vencimento_programa('2030-01-01') == date(2030, 4, 1)
+    assert calcular_vencimento_programa(datetime(2030, 1, 1, 15), 30) == date(2030, 1, 31)
+    assert calcular_vencimento_programa(date(2030, 1, 1), None) == date(2030, 4, 1)
+    assert calcular_vencimento_programa(None) is None
+
+
+@pytest.fixture
+def clientes_vencimento(criar_clientes):
+    """nome -> id de clientes com vencimentos em volta de HOJE"""
+    casos = {
+        'vencido': {'data_vencimento': _dia(-1)},
+        'vencido_sem_flag': {'data_vencimento': _dia(-30)},
+        'ja_bloqueado': {'data_vencimento': _dia(-5), 'tempo_acesso_ativo': False},
+        'vence_hoje': {'data_vencimento': _dia(0)},
+        'vence_em_7': {'data_vencimento': _dia(7)},
+        'vence_em_8': {'data_vencimento': _dia(8)},
+        'sem_vencimento': {},
+    }
+    ids = {}
+    for nome, campos in casos.items():
+        cliente, = criar_clientes(1, **campos)
+        cliente.atualizado_em = ANTES
+        ids[nome] = cliente.id
+    # Clientes antigos têm NULL (o default só vale no insert pelo ORM)
+    db.session.execute(update(Cliente).where(Cliente.id == ids['vencido_sem_flag']).values(tempo_acesso_ativo=None))
+    db.session.commit()
+    return ids
+
+
+def _bloqueados(ids):
+    return {nome for nome, id in ids.items() if db.session.get(Cliente, id).tempo_acesso_ativo is False}
+
+
+def test_expirar_acessos(app, clientes_vencimento):
+    assert expirar_acessos(hoje=HOJE) == 2
+    db.session.commit()
+    db.session.expire_all()
+
+    assert _bloqueados(clientes_vencimento) == {'vencido', 'vencido_sem_flag', 'ja_bloqueado'}
+    alterados = {
+        nome for nome, id in clientes_vencimento.items()
+        if db.session.get(Cliente, id).atualizado_em > ANTES
+    }
+    assert alterados == {'vencido', 'vencido_sem_flag'}
+
+    assert expirar_acessos(hoje=HOJE) == 0
+
+
+def test_tarefa_registra_a_execucao(app, clientes_vencimento):
+    execucao = executar_tarefa('expirar_acessos', partial(expirar_acessos, HOJE))
+    assert ExecucaoTarefa.query.one().afetados == execucao.afetados == 2
+
+
+def test_consulta_vencendo(app, clientes_vencimento):
+    por_id = {id: nome for nome, id in clientes_vencimento.items()}
+    vencendo = [por_id[cliente.id] for cliente in consulta_vencendo(7, hoje=HOJE)]
+    assert vencendo == ['vence_hoje', 'vence_em_7']
+
+    # Quem a consulta devolve é exatamente quem o front mostra como 'proximo'
+    for cliente in consulta_vencendo(7, hoje=HOJE):
+        assert obter_status_vencimento(cliente.data_vencimento, hoje=HOJE)['status'] == 'proximo'
+
+    assert [por_id[cliente.id] for cliente in consulta_vencendo(0, hoje=HOJE)] == ['vence_hoje']
+
+
+def test_rota_vencendo(client, clientes_vencimento):
+    assert client.get('/api/clientes/vencendo', query_string={'dias': -1}).status_code == 400
+    resposta = client.get('/api/clientes/vencendo', query_string={'dias': 3650, 'fields': 'id'})
+    assert resposta.status_code == 200
+    ids = {cliente['id'] for cliente in resposta.get_json()}
+    # Relativo à data real: os vencidos e bloqueados nunca entram
+    assert clientes_vencimento['ja_bloqueado'] not in ids